@@ -0,0 +1,49 @@
+"""Add estimation jobs
+
+Revision ID: 5b1c7e9a2d40
+Revises: e350e627a954
+Create Date: 2026-10-18 09:00:12.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1c7e9a2d40'
+down_revision = 'e350e627a954'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('estimation_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('locked_by', sa.String(length=64), nullable=True),
+    sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('create_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('update_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_estimation_jobs_task_id'), 'estimation_jobs', ['task_id'], unique=False)
+    op.create_index('ix_estimation_jobs_status_run_after', 'estimation_jobs', ['status', 'run_after'], unique=False)
+    # Tasks that never got a score (e.g. created while the estimator was
+    # down) are queued once so they get picked up by the worker
+    op.execute(
+        "INSERT INTO estimation_jobs (task_id, status, attempts, run_after) "
+        "SELECT tasks.id, 'pending', 0, CURRENT_TIMESTAMP FROM tasks "
+        "LEFT OUTER JOIN task_difficulties ON task_difficulties.task_id = tasks.id "
+        "WHERE task_difficulties.id IS NULL"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_estimation_jobs_status_run_after', table_name='estimation_jobs')
+    op.drop_index(op.f('ix_estimation_jobs_task_id'), table_name='estimation_jobs')
+    op.drop_table('estimation_jobs')
@@ -0,0 +1,36 @@
+"""Add difficulty cache
+
+Revision ID: 8e4f2a61c3b7
+Revises: 5b1c7e9a2d40
+Create Date: 2026-10-18 09:30:41.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4f2a61c3b7'
+down_revision = '5b1c7e9a2d40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('difficulty_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('reasoning', sa.String(), nullable=True),
+    sa.Column('model', sa.String(length=255), nullable=False),
+    sa.Column('prompt_version', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('create_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('update_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_difficulty_cache_expires_at'), 'difficulty_cache', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_difficulty_cache_expires_at'), table_name='difficulty_cache')
+    op.drop_table('difficulty_cache')
@@ -0,0 +1,28 @@
+"""Add task sort indexes
+
+Revision ID: 3c9d1f7b8e52
+Revises: 8e4f2a61c3b7
+Create Date: 2026-10-18 10:00:12.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9d1f7b8e52'
+down_revision = '8e4f2a61c3b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_tasks_due_date_id', 'tasks', ['due_date', 'id'], unique=False)
+    op.create_index('ix_tasks_create_time_id', 'tasks', ['create_time', 'id'], unique=False)
+    op.create_index('ix_task_difficulties_score_task_id', 'task_difficulties', ['score', 'task_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_difficulties_score_task_id', table_name='task_difficulties')
+    op.drop_index('ix_tasks_create_time_id', table_name='tasks')
+    op.drop_index('ix_tasks_due_date_id', table_name='tasks')
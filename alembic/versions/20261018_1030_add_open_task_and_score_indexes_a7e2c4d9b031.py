@@ -0,0 +1,30 @@
+"""Add open task and difficulty score indexes
+
+Revision ID: a7e2c4d9b031
+Revises: 3c9d1f7b8e52
+Create Date: 2026-10-18 10:30:47.118356
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e2c4d9b031'
+down_revision = '3c9d1f7b8e52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_tasks_open_due_date_id', 'tasks', ['due_date', 'id'], unique=False,
+        sqlite_where=sa.text('is_completed = 0'),
+        postgresql_where=sa.text('is_completed = false'),
+    )
+    op.create_index('ix_task_difficulties_task_id_score', 'task_difficulties', ['task_id', 'score'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_difficulties_task_id_score', table_name='task_difficulties')
+    op.drop_index('ix_tasks_open_due_date_id', table_name='tasks')
@@ -0,0 +1,31 @@
+"""Add table versions
+
+Revision ID: d41b8e6f2a95
+Revises: a7e2c4d9b031
+Create Date: 2026-10-18 11:00:03.551872
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41b8e6f2a95'
+down_revision = 'a7e2c4d9b031'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_versions = op.create_table('table_versions',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('create_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('update_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_versions, [{'name': 'tasks', 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('table_versions')
@@ -0,0 +1,33 @@
+"""Add task changes journal
+
+Revision ID: 5f0a3b7c1e84
+Revises: d41b8e6f2a95
+Create Date: 2026-10-18 11:30:12.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0a3b7c1e84'
+down_revision = 'd41b8e6f2a95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('task_changes',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.String(length=16), nullable=False),
+    sa.Column('create_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('update_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_task_changes_task_id_id', 'task_changes', ['task_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_changes_task_id_id', table_name='task_changes')
+    op.drop_table('task_changes')
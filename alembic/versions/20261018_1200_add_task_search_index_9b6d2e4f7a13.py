@@ -0,0 +1,56 @@
+"""Add task full-text search index
+
+Revision ID: 9b6d2e4f7a13
+Revises: 5f0a3b7c1e84
+Create Date: 2026-10-18 12:00:41.275903
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9b6d2e4f7a13'
+down_revision = '5f0a3b7c1e84'
+branch_labels = None
+depends_on = None
+
+# Spelled out rather than imported, see models/task_search.py
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', name), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(f"CREATE INDEX ix_tasks_search ON tasks USING gin (({SEARCH_VECTOR}))")
+        return
+    op.execute("""CREATE VIRTUAL TABLE tasks_fts USING fts5(
+    name, description, content='tasks', content_rowid='id',
+    tokenize='porter unicode61 remove_diacritics 2'
+)""")
+    op.execute("""CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO tasks_fts(rowid, name, description)
+    VALUES (new.id, new.name, new.description);
+END""")
+    op.execute("""CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN
+    INSERT INTO tasks_fts(tasks_fts, rowid, name, description)
+    VALUES ('delete', old.id, old.name, old.description);
+END""")
+    op.execute("""CREATE TRIGGER tasks_fts_update AFTER UPDATE OF name, description ON tasks BEGIN
+    INSERT INTO tasks_fts(tasks_fts, rowid, name, description)
+    VALUES ('delete', old.id, old.name, old.description);
+    INSERT INTO tasks_fts(rowid, name, description)
+    VALUES (new.id, new.name, new.description);
+END""")
+    op.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_tasks_search")
+        return
+    op.execute("DROP TRIGGER IF EXISTS tasks_fts_insert")
+    op.execute("DROP TRIGGER IF EXISTS tasks_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS tasks_fts_update")
+    op.execute("DROP TABLE IF EXISTS tasks_fts")
@@ -0,0 +1,56 @@
+"""Add task due epoch
+
+Revision ID: 626a35066f8f
+Revises: 9f7a6520f1e2
+Create Date: 2026-10-18 13:00:22.961817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '626a35066f8f'
+down_revision = '9f7a6520f1e2'
+branch_labels = None
+depends_on = None
+
+# Tasks filled per statement, each chunk committed on its own so a large
+# table is never locked whole
+BACKFILL_CHUNK = 10000
+# due_date is naive UTC: "YYYY-MM-DD HH:MM:SS.ffffff" in SQLite
+DUE_EPOCH_US = {
+    'postgresql': "round(extract(epoch FROM due_date) * 1000000)::bigint",
+    'sqlite': (
+        "CAST(strftime('%s', due_date) AS INTEGER) * 1000000"
+        " + CAST(coalesce(nullif(substr(due_date, 21, 6), ''), '0') AS INTEGER)"
+    ),
+}
+
+
+def upgrade():
+    op.add_column('tasks', sa.Column('due_epoch_us', sa.BigInteger(), nullable=True))
+
+    bind = op.get_bind()
+    expression = DUE_EPOCH_US[bind.dialect.name]
+    low, high = bind.execute(sa.text("SELECT min(id), max(id) FROM tasks")).one()
+    if low is not None:
+        with op.get_context().autocommit_block():
+            for start in range(low, high + 1, BACKFILL_CHUNK):
+                bind.execute(
+                    sa.text(
+                        f"UPDATE tasks SET due_epoch_us = {expression} "
+                        "WHERE id >= :start AND id < :end AND due_date IS NOT NULL"
+                    ),
+                    {'start': start, 'end': start + BACKFILL_CHUNK},
+                )
+
+    # Built once the column is filled rather than kept up during the backfill
+    op.create_index('ix_tasks_due_epoch_us_id', 'tasks', ['due_epoch_us', 'id'], unique=False)
+    op.create_index('ix_tasks_open_due_epoch_us_id', 'tasks', ['due_epoch_us', 'id'], unique=False, sqlite_where=sa.text('is_completed = 0'), postgresql_where=sa.text('is_completed = false'))
+
+
+def downgrade():
+    op.drop_index('ix_tasks_open_due_epoch_us_id', table_name='tasks', sqlite_where=sa.text('is_completed = 0'), postgresql_where=sa.text('is_completed = false'))
+    op.drop_index('ix_tasks_due_epoch_us_id', table_name='tasks')
+    op.drop_column('tasks', 'due_epoch_us')
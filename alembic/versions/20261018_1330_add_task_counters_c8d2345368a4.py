@@ -0,0 +1,33 @@
+"""Add task counters
+
+Revision ID: c8d2345368a4
+Revises: 626a35066f8f
+Create Date: 2026-10-18 13:30:44.865684
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8d2345368a4'
+down_revision = '626a35066f8f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Left empty, the first reconciliation (at startup, or
+    # `python -m api.utils.task_stats reconcile`) counts the existing tasks
+    op.create_table('task_counters',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.Column('create_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('update_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('name', 'shard')
+    )
+
+
+def downgrade():
+    op.drop_table('task_counters')
@@ -0,0 +1,59 @@
+"""Add task completed at and daily stats
+
+Revision ID: 77c28c5987e8
+Revises: c8d2345368a4
+Create Date: 2026-10-18 14:00:41.207358
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '77c28c5987e8'
+down_revision = 'c8d2345368a4'
+branch_labels = None
+depends_on = None
+
+# Tasks filled per statement, each chunk committed on its own so a large
+# table is never locked whole
+BACKFILL_CHUNK = 10000
+
+
+def upgrade():
+    op.add_column('tasks', sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True))
+
+    # Completion times were not kept: the last update of a completed task is
+    # the best guess
+    bind = op.get_bind()
+    low, high = bind.execute(sa.text("SELECT min(id), max(id) FROM tasks")).one()
+    if low is not None:
+        with op.get_context().autocommit_block():
+            for start in range(low, high + 1, BACKFILL_CHUNK):
+                bind.execute(
+                    sa.text(
+                        "UPDATE tasks SET completed_at = update_time "
+                        "WHERE id >= :start AND id < :end AND is_completed"
+                    ),
+                    {'start': start, 'end': start + BACKFILL_CHUNK},
+                )
+
+    # Built once the column is filled rather than kept up during the backfill
+    op.create_index('ix_tasks_completed_at', 'tasks', ['completed_at'], unique=False)
+
+    # Left empty, filled from the tasks by
+    # `python -m api.utils.task_rollups backfill`
+    op.create_table('task_daily_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('name', sa.String(length=16), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.Column('create_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('update_time', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'name')
+    )
+
+
+def downgrade():
+    op.drop_table('task_daily_stats')
+    op.drop_index('ix_tasks_completed_at', table_name='tasks')
+    op.drop_column('tasks', 'completed_at')
@@ -1,7 +1,7 @@
 from fastapi import APIRouter
 
 from api import api_messages
-from api.endpoints import tasks
+from api.endpoints import inbox, metrics, tasks
 
 api_router = APIRouter(
     responses={
@@ -30,3 +30,5 @@ api_router = APIRouter(
 )
 
 api_router.include_router(tasks.router, prefix="/tasks", tags=["tasks"])
+api_router.include_router(inbox.router, prefix="/inbox", tags=["inbox"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api import deps
+from models import InboxMessage
+from schemas.responses import InboxMessageResponse
+
+router = APIRouter()
+
+
+@router.get("/", response_model=list[InboxMessageResponse])
+async def get_inbox_messages(
+    before: int | None = None,
+    limit: int = 50,
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """Get the reminders delivered to the in-app inbox
+
+    Newest first; pass the id of the last message as `before` for the next page.
+    """
+    query = select(InboxMessage).order_by(InboxMessage.id.desc()).limit(limit)
+    if before is not None:
+        query = query.where(InboxMessage.id < before)
+    messages = (await session.scalars(query)).all()
+    return [
+        InboxMessageResponse(
+            id=str(message.id),
+            task_id=str(message.task_id),
+            title=message.title,
+            body=message.body,
+            due_date=message.due_date.isoformat(),
+            create_time=message.create_time.isoformat(),
+        )
+        for message in messages
+    ]
@@ -0,0 +1,49 @@
+from fastapi import APIRouter
+
+from schemas.responses import (
+    DeliveryMetricsResponse,
+    EstimatorMetricsResponse,
+    RemindersMetricsResponse,
+    TaskEventsMetricsResponse,
+)
+
+from ..utils.difficulty_batcher import get_difficulty_batcher
+from ..utils.difficulty_cache import get_difficulty_cache
+from ..utils.estimator import get_in_flight_estimates
+from ..utils.estimator_gateway import get_estimator_gateway
+from ..utils.hedging import hedging_snapshot
+from ..utils.reminder_delivery import get_delivery_pipeline
+from ..utils.reminders import get_reminder_scheduler
+from ..utils.task_events import get_event_hub
+
+router = APIRouter()
+
+
+@router.get("/estimator", response_model=EstimatorMetricsResponse)
+async def get_estimator_metrics():
+    """Get in-process counters of the difficulty estimator"""
+    return EstimatorMetricsResponse(
+        cache=get_difficulty_cache().snapshot(),
+        batcher=get_difficulty_batcher().snapshot(),
+        single_flight=get_in_flight_estimates().snapshot(),
+        gateway=get_estimator_gateway().snapshot(),
+        hedging=hedging_snapshot(),
+    )
+
+
+@router.get("/events", response_model=TaskEventsMetricsResponse)
+async def get_task_events_metrics():
+    """Get in-process counters of the task events hub"""
+    return TaskEventsMetricsResponse(**get_event_hub().snapshot())
+
+
+@router.get("/reminders", response_model=RemindersMetricsResponse)
+async def get_reminders_metrics():
+    """Get in-process counters of the reminder scheduler"""
+    return RemindersMetricsResponse(**get_reminder_scheduler().snapshot())
+
+
+@router.get("/delivery", response_model=DeliveryMetricsResponse)
+async def get_delivery_metrics():
+    """Get in-process counters of the reminder delivery pipeline"""
+    return DeliveryMetricsResponse(sinks=get_delivery_pipeline().snapshot())
@@ -1,34 +1,112 @@
+import asyncio
+import contextlib
 import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from collections.abc import AsyncIterator
+from dataclasses import asdict
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from api import deps
+from core import database_session
+from core.config import get_settings
 from models import Task, TaskDifficulty
-from schemas.requests import CreateTaskRequest, UpdateTaskRequest
-from schemas.responses import TaskResponse
+from models.task import due_values
+from models.task_change import CHANGE_UPSERT
+from schemas.requests import (
+    BatchTasksRequest,
+    BatchUpdateTaskRequest,
+    CreateTaskRequest,
+    UpdateTaskRequest,
+)
+from schemas.responses import (
+    DIFFICULTY_PENDING,
+    DIFFICULTY_READY,
+    BatchItemResult,
+    BatchTasksResponse,
+    TaskChangesResponse,
+    TaskImportResponse,
+    TaskPageResponse,
+    TaskResponse,
+    TaskSearchResult,
+    TaskStatsResponse,
+    TaskTimeseriesResponse,
+)
 
-from ..utils.datetime import add_timezone_to_datetime, parse_date_or_error
-from ..utils.openrouter import TaskDifficultySchema, estimate_task_difficulty_full
+from ..utils.datetime import parse_date_or_error
+from ..utils.etag import etag_matches, not_modified, request_etag, set_etag
+from ..utils.estimation_queue import (
+    complete_pending_jobs,
+    delete_estimation_jobs,
+    enqueue_estimation,
+    notify_new_jobs,
+    save_task_difficulty,
+)
+from ..utils.estimator import stream_estimate_task_difficulty
+from ..utils.openrouter import TaskDifficultySchema, is_default_task_difficulty
+from ..utils.pagination import (
+    NEXT_CURSOR_HEADER,
+    SortOrder,
+    TaskSort,
+    decode_cursor_or_error,
+    fetch_task_page,
+)
+from ..utils.sse import SSE_HEADERS, SSE_MEDIA_TYPE, format_sse, format_sse_comment
+from ..utils.task_changes import (
+    get_journal_head,
+    get_journal_horizon,
+    get_tasks_version,
+    read_task_changes,
+    record_task_changes,
+)
+from ..utils.task_due import decode_due_cursor_or_error, fetch_due_page
+from ..utils.task_events import task_event_messages
+from ..utils.task_export import EXPORT_MEDIA_TYPES, ExportFormat, export_tasks
+from ..utils.task_import import ImportFormat, import_tasks
+from ..utils.task_json import encode_search_rows, encode_task_page, encode_task_rows
+from ..utils.task_queries import (
+    delete_difficulty_of_task,
+    difficulty_of_task,
+    task_with_difficulty,
+    tasks_with_difficulty,
+)
+from ..utils.task_rollups import MAX_BUCKETS as MAX_TIMESERIES_BUCKETS
+from ..utils.task_rollups import (
+    Granularity,
+    bucket_starts,
+    read_timeseries,
+    utc_day,
+)
+from ..utils.task_search import decode_search_cursor_or_error, search_terms, search_tasks
+from ..utils.task_stats import (
+    Counted,
+    apply_task_stats,
+    read_counted,
+    read_task_stats,
+    update_task_stats,
+)
 
 router = APIRouter()
 
+MAX_BATCH_OPERATIONS = 5000
 
-async def run_estimate_task_difficulty(
-    task: Task) -> TaskDifficultySchema:
-    if task.due_date is not None:
-        due_date = add_timezone_to_datetime(task.due_date)
-        created = add_timezone_to_datetime(task.create_time)
-        deadline_str = f"{due_date - created}"
-    else:
-        deadline_str = None
-    return await estimate_task_difficulty_full(
-        task_name=task.name, task_description=task.description, task_deadline=deadline_str
-    )
 
-def create_task_response(task: Task, task_difficulty: TaskDifficulty) -> TaskResponse:
+def create_task_response(task: Task, task_difficulty: TaskDifficulty | None) -> TaskResponse:
     return TaskResponse(
         id=str(task.id),
         name=task.name,
@@ -38,6 +116,7 @@ def create_task_response(task: Task, task_difficulty: TaskDifficulty) -> TaskRes
         difficulty_score=task_difficulty.score if task_difficulty else None,
         reasoning=task_difficulty.reasoning if task_difficulty else None,
         difficulty_estimation_time=task_difficulty.create_time.isoformat() if task_difficulty else None,
+        difficulty_status=DIFFICULTY_READY if task_difficulty else DIFFICULTY_PENDING,
         create_time=task.create_time.isoformat(),
         update_time=task.update_time.isoformat(),
     )
@@ -57,44 +136,554 @@ async def create_task(
         update_time=datetime.datetime.now(datetime.UTC),
     )
     session.add(db_task)
-    await session.commit()
-    task_difficulty = await run_estimate_task_difficulty(db_task)
-    db_task.difficulty_record = TaskDifficulty(
-        task_id=db_task.id,
-        score=task_difficulty.difficulty_score,
-        reasoning=task_difficulty.reasoning,
-        create_time=datetime.datetime.now(datetime.UTC),
+    await session.flush()
+    # Difficulty is estimated in the background, see api/utils/estimation_queue.py
+    await enqueue_estimation(session, [db_task.id])
+    await apply_task_stats(
+        session, [], [Counted(False, db_task.due_epoch_us, None, db_task.create_time, None)]
     )
-    session.add(db_task.difficulty_record)
+    await record_task_changes(session, created=[db_task.id])
     await session.commit()
-    return create_task_response(db_task, db_task.difficulty_record)
+    notify_new_jobs()
+    return create_task_response(db_task, None)
 
 
-@router.get("/", response_model=list[TaskResponse])
-async def get_tasks(
-    exclude_completed: bool = False, skip: int = 0, limit: int = 100, session: AsyncSession = Depends(deps.get_session)
+@router.post("/batch", response_model=BatchTasksResponse)
+async def batch_tasks(
+    batch: BatchTasksRequest, session: AsyncSession = Depends(deps.get_session)
 ):
-    """Get all tasks"""
-    query = select(Task).offset(skip).limit(limit).options(selectinload(Task.difficulty_record))
-    if exclude_completed:
-        query = query.filter(Task.is_completed == False)
-    tasks = await session.execute(query)
+    """Create, update and delete many tasks in one transaction
+
+    Creates are applied first, then updates, then deletes, each with
+    multi-row statements. Every operation gets a result at its index in its
+    array; invalid or unknown items do not fail the rest of the batch.
+    """
+    if len(batch.create) + len(batch.update) + len(batch.delete) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch.",
+        )
+    now = datetime.datetime.now(datetime.UTC)
+    before = await read_counted(session, [item.task_id for item in batch.update] + batch.delete)
+    created, created_ids = await _batch_create(session, batch.create, now)
+    updated, reestimate_ids = await _batch_update(session, batch.update, now)
+    deleted = await _batch_delete(session, batch.delete)
+    # All new tasks go to the estimation queue as one group
+    await enqueue_estimation(session, created_ids + reestimate_ids)
+    changed = {
+        kind: [int(result.task_id) for result in results if result.status == kind]
+        for kind, results in (("created", created), ("updated", updated), ("deleted", deleted))
+    }
+    if any(changed.values()):
+        await update_task_stats(session, before, [*created_ids, *before])
+        await record_task_changes(session, **changed)
+    await session.commit()
+    if created_ids or reestimate_ids:
+        notify_new_jobs()
+    return BatchTasksResponse(created=created, updated=updated, deleted=deleted)
+
+
+@router.post("/import", response_model=TaskImportResponse)
+async def import_task_file(
+    request: Request,
+    import_format: ImportFormat = Query("ndjson", alias="format"),
+    estimate: bool = True,
+):
+    """Import tasks from an NDJSON or CSV request body
+
+    The body is read as a stream and written in chunks, each in its own
+    transaction. Invalid rows are skipped and reported, the rest of the file
+    is imported. Estimates are scheduled in the background unless `estimate`
+    is false.
+    """
+    report = await import_tasks(request.stream(), import_format, estimate)
+    return TaskImportResponse(
+        rows=report.rows,
+        imported=report.imported,
+        failed=report.failed,
+        errors=[asdict(error) for error in report.errors],
+        elapsed_secs=report.elapsed_secs,
+        rows_per_sec=report.rows_per_sec,
+    )
+
+
+def _invalid(index: int, error: HTTPException) -> BatchItemResult:
+    return BatchItemResult(index=index, status="invalid", detail=error.detail)
+
+
+async def _batch_create(
+    session: AsyncSession, items: list[CreateTaskRequest], now: datetime.datetime
+) -> tuple[list[BatchItemResult], list[int]]:
+    results: list[BatchItemResult | None] = [None] * len(items)
+    rows: list[tuple[int, dict]] = []
+    for index, item in enumerate(items):
+        try:
+            due_date = parse_date_or_error(item.due_date) if item.due_date else None
+        except HTTPException as e:
+            results[index] = _invalid(index, e)
+            continue
+        rows.append(
+            (
+                index,
+                {
+                    "name": item.name,
+                    "description": item.description or "",
+                    **due_values(due_date),
+                    "is_completed": False,
+                    "create_time": now,
+                    "update_time": now,
+                },
+            )
+        )
+    if not rows:
+        return results, []
+
+    tasks = (
+        await session.scalars(
+            insert(Task).returning(Task, sort_by_parameter_order=True),
+            [values for _, values in rows],
+        )
+    ).all()
+    for (index, _), task in zip(rows, tasks, strict=True):
+        results[index] = BatchItemResult(
+            index=index,
+            status="created",
+            task_id=str(task.id),
+            task=create_task_response(task, None),
+        )
+    return results, [task.id for task in tasks]
+
+
+async def _batch_update(
+    session: AsyncSession, items: list[BatchUpdateTaskRequest], now: datetime.datetime
+) -> tuple[list[BatchItemResult], list[int]]:
+    results: list[BatchItemResult | None] = [None] * len(items)
+    # Task id -> is_completed, to stamp completed_at when it changes
+    existing = dict(
+        (
+            await session.execute(
+                select(Task.id, Task.is_completed).where(Task.id.in_({i.task_id for i in items}))
+            )
+        ).all()
+    )
+    rows: list[dict] = []
+    applied: list[tuple[int, int]] = []
+    reestimate_ids: list[int] = []
+    for index, item in enumerate(items):
+        if item.task_id not in existing:
+            results[index] = BatchItemResult(
+                index=index, status="not_found", task_id=str(item.task_id), detail="Task not found"
+            )
+            continue
+        values = {"id": item.task_id, "update_time": now}
+        if item.name is not None:
+            values["name"] = item.name
+        if item.description is not None:
+            values["description"] = item.description
+        if item.due_date is not None:
+            try:
+                values.update(due_values(parse_date_or_error(item.due_date)))
+            except HTTPException as e:
+                results[index] = _invalid(index, e)
+                continue
+        if item.is_completed is not None:
+            values["is_completed"] = item.is_completed
+            if item.is_completed != existing[item.task_id]:
+                values["completed_at"] = now if item.is_completed else None
+                existing[item.task_id] = item.is_completed
+        rows.append(values)
+        applied.append((index, item.task_id))
+        if item.difficulty_reestimate:
+            reestimate_ids.append(item.task_id)
+    if not rows:
+        return results, []
+
+    # Bulk UPDATE by primary key, rows with the same columns share a statement
+    await session.execute(update(Task), rows)
+    if reestimate_ids:
+        await session.execute(
+            delete(TaskDifficulty).where(TaskDifficulty.task_id.in_(reestimate_ids))
+        )
+    tasks = {
+        task.id: task
+        for task in (
+            await session.scalars(
+                select(Task)
+                .where(Task.id.in_({task_id for _, task_id in applied}))
+                .options(selectinload(Task.difficulty_record))
+                .execution_options(populate_existing=True)
+            )
+        ).all()
+    }
+    for index, task_id in applied:
+        task = tasks[task_id]
+        results[index] = BatchItemResult(
+            index=index,
+            status="updated",
+            task_id=str(task_id),
+            task=create_task_response(task, task.difficulty_record),
+        )
+    return results, list(dict.fromkeys(reestimate_ids))
+
+
+async def _batch_delete(session: AsyncSession, task_ids: list[int]) -> list[BatchItemResult]:
+    existing = set(
+        (await session.scalars(select(Task.id).where(Task.id.in_(set(task_ids))))).all()
+    )
+    if existing:
+        await delete_estimation_jobs(session, list(existing))
+        await session.execute(delete(TaskDifficulty).where(TaskDifficulty.task_id.in_(existing)))
+        await session.execute(delete(Task).where(Task.id.in_(existing)))
     return [
-        create_task_response(task, task.difficulty_record)
-        for task in tasks.scalars().all()
+        BatchItemResult(index=index, status="deleted", task_id=str(task_id))
+        if task_id in existing
+        else BatchItemResult(
+            index=index, status="not_found", task_id=str(task_id), detail="Task not found"
+        )
+        for index, task_id in enumerate(task_ids)
     ]
 
 
+@router.get("/", response_model=list[TaskResponse] | TaskPageResponse)
+async def get_tasks(
+    request: Request,
+    exclude_completed: bool = False,
+    skip: int = 0,
+    limit: int = 100,
+    sort: TaskSort = "id",
+    order: SortOrder = "asc",
+    cursor: str | None = None,
+    envelope: bool = False,
+    if_none_match: str | None = Header(None),
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """Get all tasks
+
+    Pages are sorted by `sort` (then id). When there are more tasks, the
+    `X-Next-Cursor` response header holds the `cursor` of the next page.
+    With `envelope` the body is a `TaskPageResponse` carrying it as well.
+    Answers 304 when `If-None-Match` has the ETag and no task changed since.
+    """
+    etag = request_etag(request, await get_tasks_version(session))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    after = decode_cursor_or_error(cursor, sort, order) if cursor else None
+    rows, next_cursor = await fetch_task_page(
+        session, sort, order, limit, after=after, skip=skip, exclude_completed=exclude_completed
+    )
+    # Already serialized, returned as is without response_model validation
+    content = encode_task_page(rows, next_cursor) if envelope else encode_task_rows(rows)
+    response = Response(content=content, media_type="application/json")
+    set_etag(response, etag)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+
+@router.get("/search", response_model=list[TaskSearchResult])
+async def search_all_tasks(
+    q: str,
+    exclude_completed: bool = False,
+    limit: int = 20,
+    cursor: str | None = None,
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """Search tasks by name and description
+
+    Every word of `q` must match, the last one as a prefix. Hits come by
+    relevance, each with a `snippet` of the matching text. When there are
+    more hits, the `X-Next-Cursor` response header holds the `cursor` of the
+    next page.
+    """
+    terms = search_terms(q)
+    if not terms:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="The search has no words."
+        )
+    after = decode_search_cursor_or_error(cursor, terms) if cursor else None
+    rows, next_cursor = await search_tasks(
+        session, terms, limit, after=after, exclude_completed=exclude_completed
+    )
+    response = Response(content=encode_search_rows(rows), media_type="application/json")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+
+@router.get("/due", response_model=list[TaskResponse])
+async def get_due_tasks(
+    from_: str = Query(alias="from"),
+    to: str = Query(),
+    exclude_completed: bool = False,
+    limit: int = 100,
+    cursor: str | None = None,
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """Get the tasks due from `from` (included) to `to` (excluded)
+
+    Dates without a time zone are UTC. Tasks come by due date, then id. When
+    there are more tasks, the `X-Next-Cursor` response header holds the
+    `cursor` of the next page.
+    """
+    start, end = parse_date_or_error(from_), parse_date_or_error(to)
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="`to` must be after `from`."
+        )
+    after = decode_due_cursor_or_error(cursor) if cursor else None
+    rows, next_cursor = await fetch_due_page(
+        session, start, end, limit, after=after, exclude_completed=exclude_completed
+    )
+    response = Response(content=encode_task_rows(rows), media_type="application/json")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+
+@router.get("/overdue", response_model=list[TaskResponse])
+async def get_overdue_tasks(
+    limit: int = 100,
+    cursor: str | None = None,
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """Get the open tasks whose due date has passed
+
+    Most overdue first. When there are more tasks, the `X-Next-Cursor`
+    response header holds the `cursor` of the next page.
+    """
+    after = decode_due_cursor_or_error(cursor) if cursor else None
+    rows, next_cursor = await fetch_due_page(
+        session,
+        None,
+        datetime.datetime.now(datetime.UTC),
+        limit,
+        after=after,
+        exclude_completed=True,
+    )
+    response = Response(content=encode_task_rows(rows), media_type="application/json")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+
+@router.get("/stats", response_model=TaskStatsResponse)
+async def get_task_stats(session: AsyncSession = Depends(deps.get_session)):
+    """Get task counts and difficulty statistics
+
+    Read from counters kept up to date by every write, as fast with a million
+    tasks as with ten. `overdue` counts the open tasks due by `overdue_as_of`,
+    the last reminder tick.
+    """
+    return await read_task_stats(session)
+
+
+@router.get("/stats/timeseries", response_model=TaskTimeseriesResponse)
+async def get_task_timeseries(
+    granularity: Granularity = "day",
+    from_: str | None = Query(default=None, alias="from"),
+    to: str | None = None,
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """Get tasks created and completed, and the difficulty of the completed
+    ones, per day or per week
+
+    Read from daily rollups. Days are UTC, weeks start on Monday and are
+    whole; buckets cover `from` (included) to `to` (excluded), by default the
+    last 30 days or 12 weeks up to today. Percentiles are exact scores.
+    """
+    end = (
+        utc_day(parse_date_or_error(to))
+        if to
+        else datetime.datetime.now(datetime.UTC).date() + datetime.timedelta(days=1)
+    )
+    if from_:
+        start = utc_day(parse_date_or_error(from_))
+    else:
+        start = end - datetime.timedelta(days=30 if granularity == "day" else 12 * 7)
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="`to` must be after `from`."
+        )
+    if len(bucket_starts(granularity, start, end)) > MAX_TIMESERIES_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_TIMESERIES_BUCKETS} buckets per request.",
+        )
+    return await read_timeseries(session, granularity, start, end)
+
+
+@router.get("/changes", response_model=TaskChangesResponse)
+async def get_task_changes(
+    since: str | None = None,
+    limit: int | None = None,
+    session: AsyncSession = Depends(deps.get_session),
+):
+    """Get the tasks changed since a cursor
+
+    Without `since`, returns only the current cursor: load GET /tasks/ after
+    that, then pass the last `cursor` as `since`. Call again right away while
+    `has_more` is true. Answers 410 when the changes since the cursor were
+    compacted away, the client then starts over without `since`.
+    """
+    if since is None:
+        return TaskChangesResponse(
+            upserts=[], deletes=[], cursor=str(await get_journal_head(session)), has_more=False
+        )
+    if not since.isdigit():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    if int(since) < await get_journal_horizon(session):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE, detail="Cursor expired, start over without since."
+        )
+    max_page_size = get_settings().change_journal.max_page_size
+    limit = max_page_size if limit is None else min(max(limit, 1), max_page_size)
+    ops, last_id, has_more = await read_task_changes(session, int(since), limit)
+
+    upserted = [task_id for task_id, op in ops.items() if op == CHANGE_UPSERT]
+    tasks = (await session.scalars(tasks_with_difficulty(upserted))).all() if upserted else []
+    found = {task.id for task in tasks}
+    # Tombstones, and upserts deleted again since the journal was read
+    deleted = [task_id for task_id in ops if task_id not in found]
+    return TaskChangesResponse(
+        upserts=[create_task_response(task, task.difficulty_record) for task in tasks],
+        deletes=[str(task_id) for task_id in deleted],
+        cursor=str(last_id),
+        has_more=has_more,
+    )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}}},
+)
+async def export_all_tasks(
+    export_format: ExportFormat = Query("ndjson", alias="format"), exclude_completed: bool = False
+):
+    """Export every task as NDJSON (one task object per line) or CSV
+
+    Streamed in id order; fields are those of GET /tasks/.
+    """
+    return StreamingResponse(
+        export_tasks(export_format, exclude_completed),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="tasks.{export_format}"'},
+    )
+
+
+@router.get(
+    "/events",
+    response_class=StreamingResponse,
+    responses={200: {"content": {SSE_MEDIA_TYPE: {}}}},
+)
+async def stream_task_events():
+    """Push task changes as Server-Sent Events, for clients without WebSocket
+
+    Same messages as the `/tasks/events` WebSocket, the event name is the
+    message `type`.
+    """
+
+    async def events() -> AsyncIterator[str]:
+        async for message in task_event_messages():
+            if message is None:
+                yield format_sse_comment("keepalive")
+            else:
+                yield format_sse(message["type"], message)
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+@router.websocket("/events")
+async def task_events_websocket(websocket: WebSocket):
+    """Push task changes, one JSON message per changed task
+
+    `type` is "created", "updated", "deleted" or "difficulty_ready", with the
+    `task_id`. Several changes of one task the client has not received yet
+    are sent as one. A client falling too far behind gets a "resync" message
+    and is disconnected, it then catches up through GET /tasks/changes.
+    """
+    await websocket.accept()
+
+    async def send_messages() -> None:
+        async with contextlib.aclosing(task_event_messages()) as messages:
+            async for message in messages:
+                if message is not None:
+                    await websocket.send_json(message)
+
+    async def wait_for_disconnect() -> None:
+        with contextlib.suppress(WebSocketDisconnect):
+            while True:
+                await websocket.receive_text()
+
+    sender = asyncio.create_task(send_messages())
+    receiver = asyncio.create_task(wait_for_disconnect())
+    done, _ = await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+    sender.cancel()
+    receiver.cancel()
+    if sender in done:
+        await websocket.close()
+
+
 @router.get("/{task_id}", response_model=TaskResponse)
-async def get_task(task_id: int, session: AsyncSession = Depends(deps.get_session)):
+async def get_task(
+    task_id: int,
+    request: Request,
+    response: Response,
+    if_none_match: str | None = Header(None),
+    session: AsyncSession = Depends(deps.get_session),
+):
     """Get a specific task by ID"""
-    task = await session.execute(select(Task).filter(Task.id == task_id).options(selectinload(Task.difficulty_record)))
-    if not task:
+    etag = request_etag(request, await get_tasks_version(session))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    task = await session.execute(task_with_difficulty(task_id))
+    chosen = task.scalar_one_or_none()
+    if not chosen:
         raise HTTPException(status_code=404, detail="Task not found")
-    chosen = task.scalar_one()
+    set_etag(response, etag)
     return create_task_response(chosen, chosen.difficulty_record)
 
 
+@router.get(
+    "/{task_id}/difficulty/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {SSE_MEDIA_TYPE: {}}}},
+)
+async def stream_task_difficulty(task_id: int):
+    """Estimate the difficulty of a task, streaming the model output as Server-Sent Events.
+
+    Emits `reasoning` and `token` events while the model writes, then one
+    `score` event once the final difficulty has been validated and saved.
+    """
+    # Own short-lived sessions, none is held while the model is streaming
+    async with database_session.get_async_session() as session:
+        task = await session.get(Task, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def events() -> AsyncIterator[str]:
+        yield format_sse_comment("estimating")
+        async for kind, chunk in stream_estimate_task_difficulty(task):
+            if kind != "score":
+                yield format_sse(kind, {"text": chunk})
+                continue
+            assert isinstance(chunk, TaskDifficultySchema)
+            if is_default_task_difficulty(chunk.difficulty_score, chunk.reasoning):
+                # The upstream failed: keep the stored score and the pending
+                # job, the worker retries it
+                yield format_sse("score", chunk.model_dump())
+                return
+            async with database_session.get_async_session() as session:
+                if await session.get(Task, task_id) is None:
+                    return
+                await save_task_difficulty(session, task_id, chunk)
+                await complete_pending_jobs(session, task_id)
+                await session.commit()
+            yield format_sse("score", chunk.model_dump())
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
 @router.put("/{task_id}", response_model=TaskResponse)
 async def update_task(
     task_id: int,
@@ -105,6 +694,7 @@ async def update_task(
     db_task = await session.get(Task, task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
+    before = await read_counted(session, [task_id])
 
     if task.name is not None:
         db_task.name = task.name
@@ -117,19 +707,19 @@ async def update_task(
     db_task.update_time = datetime.datetime.now(datetime.UTC)
 
     if task.difficulty_reestimate:
-        task_difficulty = await run_estimate_task_difficulty(db_task)
-        db_task.difficulty_record = TaskDifficulty(
-            task_id=db_task.id,
-            score=task_difficulty.difficulty_score,
-            reasoning=task_difficulty.reasoning,
-            create_time=datetime.datetime.now(datetime.UTC),
-        )
-        session.add(db_task.difficulty_record)
-    task_difficulty = await session.execute(select(TaskDifficulty).filter(TaskDifficulty.task_id == task_id))
+        # Drop the stale score, the task reads as pending until the worker
+        # has written the new one
+        await session.execute(delete_difficulty_of_task(task_id))
+        await enqueue_estimation(session, [task_id])
+    task_difficulty = await session.execute(difficulty_of_task(task_id))
 
     session.add(db_task)
+    await update_task_stats(session, before, [task_id])
+    await record_task_changes(session, updated=[task_id])
     await session.commit()
-    return create_task_response(db_task, task_difficulty.scalar_one())
+    if task.difficulty_reestimate:
+        notify_new_jobs()
+    return create_task_response(db_task, task_difficulty.scalar_one_or_none())
 
 
 @router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -138,7 +728,11 @@ async def delete_task(task_id: int, session: AsyncSession = Depends(deps.get_ses
     db_task = await session.get(Task, task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
+    before = await read_counted(session, [task_id])
+    await delete_estimation_jobs(session, [task_id])
     await session.delete(db_task)
     if db_task.difficulty_record:
         await session.delete(db_task.difficulty_record)
+    await apply_task_stats(session, before.values(), [])
+    await record_task_changes(session, deleted=[task_id])
     await session.commit()
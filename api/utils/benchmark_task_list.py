@@ -0,0 +1,139 @@
+# Compares the two ways of building the body of GET /tasks/:
+#
+# - "orm": Task objects with their difficulty records selectinload'ed, turned
+#   into TaskResponse models, then validated and serialized as FastAPI does
+#   for a response_model (the list path before task_json.py);
+# - "rows": column rows from `fetch_task_page` encoded by `encode_task_rows`.
+#
+#   python -m api.utils.benchmark_task_list [--tasks 10000] [--limits 100 10000]
+#                                           [--repeat 20]
+#
+# Runs against a scratch SQLite database holding --tasks tasks (4 in 5 of
+# them scored), never the configured one. Memory is the peak traced by
+# tracemalloc while building one response.
+
+import argparse
+import asyncio
+import datetime
+import json
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from api.endpoints.tasks import create_task_response
+from models import Base, Task, TaskDifficulty
+from schemas.responses import TaskResponse
+
+from .pagination import fetch_task_page
+from .task_json import encode_task_rows
+
+_RESPONSES = TypeAdapter(list[TaskResponse])
+
+
+async def orm_body(session: AsyncSession, limit: int) -> bytes:
+    tasks = (
+        await session.scalars(
+            select(Task).options(selectinload(Task.difficulty_record)).order_by(Task.id).limit(limit)
+        )
+    ).all()
+    responses = [create_task_response(task, task.difficulty_record) for task in tasks]
+    # fastapi.routing.serialize_response, then JSONResponse.render
+    value = _RESPONSES.validate_python([response.model_dump() for response in responses])
+    content = _RESPONSES.dump_python(value, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+async def rows_body(session: AsyncSession, limit: int) -> bytes:
+    rows, _ = await fetch_task_page(session, "id", "asc", limit)
+    return encode_task_rows(rows)
+
+
+async def _seed(sessionmaker: async_sessionmaker, count: int) -> None:
+    now = datetime.datetime.now(datetime.UTC)
+    async with sessionmaker() as session:
+        await session.execute(
+            insert(Task),
+            [
+                {
+                    "name": f"Task {i}",
+                    "description": "Something that has to be done at some point",
+                    "due_date": now + datetime.timedelta(hours=i) if i % 3 else None,
+                    "is_completed": i % 4 == 0,
+                    "create_time": now,
+                    "update_time": now,
+                }
+                for i in range(count)
+            ],
+        )
+        await session.execute(
+            insert(TaskDifficulty),
+            [
+                {"task_id": i, "score": i % 100, "reasoning": "Looks doable", "create_time": now}
+                for i in range(1, count + 1)
+                if i % 5
+            ],
+        )
+        await session.commit()
+
+
+async def _measure(
+    sessionmaker: async_sessionmaker,
+    build: Callable[[AsyncSession, int], Awaitable[bytes]],
+    limit: int,
+    repeat: int,
+) -> tuple[float, float, float]:
+    """Rows per second, milliseconds and peak KiB per request."""
+    async with sessionmaker() as session:
+        await build(session, limit)  # warm-up
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        # A session per request, as the endpoint gets
+        async with sessionmaker() as session:
+            await build(session, limit)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    async with sessionmaker() as session:
+        tracemalloc.reset_peak()
+        await build(session, limit)
+        _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return limit * repeat / elapsed, elapsed / repeat * 1000, peak / 1024
+
+
+async def benchmark(tasks: int, limits: list[int], repeat: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(directory) / 'benchmark.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+        await _seed(sessionmaker, tasks)
+
+        async with sessionmaker() as session:
+            assert json.loads(await orm_body(session, 50)) == json.loads(
+                await rows_body(session, 50)
+            )
+
+        print(f"{'path':<6} {'limit':>7} {'rows/s':>10} {'ms/request':>11} {'peak KiB':>10}")
+        for limit in limits:
+            for name, build in (("orm", orm_body), ("rows", rows_body)):
+                rows_per_sec, ms, peak_kib = await _measure(sessionmaker, build, limit, repeat)
+                print(f"{name:<6} {limit:>7} {rows_per_sec:>10.0f} {ms:>11.2f} {peak_kib:>10.0f}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the GET /tasks/ list paths")
+    parser.add_argument("--tasks", type=int, default=10_000)
+    parser.add_argument("--limits", type=int, nargs="+", default=[100, 10_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.tasks, args.limits, args.repeat))
@@ -8,10 +8,14 @@ def add_timezone_to_datetime(dt: datetime.datetime) -> datetime.datetime:
         return dt.replace(tzinfo=datetime.UTC)
     return dt
 
+def parse_date(date_str: str) -> datetime.datetime:
+    """ISO 8601 date or datetime, naive values are UTC. Raises ValueError."""
+    return add_timezone_to_datetime(datetime.datetime.fromisoformat(date_str))
+
+
 def parse_date_or_error(date_str: str) -> datetime.datetime:
     try:
-        dt = datetime.datetime.fromisoformat(date_str)
-        return add_timezone_to_datetime(dt)
+        return parse_date(date_str)
     except ValueError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
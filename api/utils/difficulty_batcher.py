@@ -0,0 +1,129 @@
+# Micro-batching of difficulty estimates.
+#
+# Estimates requested within `batch_window_ms` of each other (or until
+# `batch_max_size` are waiting) are sent as one multi-task prompt, then each
+# caller gets its own result. Items the batch reply does not cover are retried
+# with single calls, so a bad batch never costs more than the unbatched path.
+
+import asyncio
+import logging
+from dataclasses import asdict, dataclass, field
+
+from core.config import get_settings
+
+from .openrouter import (
+    TaskDifficultySchema,
+    estimate_task_difficulty_batch,
+    estimate_task_difficulty_full,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingEstimate:
+    name: str
+    description: str | None
+    deadline: str | None
+    future: asyncio.Future[TaskDifficultySchema] = field(repr=False)
+
+
+@dataclass
+class BatcherStats:
+    batches: int = 0
+    batched_items: int = 0
+    single_calls: int = 0
+    fallbacks: int = 0
+
+
+class DifficultyBatcher:
+    def __init__(self, window_secs: float, max_batch_size: int) -> None:
+        self.window_secs = window_secs
+        self.max_batch_size = max_batch_size
+        self.stats = BatcherStats()
+        self._pending: list[_PendingEstimate] = []
+        self._timer: asyncio.TimerHandle | None = None
+        # Strong references so flushes are not garbage collected mid-flight
+        self._flushes: set[asyncio.Task[None]] = set()
+
+    async def estimate(
+        self, name: str, description: str | None, deadline: str | None
+    ) -> TaskDifficultySchema:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[TaskDifficultySchema] = loop.create_future()
+        self._pending.append(_PendingEstimate(name, description, deadline, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_secs, self._flush_now)
+        return await future
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        # Callers that gave up while waiting are not sent upstream
+        batch = [item for item in batch if not item.future.done()]
+        if not batch:
+            return
+        task = asyncio.create_task(self._send(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _send(self, batch: list[_PendingEstimate]) -> None:
+        try:
+            if len(batch) == 1:
+                results: list[TaskDifficultySchema | None] = [None]
+            else:
+                self.stats.batches += 1
+                self.stats.batched_items += len(batch)
+                results = await estimate_task_difficulty_batch(
+                    [(item.name, item.description, item.deadline) for item in batch]
+                )
+            retry = []
+            for item, result in zip(batch, results, strict=True):
+                if result is None:
+                    retry.append(item)
+                elif not item.future.done():
+                    item.future.set_result(result)
+            if len(batch) > 1:
+                self.stats.fallbacks += len(retry)
+            await asyncio.gather(*(self._send_single(item) for item in retry))
+        except Exception as e:
+            logger.exception("Difficulty batch failed")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+
+    async def _send_single(self, item: _PendingEstimate) -> None:
+        self.stats.single_calls += 1
+        try:
+            result = await estimate_task_difficulty_full(
+                task_name=item.name,
+                task_description=item.description,
+                task_deadline=item.deadline,
+            )
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        if not item.future.done():
+            item.future.set_result(result)
+
+    def snapshot(self) -> dict[str, int]:
+        return {**asdict(self.stats), "waiting": len(self._pending)}
+
+
+_DIFFICULTY_BATCHER: DifficultyBatcher | None = None
+
+
+def get_difficulty_batcher() -> DifficultyBatcher:
+    global _DIFFICULTY_BATCHER
+    if _DIFFICULTY_BATCHER is None:
+        settings = get_settings().estimator
+        _DIFFICULTY_BATCHER = DifficultyBatcher(
+            window_secs=settings.batch_window_ms / 1000,
+            max_batch_size=settings.batch_max_size,
+        )
+    return _DIFFICULTY_BATCHER
@@ -0,0 +1,277 @@
+# Content-addressed cache of difficulty estimates.
+#
+# Keys are a sha256 over the normalized task name and description, a coarse
+# deadline bucket, the model and the prompt version, so recurring tasks
+# ("Pay rent", "Weekly report") skip the LLM round trip. Lookups go through an
+# in-memory LRU with TTL first, then the `difficulty_cache` table which is
+# shared by every uvicorn worker and survives restarts.
+#
+# Pre-fill the persistent tier from existing scores with:
+#   python -m api.utils.difficulty_cache warm
+
+import asyncio
+import datetime
+import hashlib
+import logging
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import database_session
+from core.config import get_settings
+from models import DifficultyCacheEntry, Task, TaskDifficulty
+
+from .datetime import add_timezone_to_datetime
+from .openrouter import PROMPT_VERSION, TaskDifficultySchema, is_default_task_difficulty
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in hours) of the deadline buckets that are part of the key
+_DEADLINE_BUCKETS_HOURS = (1, 6, 24, 72, 168, 720, 2160)
+
+
+def deadline_bucket(deadline: datetime.timedelta | None) -> str:
+    if deadline is None:
+        return "none"
+    hours = deadline.total_seconds() / 3600
+    if hours <= 0:
+        return "overdue"
+    for bound in _DEADLINE_BUCKETS_HOURS:
+        if hours < bound:
+            return f"<{bound}h"
+    return f">={_DEADLINE_BUCKETS_HOURS[-1]}h"
+
+
+def _normalize(text: str | None) -> str:
+    return " ".join((text or "").casefold().split())
+
+
+def difficulty_cache_key(
+    name: str,
+    description: str | None,
+    deadline: datetime.timedelta | None,
+    model: str,
+    prompt_version: int = PROMPT_VERSION,
+) -> str:
+    parts = (
+        _normalize(name),
+        _normalize(description),
+        deadline_bucket(deadline),
+        model,
+        str(prompt_version),
+    )
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    persistent_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+
+class DifficultyCache:
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_secs: float,
+        persistent_ttl_secs: float,
+        persistent: bool = True,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_secs = ttl_secs
+        self.persistent_ttl_secs = persistent_ttl_secs
+        self.persistent = persistent
+        self.stats = CacheStats()
+        # key -> (monotonic expiry, value), least recently used first
+        self._entries: OrderedDict[str, tuple[float, TaskDifficultySchema]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_local(self, key: str) -> TaskDifficultySchema | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put_local(self, key: str, value: TaskDifficultySchema) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_secs, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def get(self, key: str) -> TaskDifficultySchema | None:
+        value = self.get_local(key)
+        if value is not None:
+            self.stats.hits += 1
+            return value
+        if self.persistent:
+            try:
+                value = await self._get_persistent(key)
+            except Exception:
+                logger.exception("Difficulty cache lookup failed")
+            if value is not None:
+                self.stats.persistent_hits += 1
+                self.put_local(key, value)
+                return value
+        self.stats.misses += 1
+        return None
+
+    async def put(self, key: str, value: TaskDifficultySchema, model: str) -> None:
+        if is_default_task_difficulty(value.difficulty_score, value.reasoning):
+            # Placeholder scores must not hide a real estimate later
+            return
+        self.put_local(key, value)
+        if self.persistent:
+            try:
+                async with database_session.get_async_session() as session:
+                    await upsert_cache_entries(
+                        session, [(key, value, model)], self.persistent_ttl_secs
+                    )
+                    await session.commit()
+            except Exception:
+                logger.exception("Difficulty cache write failed")
+
+    async def _get_persistent(self, key: str) -> TaskDifficultySchema | None:
+        async with database_session.get_async_session() as session:
+            entry = await session.get(DifficultyCacheEntry, key)
+        if entry is None:
+            return None
+        if add_timezone_to_datetime(entry.expires_at) <= datetime.datetime.now(datetime.UTC):
+            return None
+        return TaskDifficultySchema(difficulty_score=entry.score, reasoning=entry.reasoning)
+
+    def snapshot(self) -> dict[str, int]:
+        return {**asdict(self.stats), "size": len(self._entries)}
+
+
+async def upsert_cache_entries(
+    session: AsyncSession,
+    entries: list[tuple[str, TaskDifficultySchema, str]],
+    ttl_secs: float,
+) -> None:
+    if not entries:
+        return
+    expires_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=ttl_secs)
+    stmt = database_session.dialect_insert(session, DifficultyCacheEntry).values(
+        [
+            {
+                "key": key,
+                "score": value.difficulty_score,
+                "reasoning": value.reasoning,
+                "model": model,
+                "prompt_version": PROMPT_VERSION,
+                "expires_at": expires_at,
+            }
+            for key, value, model in entries
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DifficultyCacheEntry.key],
+        set_={
+            "score": stmt.excluded.score,
+            "reasoning": stmt.excluded.reasoning,
+            "model": stmt.excluded.model,
+            "prompt_version": stmt.excluded.prompt_version,
+            "expires_at": stmt.excluded.expires_at,
+        },
+    )
+    await session.execute(stmt)
+
+
+_DIFFICULTY_CACHE: DifficultyCache | None = None
+
+
+def get_difficulty_cache() -> DifficultyCache:
+    global _DIFFICULTY_CACHE
+    if _DIFFICULTY_CACHE is None:
+        settings = get_settings().estimator
+        _DIFFICULTY_CACHE = DifficultyCache(
+            max_entries=settings.cache_max_entries,
+            ttl_secs=settings.cache_ttl_secs,
+            persistent_ttl_secs=settings.cache_persistent_ttl_secs,
+        )
+    return _DIFFICULTY_CACHE
+
+
+async def warm_cache(chunk_size: int = 1000) -> int:
+    """Fill the persistent tier from existing `task_difficulties` rows.
+
+    Rows carry no model or prompt version, they are assumed to come from the
+    currently configured ones. Default (fallback) scores are skipped.
+    """
+    model = get_settings().openrouter.model
+    ttl = get_settings().estimator.cache_persistent_ttl_secs
+    query = (
+        select(
+            Task.name,
+            Task.description,
+            Task.due_date,
+            Task.create_time,
+            TaskDifficulty.score,
+            TaskDifficulty.reasoning,
+        )
+        .join(TaskDifficulty, TaskDifficulty.task_id == Task.id)
+        .order_by(TaskDifficulty.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    written = 0
+    async with database_session.get_async_session() as read_session:
+        result = await read_session.stream(query)
+        async for rows in result.partitions():
+            entries: dict[str, tuple[str, TaskDifficultySchema, str]] = {}
+            for row in rows:
+                if is_default_task_difficulty(row.score, row.reasoning):
+                    continue
+                deadline = None
+                if row.due_date is not None:
+                    deadline = add_timezone_to_datetime(row.due_date) - add_timezone_to_datetime(
+                        row.create_time
+                    )
+                key = difficulty_cache_key(row.name, row.description, deadline, model)
+                entries[key] = (
+                    key,
+                    TaskDifficultySchema(difficulty_score=row.score, reasoning=row.reasoning),
+                    model,
+                )
+            async with database_session.get_async_session() as write_session:
+                await upsert_cache_entries(write_session, list(entries.values()), ttl)
+                await write_session.commit()
+            written += len(entries)
+    return written
+
+
+async def purge_expired() -> int:
+    async with database_session.get_async_session() as session:
+        result = await session.execute(
+            delete(DifficultyCacheEntry).where(
+                DifficultyCacheEntry.expires_at <= datetime.datetime.now(datetime.UTC)
+            )
+        )
+        await session.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "warm":
+        print(f"Cached {asyncio.run(warm_cache())} difficulty estimates")
+    elif command == "purge":
+        print(f"Removed {asyncio.run(purge_expired())} expired cache entries")
+    else:
+        print("Usage: python -m api.utils.difficulty_cache [warm|purge]")
+        sys.exit(1)
@@ -0,0 +1,396 @@
+# Durable difficulty estimation queue.
+#
+# Task handlers only enqueue an `EstimationJob` row in their own transaction;
+# an `EstimationWorker` (in-process from the app lifespan, or standalone with
+# `python -m api.utils.estimation_queue`) claims jobs, calls the estimator
+# without holding a DB session, and writes the resulting `TaskDifficulty`.
+#
+# Claiming is a compare-and-set UPDATE guarded by the job status, so several
+# workers (processes or hosts) never run the same job twice. Jobs whose worker
+# died are reclaimed once their lease expires; a live worker renews the lease
+# of its jobs every third of it, however long the gateway's retries, pauses
+# and hedged calls take.
+#
+# The estimator answers upstream failures (timeouts, 429s, 5xx, an open
+# circuit) with the placeholder score; the worker treats it as a failed
+# attempt and retries with backoff. The placeholder is only saved once the
+# job runs out of attempts.
+
+import asyncio
+import datetime
+import logging
+import os
+import socket
+import uuid
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import database_session
+from core.config import get_settings
+from models import EstimationJob, Task, TaskDifficulty
+from models.estimation_job import JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_RUNNING
+
+from . import openrouter
+from .estimator import run_estimate_task_difficulty
+from .local_estimator import load_local_model_in_background
+from .openrouter import (
+    TaskDifficultySchema,
+    close_http_client,
+    default_task_difficulty,
+    is_default_task_difficulty,
+    start_http_client,
+)
+from .task_changes import record_task_changes
+from .task_events import close_event_hub, start_event_hub
+from .task_stats import read_counted, update_task_stats
+
+logger = logging.getLogger(__name__)
+
+# Set whenever a job is enqueued in this process so the in-process worker
+# does not have to wait for its next poll
+_NEW_JOBS = asyncio.Event()
+
+
+class EstimateUnavailableError(Exception):
+    """The estimator gave the placeholder score instead of an estimate."""
+
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    job_id: int
+    task_id: int
+    attempts: int
+    name: str
+    description: str | None
+    due_date: datetime.datetime | None
+    create_time: datetime.datetime
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC)
+
+
+async def enqueue_estimation(session: AsyncSession, task_ids: Sequence[int]) -> None:
+    """Add pending jobs for `task_ids` to the session, skipping tasks that
+    already have one waiting. The caller commits."""
+    if not task_ids:
+        return
+    already_pending = set(
+        (
+            await session.execute(
+                select(EstimationJob.task_id).where(
+                    EstimationJob.task_id.in_(task_ids),
+                    EstimationJob.status == JOB_PENDING,
+                )
+            )
+        ).scalars()
+    )
+    now = _now()
+    session.add_all(
+        EstimationJob(task_id=task_id, status=JOB_PENDING, attempts=0, run_after=now)
+        for task_id in dict.fromkeys(task_ids)
+        if task_id not in already_pending
+    )
+
+
+async def delete_estimation_jobs(session: AsyncSession, task_ids: Sequence[int]) -> None:
+    await session.execute(delete(EstimationJob).where(EstimationJob.task_id.in_(task_ids)))
+
+
+async def complete_pending_jobs(session: AsyncSession, task_id: int) -> None:
+    """Mark waiting jobs of a task done, e.g. after it was scored by other means."""
+    await session.execute(
+        update(EstimationJob)
+        .where(EstimationJob.task_id == task_id, EstimationJob.status == JOB_PENDING)
+        .values(status=JOB_DONE)
+    )
+
+
+def notify_new_jobs() -> None:
+    """Wake up the in-process worker, call after committing enqueued jobs."""
+    _NEW_JOBS.set()
+
+
+def _claimable(now: datetime.datetime):
+    return or_(
+        and_(EstimationJob.status == JOB_PENDING, EstimationJob.run_after <= now),
+        and_(EstimationJob.status == JOB_RUNNING, EstimationJob.locked_until < now),
+    )
+
+
+async def claim_jobs(worker_id: str, limit: int) -> list[ClaimedJob]:
+    settings = get_settings().estimator
+    claimed: list[ClaimedJob] = []
+    async with database_session.get_async_session() as session:
+        now = _now()
+        candidates = (
+            select(EstimationJob.id)
+            .where(_claimable(now))
+            .order_by(EstimationJob.run_after, EstimationJob.id)
+            .limit(limit)
+        )
+        if session.bind.dialect.name == "postgresql":
+            candidates = candidates.with_for_update(skip_locked=True)
+        job_ids = (await session.execute(candidates)).scalars().all()
+
+        locked_until = now + datetime.timedelta(seconds=settings.job_lease_secs)
+        for job_id in job_ids:
+            # Compare-and-set: only one worker can move the row out of the
+            # claimable state, the others see rowcount == 0
+            result = await session.execute(
+                update(EstimationJob)
+                .where(EstimationJob.id == job_id, _claimable(now))
+                .values(
+                    status=JOB_RUNNING,
+                    locked_by=worker_id,
+                    locked_until=locked_until,
+                    attempts=EstimationJob.attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                continue
+            row = (
+                await session.execute(
+                    select(
+                        EstimationJob.task_id,
+                        EstimationJob.attempts,
+                        Task.name,
+                        Task.description,
+                        Task.due_date,
+                        Task.create_time,
+                    )
+                    .outerjoin(Task, Task.id == EstimationJob.task_id)
+                    .where(EstimationJob.id == job_id)
+                )
+            ).one()
+            if row.name is None:
+                # The task was deleted in the meantime, nothing to estimate
+                await session.execute(
+                    update(EstimationJob)
+                    .where(EstimationJob.id == job_id)
+                    .values(status=JOB_DONE, locked_by=None, locked_until=None)
+                )
+                continue
+            claimed.append(
+                ClaimedJob(
+                    job_id=job_id,
+                    task_id=row.task_id,
+                    attempts=row.attempts,
+                    name=row.name,
+                    description=row.description,
+                    due_date=row.due_date,
+                    create_time=row.create_time,
+                )
+            )
+        await session.commit()
+    return claimed
+
+
+async def save_task_difficulty(
+    session: AsyncSession, task_id: int, difficulty: TaskDifficultySchema
+) -> None:
+    """Insert or overwrite the difficulty record of a task. The caller commits."""
+    before = await read_counted(session, [task_id])
+    record = await session.scalar(
+        select(TaskDifficulty).where(TaskDifficulty.task_id == task_id)
+    )
+    if record is None:
+        record = TaskDifficulty(task_id=task_id)
+        session.add(record)
+    record.score = difficulty.difficulty_score
+    record.reasoning = difficulty.reasoning
+    record.create_time = _now()
+    await update_task_stats(session, before, [task_id])
+    await record_task_changes(session, difficulty_ready=[task_id])
+
+
+async def renew_lease(job: ClaimedJob, worker_id: str) -> bool:
+    """Push the lease of a running job forward, False once it was lost."""
+    locked_until = _now() + datetime.timedelta(seconds=get_settings().estimator.job_lease_secs)
+    async with database_session.get_async_session() as session:
+        result = await session.execute(
+            update(EstimationJob)
+            .where(
+                EstimationJob.id == job.job_id,
+                EstimationJob.status == JOB_RUNNING,
+                EstimationJob.locked_by == worker_id,
+            )
+            .values(locked_until=locked_until)
+        )
+        await session.commit()
+    return result.rowcount == 1
+
+
+async def complete_job(
+    job: ClaimedJob, worker_id: str, difficulty: TaskDifficultySchema
+) -> bool:
+    async with database_session.get_async_session() as session:
+        result = await session.execute(
+            update(EstimationJob)
+            .where(
+                EstimationJob.id == job.job_id,
+                EstimationJob.status == JOB_RUNNING,
+                EstimationJob.locked_by == worker_id,
+            )
+            .values(status=JOB_DONE, locked_by=None, locked_until=None, last_error=None)
+        )
+        if result.rowcount != 1:
+            # Lease expired and somebody else owns the job now
+            await session.rollback()
+            return False
+        if await session.get(Task, job.task_id) is not None:
+            await save_task_difficulty(session, job.task_id, difficulty)
+        await session.commit()
+    return True
+
+
+async def fail_job(
+    job: ClaimedJob, worker_id: str, error: BaseException, retry: bool = True
+) -> None:
+    """Put the job back with backoff, or after its last attempt (or without
+    `retry`) mark it failed and give the task the default score."""
+    settings = get_settings().estimator
+    give_up = not retry or job.attempts >= settings.job_max_attempts
+    if give_up:
+        values = {"status": JOB_FAILED}
+    else:
+        backoff = settings.job_retry_backoff_secs * 2 ** (job.attempts - 1)
+        values = {
+            "status": JOB_PENDING,
+            "run_after": _now() + datetime.timedelta(seconds=backoff),
+        }
+    async with database_session.get_async_session() as session:
+        result = await session.execute(
+            update(EstimationJob)
+            .where(
+                EstimationJob.id == job.job_id,
+                EstimationJob.status == JOB_RUNNING,
+                EstimationJob.locked_by == worker_id,
+            )
+            .values(
+                locked_by=None,
+                locked_until=None,
+                last_error=f"{error.__class__.__name__}: {error}",
+                **values,
+            )
+        )
+        if give_up and result.rowcount == 1 and await session.get(Task, job.task_id):
+            # Out of attempts, fall back to the default score so the task
+            # does not stay pending forever
+            await save_task_difficulty(
+                session,
+                job.task_id,
+                default_task_difficulty(
+                    f"Estimation failed after {job.attempts} attempts. Default score applied."
+                ),
+            )
+        await session.commit()
+
+
+class EstimationWorker:
+    def __init__(
+        self,
+        worker_id: str | None = None,
+        concurrency: int | None = None,
+        poll_interval: float | None = None,
+    ) -> None:
+        settings = get_settings().estimator
+        self.worker_id = worker_id or (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.concurrency = concurrency or settings.worker_concurrency
+        self.poll_interval = poll_interval or settings.worker_poll_interval_secs
+        self._stopping = asyncio.Event()
+
+    async def _keep_leased(self, job: ClaimedJob) -> None:
+        while True:
+            await asyncio.sleep(get_settings().estimator.job_lease_secs / 3)
+            try:
+                if not await renew_lease(job, self.worker_id):
+                    logger.warning("Estimation job %s lost its lease", job.job_id)
+                    return
+            except Exception:
+                logger.exception("Failed to renew the lease of estimation job %s", job.job_id)
+
+    async def process(self, job: ClaimedJob) -> None:
+        renewal = asyncio.create_task(self._keep_leased(job))
+        try:
+            await self._process(job)
+        finally:
+            renewal.cancel()
+
+    async def _process(self, job: ClaimedJob) -> None:
+        try:
+            difficulty = await run_estimate_task_difficulty(job)
+        except Exception as e:
+            logger.exception("Estimation job %s failed", job.job_id)
+            await fail_job(job, self.worker_id, e)
+            return
+        if is_default_task_difficulty(difficulty.difficulty_score, difficulty.reasoning):
+            logger.warning(
+                "Estimation job %s got no estimate: %s", job.job_id, difficulty.reasoning
+            )
+            # Without an API key no attempt can do better
+            await fail_job(
+                job,
+                self.worker_id,
+                EstimateUnavailableError(difficulty.reasoning),
+                retry=bool(openrouter.OPENROUTER_API_KEY),
+            )
+            return
+        if not await complete_job(job, self.worker_id, difficulty):
+            logger.warning("Estimation job %s lost its lease", job.job_id)
+
+    async def run_once(self) -> int:
+        jobs = await claim_jobs(self.worker_id, self.concurrency)
+        if jobs:
+            await asyncio.gather(*(self.process(job) for job in jobs))
+        return len(jobs)
+
+    async def run(self) -> None:
+        logger.info("Estimation worker %s started", self.worker_id)
+        while not self._stopping.is_set():
+            try:
+                processed = await self.run_once()
+            except Exception:
+                logger.exception("Estimation worker %s failed to claim jobs", self.worker_id)
+                processed = 0
+            if processed:
+                continue
+            _NEW_JOBS.clear()
+            wakeup = asyncio.create_task(_NEW_JOBS.wait())
+            stop = asyncio.create_task(self._stopping.wait())
+            await asyncio.wait(
+                (wakeup, stop),
+                timeout=self.poll_interval,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            wakeup.cancel()
+            stop.cancel()
+        logger.info("Estimation worker %s stopped", self.worker_id)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+
+async def _run_standalone_worker() -> None:
+    await start_http_client()
+    # Reaches the API processes with the "unix" events backend
+    await start_event_hub()
+    await load_local_model_in_background()
+    try:
+        await EstimationWorker().run()
+    finally:
+        await close_http_client()
+        await close_event_hub()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(_run_standalone_worker())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,137 @@
+# Entry point for difficulty estimates, shared by the job worker and any other
+# caller. Layers in front of the OpenRouter call are composed here:
+#
+#   difficulty cache -> single-flight -> micro-batcher -> OpenRouter
+#                                                 (local model as fallback)
+#
+# With `estimator.backend = "local"` the offline model answers directly.
+
+import datetime
+from collections.abc import AsyncIterator
+from typing import Protocol
+
+from core.config import get_settings
+
+from .datetime import add_timezone_to_datetime
+from .difficulty_batcher import get_difficulty_batcher
+from .difficulty_cache import difficulty_cache_key, get_difficulty_cache
+from .local_estimator import get_local_model
+from .openrouter import (
+    PROMPT_VERSION,
+    TaskDifficultySchema,
+    estimate_task_difficulty_full,
+    is_default_task_difficulty,
+    stream_task_difficulty,
+)
+from .singleflight import SingleFlight
+
+# Identical prompts in flight at the same time (double submits, retries)
+# share one upstream call
+_IN_FLIGHT: SingleFlight[TaskDifficultySchema] = SingleFlight()
+
+
+def get_in_flight_estimates() -> SingleFlight[TaskDifficultySchema]:
+    return _IN_FLIGHT
+
+
+class EstimationInput(Protocol):
+    name: str
+    description: str | None
+    due_date: datetime.datetime | None
+    create_time: datetime.datetime
+
+
+def task_deadline(task: EstimationInput) -> datetime.timedelta | None:
+    if task.due_date is None:
+        return None
+    due_date = add_timezone_to_datetime(task.due_date)
+    created = add_timezone_to_datetime(task.create_time)
+    # Whole minutes, so double submits a few ms apart produce the same prompt
+    return datetime.timedelta(minutes=round((due_date - created).total_seconds() / 60))
+
+
+async def run_estimate_task_difficulty(task: EstimationInput) -> TaskDifficultySchema:
+    deadline = task_deadline(task)
+    settings = get_settings().estimator
+    local_model = get_local_model()
+    if settings.backend == "local" and local_model is not None:
+        return local_model.predict(task.name, task.description, deadline)
+
+    result = await _run_remote_estimate(task, deadline)
+    if (
+        settings.local_fallback
+        and local_model is not None
+        and is_default_task_difficulty(result.difficulty_score, result.reasoning)
+    ):
+        return local_model.predict(task.name, task.description, deadline)
+    return result
+
+
+async def _run_remote_estimate(
+    task: EstimationInput, deadline: datetime.timedelta | None
+) -> TaskDifficultySchema:
+    model = get_settings().openrouter.model
+
+    use_cache = get_settings().estimator.cache_enabled
+    if use_cache:
+        cache = get_difficulty_cache()
+        key = difficulty_cache_key(task.name, task.description, deadline, model)
+        cached = await cache.get(key)
+        if cached is not None:
+            return cached
+
+    deadline_str = f"{deadline}" if deadline is not None else None
+
+    async def estimate_and_store() -> TaskDifficultySchema:
+        result = await _estimate_upstream(task.name, task.description, deadline_str)
+        if use_cache:
+            await cache.put(key, result, model)
+        return result
+
+    prompt_key = (task.name, task.description, deadline_str, model, PROMPT_VERSION)
+    return await _IN_FLIGHT.do(prompt_key, estimate_and_store)
+
+
+async def _estimate_upstream(
+    name: str, description: str | None, deadline: str | None
+) -> TaskDifficultySchema:
+    if get_settings().estimator.batching_enabled:
+        return await get_difficulty_batcher().estimate(name, description, deadline)
+    return await estimate_task_difficulty_full(
+        task_name=name, task_description=description, task_deadline=deadline
+    )
+
+
+async def stream_estimate_task_difficulty(
+    task: EstimationInput,
+) -> AsyncIterator[tuple[str, str | TaskDifficultySchema]]:
+    """Streaming variant of `run_estimate_task_difficulty`, yields the chunks of
+    `openrouter.stream_task_difficulty`. Cached and local estimates are
+    yielded as the final score right away."""
+    deadline = task_deadline(task)
+    settings = get_settings().estimator
+    local_model = get_local_model()
+    if settings.backend == "local" and local_model is not None:
+        yield "score", local_model.predict(task.name, task.description, deadline)
+        return
+
+    model = get_settings().openrouter.model
+    key = difficulty_cache_key(task.name, task.description, deadline, model)
+    if settings.cache_enabled:
+        cached = await get_difficulty_cache().get(key)
+        if cached is not None:
+            yield "score", cached
+            return
+
+    deadline_str = f"{deadline}" if deadline is not None else None
+    async for kind, chunk in stream_task_difficulty(task.name, task.description, deadline_str):
+        if kind != "score":
+            yield kind, chunk
+            continue
+        assert isinstance(chunk, TaskDifficultySchema)
+        if is_default_task_difficulty(chunk.difficulty_score, chunk.reasoning):
+            if settings.local_fallback and local_model is not None:
+                chunk = local_model.predict(task.name, task.description, deadline)
+        elif settings.cache_enabled:
+            await get_difficulty_cache().put(key, chunk, model)
+        yield "score", chunk
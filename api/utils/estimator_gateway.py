@@ -0,0 +1,280 @@
+# Guards every OpenRouter request against an unhealthy upstream.
+#
+# - AdaptiveConcurrencyLimit: AIMD cap on requests in flight, grows by about
+#   one per window of successes and is cut multiplicatively on overload
+#   (429, 5xx, timeouts).
+# - TokenBucket: smooths the request rate and pauses entirely for the
+#   `Retry-After` the upstream asks for.
+# - Retries with full jitter for overload errors.
+# - CircuitBreaker: after repeated failures every call fails fast (callers
+#   fall back to the default or local score) until a probe succeeds again.
+
+import asyncio
+import datetime
+import email.utils
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+
+import httpx
+
+from core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class UpstreamOverloadedError(Exception):
+    def __init__(self, message: str, response: httpx.Response | None = None) -> None:
+        super().__init__(message)
+        self.response = response
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a `Retry-After` header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.datetime.now(datetime.UTC)).total_seconds(), 0.0)
+
+
+class AdaptiveConcurrencyLimit:
+    def __init__(self, initial: int, minimum: int, maximum: int, decrease_factor: float = 0.5) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, overloaded: bool | None) -> None:
+        """`overloaded=None` frees the slot without moving the limit."""
+        async with self._changed:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+            elif overloaded is not None:
+                # +1 per `limit` successes, i.e. about one per window
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._changed.notify_all()
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, burst: int) -> None:
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.tokens = float(burst)
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(float(self.burst), self.tokens + (now - self._updated) * self.rate_per_sec)
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Honour `Retry-After`: no token is handed out for `seconds`."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate_per_sec)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout_secs: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_secs = reset_timeout_secs
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == CIRCUIT_OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout_secs:
+                return False
+            self.state = CIRCUIT_HALF_OPEN
+        if self.state == CIRCUIT_HALF_OPEN:
+            # Let a single probe through, everyone else keeps failing fast
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        # The probe was abandoned (cancelled or an unexpected error), let the
+        # next caller probe
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == CIRCUIT_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != CIRCUIT_OPEN:
+                logger.warning("Estimator circuit opened after %s failures", self.consecutive_failures)
+            self.state = CIRCUIT_OPEN
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+
+@dataclass
+class GatewayStats:
+    requests: int = 0
+    successes: int = 0
+    overloads: int = 0
+    retries: int = 0
+    rejected: int = 0
+
+
+class EstimatorGateway:
+    def __init__(
+        self,
+        limiter: AdaptiveConcurrencyLimit,
+        bucket: TokenBucket,
+        breaker: CircuitBreaker,
+        max_attempts: int,
+        retry_base_delay_secs: float,
+        retry_max_delay_secs: float,
+    ) -> None:
+        self.limiter = limiter
+        self.bucket = bucket
+        self.breaker = breaker
+        self.max_attempts = max_attempts
+        self.retry_base_delay_secs = retry_base_delay_secs
+        self.retry_max_delay_secs = retry_max_delay_secs
+        self.stats = GatewayStats()
+
+    async def call(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Send a request through the gateway.
+
+        Returns the first response that is not an overload (it may still be a
+        4xx, which is the caller's business), raises `CircuitOpenError` when
+        failing fast and `UpstreamOverloadedError` once retries are used up.
+        """
+        if not self.breaker.allow():
+            self.stats.rejected += 1
+            raise CircuitOpenError("Estimator upstream is unhealthy, failing fast")
+
+        # A half-open probe not settled by a success or a failure (cancelled,
+        # or an unexpected error) must be handed back, or the circuit stays
+        # open for good
+        probing = self.breaker.state == CIRCUIT_HALF_OPEN
+        settled = False
+        try:
+            error: UpstreamOverloadedError | None = None
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    self.stats.retries += 1
+                    cap = min(self.retry_max_delay_secs, self.retry_base_delay_secs * 2**attempt)
+                    await asyncio.sleep(random.uniform(0, cap))
+                await self.bucket.acquire()
+                await self.limiter.acquire()
+                overloaded: bool | None = True
+                try:
+                    self.stats.requests += 1
+                    response = await send()
+                    if response.status_code == 429 or response.status_code >= 500:
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        if retry_after:
+                            self.bucket.pause(min(retry_after, self.retry_max_delay_secs))
+                        # Streamed responses hold their connection until closed
+                        await response.aclose()
+                        error = UpstreamOverloadedError(
+                            f"OpenRouter answered {response.status_code}", response
+                        )
+                    else:
+                        overloaded = False
+                except httpx.TransportError as e:
+                    error = UpstreamOverloadedError(f"{e.__class__.__name__}: {e}")
+                except asyncio.CancelledError:
+                    # Hedge losers are cancelled, that says nothing about the upstream
+                    overloaded = None
+                    raise
+                finally:
+                    await self.limiter.release(overloaded)
+
+                settled = True
+                if not overloaded:
+                    self.stats.successes += 1
+                    self.breaker.record_success()
+                    return response
+                self.stats.overloads += 1
+                self.breaker.record_failure()
+                if self.breaker.state == CIRCUIT_OPEN:
+                    break
+        finally:
+            if probing and not settled:
+                self.breaker.release_probe()
+
+        assert error is not None
+        raise error
+
+    def snapshot(self) -> dict[str, float | int | str]:
+        return {
+            **asdict(self.stats),
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "tokens": round(self.bucket.tokens, 2),
+            "paused_for_secs": round(max(self.bucket.paused_until - time.monotonic(), 0.0), 2),
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+        }
+
+
+_ESTIMATOR_GATEWAY: EstimatorGateway | None = None
+
+
+def get_estimator_gateway() -> EstimatorGateway:
+    global _ESTIMATOR_GATEWAY
+    if _ESTIMATOR_GATEWAY is None:
+        settings = get_settings().openrouter
+        _ESTIMATOR_GATEWAY = EstimatorGateway(
+            limiter=AdaptiveConcurrencyLimit(
+                initial=settings.initial_concurrency,
+                minimum=settings.min_concurrency,
+                maximum=settings.max_concurrency,
+            ),
+            bucket=TokenBucket(settings.rate_limit_per_sec, settings.rate_limit_burst),
+            breaker=CircuitBreaker(
+                settings.circuit_failure_threshold, settings.circuit_reset_secs
+            ),
+            max_attempts=settings.max_attempts,
+            retry_base_delay_secs=settings.retry_base_delay_secs,
+            retry_max_delay_secs=settings.retry_max_delay_secs,
+        )
+    return _ESTIMATOR_GATEWAY
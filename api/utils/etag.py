@@ -0,0 +1,40 @@
+# Strong ETags for conditional GETs. Responses carry `Cache-Control: no-cache`
+# so browsers keep the body but revalidate it with If-None-Match every time.
+
+import hashlib
+
+from fastapi import Request, Response, status
+
+# Bump when the shape of a cached response changes, old ETags then miss
+ETAG_FORMAT_VERSION = 1
+ETAG_CACHE_CONTROL = "no-cache"
+
+
+def make_etag(*parts: object) -> str:
+    raw = "\x1f".join(str(part) for part in (ETAG_FORMAT_VERSION, *parts))
+    return f'"{hashlib.sha256(raw.encode()).hexdigest()[:32]}"'
+
+
+def request_etag(request: Request, version: int) -> str:
+    """ETag of a GET at `version`, varying with the path and query parameters."""
+    return make_etag(request.url.path, sorted(request.query_params.multi_items()), version)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, a W/ prefix is ignored
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
+
+
+def not_modified(etag: str) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_etag(response, etag)
+    return response
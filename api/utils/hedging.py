@@ -0,0 +1,189 @@
+# Hedged requests across the configured estimator models.
+#
+# The primary model (`openrouter.model`) gets every request first. If it has
+# not produced a valid answer within the hedge delay, the same request goes to
+# the next model in `openrouter.hedge_models`, and so on. The first valid
+# answer wins and the requests still in flight are cancelled. A failed answer
+# fires the next hedge right away.
+#
+# The hedge delay is a percentile (`hedge_percentile`) of the primary model's
+# recent latencies, read from a per-model histogram, so hedges only fire for
+# the slow tail whatever the model's usual speed is.
+
+import asyncio
+import bisect
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from typing import Any, TypeVar
+
+from core.config import get_settings
+
+T = TypeVar("T")
+
+# Upper bounds (in seconds) of the latency buckets, 1.5x apart from 50ms to
+# about two minutes; slower answers land in one overflow bucket
+LATENCY_BUCKETS_SECS = tuple(round(0.05 * 1.5**i, 3) for i in range(20))
+
+
+class LatencyHistogram:
+    def __init__(self, max_samples: int = 1000) -> None:
+        self.max_samples = max_samples
+        self.counts = [0.0] * (len(LATENCY_BUCKETS_SECS) + 1)
+        self.total = 0.0
+        self.observed = 0
+
+    def observe(self, secs: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_SECS, secs)] += 1
+        self.total += 1
+        self.observed += 1
+        if self.total >= self.max_samples:
+            # Older samples weigh half as much, so the percentile follows drifts
+            self.counts = [count / 2 for count in self.counts]
+            self.total /= 2
+
+    def percentile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the `q` quantile, None when empty."""
+        if not self.total:
+            return None
+        threshold = q * self.total
+        cumulative = 0.0
+        for bound, count in zip(LATENCY_BUCKETS_SECS, self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return bound
+        return LATENCY_BUCKETS_SECS[-1]
+
+    def snapshot(self) -> dict[str, float | int | None]:
+        return {
+            "count": self.observed,
+            "p50_secs": self.percentile(0.5),
+            "p95_secs": self.percentile(0.95),
+            "p99_secs": self.percentile(0.99),
+        }
+
+
+@dataclass
+class HedgeStats:
+    calls: int = 0
+    hedges_fired: int = 0
+    hedge_wins: int = 0
+    all_failed: int = 0
+
+
+class HedgedCall:
+    def __init__(
+        self,
+        models: list[str],
+        percentile: float,
+        initial_delay_secs: float,
+        min_delay_secs: float,
+        max_delay_secs: float,
+        min_samples: int,
+    ) -> None:
+        self.models = models
+        self.percentile = percentile
+        self.initial_delay_secs = initial_delay_secs
+        self.min_delay_secs = min_delay_secs
+        self.max_delay_secs = max_delay_secs
+        self.min_samples = min_samples
+        self.stats = HedgeStats()
+        self.histograms = {model: LatencyHistogram() for model in models}
+
+    def hedge_delay(self) -> float:
+        histogram = self.histograms[self.models[0]]
+        delay = histogram.percentile(self.percentile)
+        if delay is None or histogram.observed < self.min_samples:
+            return self.initial_delay_secs
+        return min(max(delay, self.min_delay_secs), self.max_delay_secs)
+
+    async def run(
+        self, call: Callable[[str], Awaitable[T]], is_valid: Callable[[T], bool]
+    ) -> T:
+        """Run `call(model)` on the primary model, hedging with the others.
+
+        Returns the first result passing `is_valid`. When every model fails,
+        returns the failed result of the earliest model (or raises its error).
+        """
+        self.stats.calls += 1
+
+        async def timed(model: str) -> T:
+            started = time.monotonic()
+            result = await call(model)
+            if is_valid(result):
+                # Only real answers, fast failures would drag the delay down
+                self.histograms[model].observe(time.monotonic() - started)
+            return result
+
+        remaining = list(self.models)
+        running: dict[asyncio.Task[T], str] = {}
+        failed: dict[str, T] = {}
+        errors: dict[str, BaseException] = {}
+
+        def start_next() -> None:
+            model = remaining.pop(0)
+            running[asyncio.create_task(timed(model))] = model
+
+        start_next()
+        try:
+            while running:
+                done, _ = await asyncio.wait(
+                    running,
+                    timeout=self.hedge_delay() if remaining else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    model = running.pop(task)
+                    if task.exception() is not None:
+                        errors[model] = task.exception()
+                        continue
+                    result = task.result()
+                    if is_valid(result):
+                        if model != self.models[0]:
+                            self.stats.hedge_wins += 1
+                        return result
+                    failed[model] = result
+                # Either the delay ran out or everything that finished failed
+                if remaining:
+                    self.stats.hedges_fired += 1
+                    start_next()
+        finally:
+            for task in running:
+                task.cancel()
+
+        self.stats.all_failed += 1
+        for model in self.models:
+            if model in failed:
+                return failed[model]
+            if model in errors:
+                raise errors[model]
+        raise AssertionError("unreachable")
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            **asdict(self.stats),
+            "hedge_delay_secs": round(self.hedge_delay(), 3),
+            "latency": {model: hist.snapshot() for model, hist in self.histograms.items()},
+        }
+
+
+# One hedger per kind of call ("single", "batch"), their latencies differ
+_HEDGED_CALLS: dict[str, HedgedCall] = {}
+
+
+def get_hedged_call(kind: str) -> HedgedCall:
+    if kind not in _HEDGED_CALLS:
+        settings = get_settings().openrouter
+        _HEDGED_CALLS[kind] = HedgedCall(
+            models=settings.models,
+            percentile=settings.hedge_percentile,
+            initial_delay_secs=settings.hedge_initial_delay_secs,
+            min_delay_secs=settings.hedge_min_delay_secs,
+            max_delay_secs=settings.hedge_max_delay_secs,
+            min_samples=settings.hedge_min_samples,
+        )
+    return _HEDGED_CALLS[kind]
+
+
+def hedging_snapshot() -> dict[str, dict[str, Any]]:
+    return {kind: hedged.snapshot() for kind, hedged in _HEDGED_CALLS.items()}
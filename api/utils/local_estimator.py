@@ -0,0 +1,294 @@
+# Offline difficulty model trained on historical `task_difficulties` rows.
+#
+# Features are signed hashed n-grams of the task name and description (words,
+# word bigrams and character trigrams) plus a few deadline features. The model
+# is a ridge regression kept as its sufficient statistics (X^T X and X^T y),
+# so retraining only folds in the rows scored since the last run. Scores are
+# overwritten in place when a task is re-estimated and removed with their
+# task, which would leave their old contribution in the statistics: when the
+# rows scored up to the last run are no longer the ones folded in, retraining
+# starts over from all rows.
+#
+# The artifact is a single .npz file loaded lazily at startup; predictions
+# are one sparse dot product and stay well under a millisecond.
+#
+#   python -m api.utils.local_estimator retrain [--full]
+
+import asyncio
+import datetime
+import logging
+import math
+import os
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from itertools import pairwise
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import func, select
+
+from core import database_session
+from core.config import get_settings
+from models import Task, TaskDifficulty
+
+from .datetime import add_timezone_to_datetime
+from .openrouter import TaskDifficultySchema, is_default_task_difficulty
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 1
+N_HASHED_FEATURES = 1 << 10
+# bias, has deadline, log hours to deadline, overdue
+N_DENSE_FEATURES = 4
+N_FEATURES = N_HASHED_FEATURES + N_DENSE_FEATURES
+RIDGE_ALPHA = 1.0
+
+LOCAL_REASONING_PREFIX = "Estimated by the local difficulty model"
+
+
+def _feature_hashes(name: str, description: str | None) -> list[int]:
+    name_text = " ".join(name.casefold().split())
+    text = " ".join(f"{name} {description or ''}".casefold().split())
+    words = text.split()
+    features = [f"n:{w}" for w in name_text.split()]
+    features += [f"w:{w}" for w in words]
+    features += [f"b:{a} {b}" for a, b in pairwise(words)]
+    padded = f" {text} "
+    features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return [zlib.crc32(f.encode()) for f in features]
+
+
+def _dense_features(deadline: datetime.timedelta | None) -> list[float]:
+    if deadline is None:
+        return [1.0, 0.0, 0.0, 0.0]
+    hours = deadline.total_seconds() / 3600
+    return [1.0, 1.0, math.log1p(max(hours, 0.0)) / 10, 1.0 if hours <= 0 else 0.0]
+
+
+def featurize(
+    rows: list[tuple[str, str | None, datetime.timedelta | None]],
+) -> np.ndarray:
+    """Dense (len(rows), N_FEATURES) matrix, hashed part L2-normalized per row."""
+    matrix = np.zeros((len(rows), N_FEATURES))
+    row_ids: list[int] = []
+    hashes: list[int] = []
+    for i, (name, description, _) in enumerate(rows):
+        row_hashes = _feature_hashes(name, description)
+        hashes.extend(row_hashes)
+        row_ids.extend([i] * len(row_hashes))
+    if hashes:
+        hashed = np.asarray(hashes, dtype=np.uint32)
+        columns = (hashed & (N_HASHED_FEATURES - 1)).astype(np.intp)
+        signs = np.where(hashed >> 31, -1.0, 1.0)
+        np.add.at(matrix, (np.asarray(row_ids, dtype=np.intp), columns), signs)
+        norms = np.linalg.norm(matrix[:, :N_HASHED_FEATURES], axis=1, keepdims=True)
+        matrix[:, :N_HASHED_FEATURES] /= np.where(norms == 0, 1.0, norms)
+    matrix[:, N_HASHED_FEATURES:] = [_dense_features(deadline) for _, _, deadline in rows]
+    return matrix
+
+
+@dataclass
+class LocalDifficultyModel:
+    weights: np.ndarray
+    xtx: np.ndarray
+    xty: np.ndarray
+    n_rows: int
+    trained_until: datetime.datetime | None
+    # task_difficulties rows scored up to `trained_until`, skipped ones
+    # included; None for artifacts written before it was kept
+    folded_rows: int | None = 0
+
+    @classmethod
+    def empty(cls) -> "LocalDifficultyModel":
+        return cls(
+            weights=np.zeros(N_FEATURES),
+            xtx=np.zeros((N_FEATURES, N_FEATURES)),
+            xty=np.zeros(N_FEATURES),
+            n_rows=0,
+            trained_until=None,
+        )
+
+    def fit_more(self, features: np.ndarray, scores: np.ndarray) -> None:
+        self.xtx += features.T @ features
+        self.xty += features.T @ scores
+        self.n_rows += len(scores)
+
+    def solve(self) -> None:
+        regularizer = RIDGE_ALPHA * np.eye(N_FEATURES)
+        regularizer[N_HASHED_FEATURES, N_HASHED_FEATURES] = 0.0  # bias
+        self.weights = np.linalg.solve(self.xtx + regularizer, self.xty)
+
+    def predict(
+        self, name: str, description: str | None, deadline: datetime.timedelta | None
+    ) -> TaskDifficultySchema:
+        features = featurize([(name, description, deadline)])[0]
+        score = int(round(float(np.clip(features @ self.weights, 1, 100))))
+        return TaskDifficultySchema(
+            difficulty_score=score,
+            reasoning=f"{LOCAL_REASONING_PREFIX} (trained on {self.n_rows} scored tasks).",
+        )
+
+    def save(self, path: Path) -> None:
+        # Write then rename, readers never see a half written artifact
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                version=ARTIFACT_VERSION,
+                weights=self.weights,
+                xtx=self.xtx,
+                xty=self.xty,
+                n_rows=self.n_rows,
+                trained_until=self.trained_until.isoformat() if self.trained_until else "",
+                folded_rows=self.folded_rows if self.folded_rows is not None else -1,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "LocalDifficultyModel":
+        with np.load(path) as artifact:
+            if int(artifact["version"]) != ARTIFACT_VERSION:
+                raise ValueError(f"Unsupported local model artifact version in {path}")
+            trained_until = str(artifact["trained_until"])
+            folded_rows = int(artifact["folded_rows"]) if "folded_rows" in artifact else -1
+            return cls(
+                weights=artifact["weights"],
+                xtx=artifact["xtx"],
+                xty=artifact["xty"],
+                n_rows=int(artifact["n_rows"]),
+                trained_until=(
+                    datetime.datetime.fromisoformat(trained_until) if trained_until else None
+                ),
+                folded_rows=folded_rows if folded_rows >= 0 else None,
+            )
+
+
+def _artifact_path() -> Path:
+    return Path(get_settings().estimator.local_model_path)
+
+
+_LOCAL_MODEL: LocalDifficultyModel | None = None
+_LOAD_LOCK = threading.Lock()
+_LOAD_ATTEMPTED = False
+
+
+def load_local_model() -> LocalDifficultyModel | None:
+    """Load the artifact once, blocking. Returns None if there is none."""
+    global _LOCAL_MODEL, _LOAD_ATTEMPTED
+    with _LOAD_LOCK:
+        if not _LOAD_ATTEMPTED:
+            _LOAD_ATTEMPTED = True
+            path = _artifact_path()
+            if path.exists():
+                try:
+                    _LOCAL_MODEL = LocalDifficultyModel.load(path)
+                    logger.info("Loaded local difficulty model (%s rows)", _LOCAL_MODEL.n_rows)
+                except Exception:
+                    logger.exception("Failed to load local difficulty model from %s", path)
+            else:
+                logger.info("No local difficulty model at %s", path)
+    return _LOCAL_MODEL
+
+
+def get_local_model() -> LocalDifficultyModel | None:
+    """The loaded model, or None while it is not (yet) available. Never blocks."""
+    return _LOCAL_MODEL
+
+
+async def load_local_model_in_background() -> None:
+    await asyncio.to_thread(load_local_model)
+
+
+def _deadline(due_date: datetime.datetime | None, create_time: datetime.datetime):
+    if due_date is None:
+        return None
+    return add_timezone_to_datetime(due_date) - add_timezone_to_datetime(create_time)
+
+
+async def retrain(full: bool = False, chunk_size: int = 2000) -> LocalDifficultyModel:
+    """Fold `task_difficulties` rows scored since the last run into the model,
+    or all rows when earlier ones were re-scored or deleted since.
+
+    Default (fallback) scores and scores produced by this model are skipped.
+    """
+    path = _artifact_path()
+    model = (
+        LocalDifficultyModel.load(path)
+        if path.exists() and not full
+        else LocalDifficultyModel.empty()
+    )
+    query = (
+        select(
+            Task.name,
+            Task.description,
+            Task.due_date,
+            Task.create_time,
+            TaskDifficulty.score,
+            TaskDifficulty.reasoning,
+            TaskDifficulty.create_time.label("scored_at"),
+        )
+        .join(Task, Task.id == TaskDifficulty.task_id)
+        .order_by(TaskDifficulty.create_time, TaskDifficulty.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    started = time.monotonic()
+    async with database_session.get_async_session() as session:
+        if model.folded_rows is None:
+            # Written before the folded rows were counted, nothing tells which
+            # rows it holds
+            logger.info("Local difficulty model predates folded row counts, retraining on all rows")
+            model = LocalDifficultyModel.empty()
+        elif model.trained_until is not None:
+            folded = await session.scalar(
+                select(func.count())
+                .select_from(TaskDifficulty)
+                .where(TaskDifficulty.create_time <= model.trained_until)
+            )
+            if folded == model.folded_rows:
+                query = query.where(TaskDifficulty.create_time > model.trained_until)
+            else:
+                logger.info(
+                    "Scores folded into the local difficulty model changed (%s rows, was %s), "
+                    "retraining on all rows",
+                    folded,
+                    model.folded_rows,
+                )
+                model = LocalDifficultyModel.empty()
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            model.folded_rows += len(rows)
+            usable = [
+                row
+                for row in rows
+                if not is_default_task_difficulty(row.score, row.reasoning)
+                and not (row.reasoning or "").startswith(LOCAL_REASONING_PREFIX)
+            ]
+            if usable:
+                features = featurize(
+                    [
+                        (row.name, row.description, _deadline(row.due_date, row.create_time))
+                        for row in usable
+                    ]
+                )
+                model.fit_more(features, np.asarray([row.score for row in usable], dtype=float))
+            model.trained_until = rows[-1].scored_at
+    if model.n_rows:
+        model.solve()
+    model.save(path)
+    logger.info(
+        "Local difficulty model trained on %s rows in %.2fs",
+        model.n_rows,
+        time.monotonic() - started,
+    )
+    return model
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "retrain":
+        print("Usage: python -m api.utils.local_estimator retrain [--full]")
+        sys.exit(1)
+    trained = asyncio.run(retrain(full="--full" in sys.argv[2:]))
+    print(f"Local difficulty model saved to {_artifact_path()} ({trained.n_rows} rows)")
@@ -1,17 +1,44 @@
+import json
+import logging
 import os
+from collections.abc import AsyncIterator
 
 import httpx
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
+
+from core.config import get_settings
+
+from .estimator_gateway import (
+    CircuitOpenError,
+    UpstreamOverloadedError,
+    get_estimator_gateway,
+)
+from .hedging import get_hedged_call
+
+logger = logging.getLogger(__name__)
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 if not OPENROUTER_API_KEY:
-    print(
-        "Warning: OPENROUTER_API_KEY environment variable not set. Using default score."
-    )
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
-OPENROUTER_MODEL = "openai/gpt-4o-mini"
+    logger.warning("OPENROUTER_API_KEY environment variable not set. Using default score.")
+# Base URL, model, pool limits and timeouts live in `core.config.OpenRouter`
 # -----------------------------------------------------------------
 
+# Bump whenever the system prompt below changes, cached scores from older
+# prompts are then ignored
+PROMPT_VERSION = 1
+
+# Default response in case the API key is missing or the API fails
+DEFAULT_SCORE = 30
+DEFAULT_REASONING = "LLM API call failed or key is missing. Default score applied."
+# Reasonings of default responses start with one of these
+DEFAULT_REASONING_PREFIXES = (
+    DEFAULT_REASONING,
+    "OpenRouter API failed with status",
+    "Internal error during LLM call",
+    "Estimation failed after",
+    "OpenRouter is unhealthy",
+)
+
 
 class TaskDifficultySchema(BaseModel):
     """Schema for the LLM to follow for task difficulty output."""
@@ -26,28 +53,81 @@ class TaskDifficultySchema(BaseModel):
     )
 
 
-## 📞 OpenRouter API Caller Function
+def default_task_difficulty(reasoning: str = DEFAULT_REASONING) -> TaskDifficultySchema:
+    return TaskDifficultySchema(difficulty_score=DEFAULT_SCORE, reasoning=reasoning)
 
 
-async def estimate_task_difficulty_full(
-    task_name: str, task_description: str, task_deadline: str | None = None
-) -> TaskDifficultySchema:
-    """
-    Calls OpenRouter non-streaming API to get a structured difficulty score (0-100)
-    and reasoning, returning the full parsed Pydantic object.
-    """
+def is_default_task_difficulty(score: int, reasoning: str | None) -> bool:
+    """True for placeholder scores that were not produced by a real estimate."""
+    return score == DEFAULT_SCORE and (reasoning or "").startswith(
+        DEFAULT_REASONING_PREFIXES
+    )
 
-    # Define a default response in case the API key is missing or the API fails
-    DEFAULT_SCORE = 30
-    DEFAULT_REASONING = "LLM API call failed or key is missing. Default score applied."
 
-    if not OPENROUTER_API_KEY:
-        return TaskDifficultySchema(
-            difficulty_score=DEFAULT_SCORE, reasoning=DEFAULT_REASONING
-        )
+## 🔌 Shared HTTP client
+#
+# One pooled client per process, opened and closed by the app lifespan (or by
+# the standalone worker), so estimates reuse warm keep-alive connections
+# instead of paying a TCP+TLS handshake each time.
 
-    system_prompt = f"""
-    You are an expert task analyzer. Your only job is to assess the difficulty
+_HTTP_CLIENT: httpx.AsyncClient | None = None
+
+
+def new_http_client(
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> httpx.AsyncClient:
+    settings = get_settings().openrouter
+    return httpx.AsyncClient(
+        http2=settings.http2,
+        timeout=httpx.Timeout(settings.timeout_secs, connect=settings.connect_timeout_secs),
+        limits=httpx.Limits(
+            max_connections=settings.pool_max_connections,
+            max_keepalive_connections=settings.pool_max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry_secs,
+        ),
+        transport=transport,
+    )
+
+
+async def start_http_client(
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> httpx.AsyncClient:
+    """Open the shared client. Tests can pass a `transport` (e.g. an
+    `httpx.MockTransport`) or point `OPENROUTER__BASE_URL` at a local
+    stand-in server."""
+    global _HTTP_CLIENT
+    await close_http_client()
+    _HTTP_CLIENT = new_http_client(transport)
+    return _HTTP_CLIENT
+
+
+async def close_http_client() -> None:
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is not None:
+        client, _HTTP_CLIENT = _HTTP_CLIENT, None
+        await client.aclose()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    # Lazily opened for callers running outside the app lifespan (scripts)
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None or _HTTP_CLIENT.is_closed:
+        _HTTP_CLIENT = new_http_client()
+    return _HTTP_CLIENT
+
+
+async def warm_up_http_client() -> None:
+    """Open a pooled connection to the API host ahead of the first estimate."""
+    url = httpx.URL(get_settings().openrouter.base_url)
+    try:
+        await get_http_client().head(url.copy_with(path="/", query=None))
+    except httpx.HTTPError as e:
+        logger.warning("OpenRouter connection warm-up failed: %s", e.__class__.__name__)
+
+
+## 📞 OpenRouter API Caller Function
+
+_ANALYZER_INSTRUCTIONS = """You are an expert task analyzer. Your only job is to assess the difficulty
     of a user-provided task and return the result in a strict JSON format that
     conforms to the provided schema. You should consider factors such as complexity,
     required skills, time constraints, and any other relevant aspects. Be sure to
@@ -58,7 +138,82 @@ async def estimate_task_difficulty_full(
     or humorous task descriptions.
 
     The difficulty must be a score from **1 (Trivial)** to **100 (Extremely Difficult)**.
-    The score must be an integer.
+    The score must be an integer."""
+
+
+def _format_task(
+    task_name: str, task_description: str | None, task_deadline: str | None
+) -> str:
+    return f"""    Name: "{task_name}"
+    Description: "{task_description}"
+    Deadline: "{task_deadline if task_deadline else 'No deadline provided'}\""""
+
+
+async def _post_completion(payload: dict, stream: bool = False) -> httpx.Response:
+    # Concurrency, rate limit, retries and circuit breaking, see estimator_gateway.py
+    client = get_http_client()
+    request = client.build_request(
+        "POST", get_settings().openrouter.base_url, headers=_headers(), json=payload
+    )
+    return await get_estimator_gateway().call(lambda: client.send(request, stream=stream))
+
+
+def _headers() -> dict[str, str]:
+    return {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "HTTP-Referer": "http://localhost:8000/docs",  # TODO!
+        "X-Title": "Task Difficulty API",
+        "Content-Type": "application/json",
+    }
+
+
+
+async def estimate_task_difficulty_full(
+    task_name: str, task_description: str, task_deadline: str | None = None
+) -> TaskDifficultySchema:
+    """
+    Calls OpenRouter non-streaming API to get a structured difficulty score (0-100)
+    and reasoning, returning the full parsed Pydantic object.
+    """
+
+    if not OPENROUTER_API_KEY:
+        return default_task_difficulty()
+
+    async def estimate_with(model: str) -> TaskDifficultySchema:
+        payload = _single_task_payload(
+            task_name, task_description, task_deadline, stream=False, model=model
+        )
+        try:
+            response = await _post_completion(payload)
+            response.raise_for_status()
+            response_data = response.json()
+            json_content = response_data["choices"][0]["message"]["content"]
+            # Hopefully this is a JSON string conforming to TaskDifficultySchema
+            parsed_data = TaskDifficultySchema.model_validate_json(json_content)
+            logger.debug("OpenRouter response parsed (%s): %s", model, parsed_data)
+
+            return parsed_data
+
+        except Exception as e:
+            return _default_for_error(e)
+
+    # Slow or failed answers are hedged with the next configured model
+    return await get_hedged_call("single").run(estimate_with, _is_real_estimate)
+
+
+def _is_real_estimate(result: TaskDifficultySchema) -> bool:
+    return not is_default_task_difficulty(result.difficulty_score, result.reasoning)
+
+
+def _single_task_payload(
+    task_name: str,
+    task_description: str | None,
+    task_deadline: str | None,
+    stream: bool,
+    model: str | None = None,
+) -> dict:
+    system_prompt = f"""
+    {_ANALYZER_INSTRUCTIONS}
 
     Make sure to ONLY respond with a JSON object matching the schema:
     {{
@@ -67,13 +222,11 @@ async def estimate_task_difficulty_full(
     }}
 
     The task is:
-    Name: "{task_name}"
-    Description: "{task_description}"
-    Deadline: "{task_deadline if task_deadline else 'No deadline provided'}"
+{_format_task(task_name, task_description, task_deadline)}
     """
 
-    payload = {
-        "model": OPENROUTER_MODEL,
+    return {
+        "model": model or get_settings().openrouter.model,
         "messages": [
             {"role": "system", "content": system_prompt},
             {
@@ -82,40 +235,152 @@ async def estimate_task_difficulty_full(
             },
         ],
         "response_format": {"type": "json_object"},
-        "stream": False,
+        "stream": stream,
         "temperature": 0.1,
     }
 
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "HTTP-Referer": "http://localhost:8000/docs",  # TODO!
-        "X-Title": "Task Difficulty API",
-        "Content-Type": "application/json",
-    }
 
+def _default_for_error(e: Exception) -> TaskDifficultySchema:
+    if isinstance(e, CircuitOpenError):
+        return default_task_difficulty("OpenRouter is unhealthy, default score applied.")
+    if isinstance(e, UpstreamOverloadedError) and e.response is not None:
+        logger.warning("OpenRouter API overloaded, retries exhausted: %s", e)
+        return default_task_difficulty(
+            f"OpenRouter API failed with status {e.response.status_code}."
+        )
+    if isinstance(e, httpx.HTTPStatusError):
+        logger.warning(
+            "OpenRouter API HTTP Error %s: %s", e.response.status_code, e.response.text
+        )
+        return default_task_difficulty(
+            f"OpenRouter API failed with status {e.response.status_code}."
+        )
+    logger.warning("Error calling OpenRouter or parsing response: %s", e)
+    return default_task_difficulty(
+        f"Internal error during LLM call: {e.__class__.__name__}."
+    )
+
+
+async def stream_task_difficulty(
+    task_name: str, task_description: str | None, task_deadline: str | None = None
+) -> AsyncIterator[tuple[str, str | TaskDifficultySchema]]:
+    """
+    Calls the OpenRouter streaming API. Yields ("reasoning", text) and
+    ("token", text) chunks as they arrive, then exactly one
+    ("score", TaskDifficultySchema) parsed from the full completion.
+    Streams are not hedged, they always use the primary model.
+    """
+
+    if not OPENROUTER_API_KEY:
+        yield "score", default_task_difficulty()
+        return
+
+    payload = _single_task_payload(task_name, task_description, task_deadline, stream=True)
+    content: list[str] = []
+    response = None
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                OPENROUTER_BASE_URL, headers=headers, json=payload
-            )
+        response = await _post_completion(payload, stream=True)
+        if response.is_error:
+            await response.aread()
             response.raise_for_status()
-            response_data = response.json()
-            json_content = response_data["choices"][0]["message"]["content"]
-            # Hopefully this is a JSON string conforming to TaskDifficultySchema
-            parsed_data = TaskDifficultySchema.model_validate_json(json_content)
-            print(f"OpenRouter response parsed: {parsed_data}")
+        async for line in response.aiter_lines():
+            # Server-sent events, ":" lines are keep-alive comments
+            if not line.startswith("data:"):
+                continue
+            data = line.removeprefix("data:").strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            delta = choices[0].get("delta") or {}
+            if delta.get("reasoning"):
+                yield "reasoning", delta["reasoning"]
+            if delta.get("content"):
+                content.append(delta["content"])
+                yield "token", delta["content"]
+        result = TaskDifficultySchema.model_validate_json("".join(content))
+    except Exception as e:
+        result = _default_for_error(e)
+    finally:
+        if response is not None:
+            await response.aclose()
+    yield "score", result
 
-            return parsed_data
 
-    except httpx.HTTPStatusError as e:
-        print(f"OpenRouter API HTTP Error {e.response.status_code}: {e.response.text}")
-        return TaskDifficultySchema(
-            difficulty_score=DEFAULT_SCORE,
-            reasoning=f"OpenRouter API failed with status {e.response.status_code}.",
-        )
-    except Exception as e:
-        print(f"Error calling OpenRouter or parsing response: {e}")
-        return TaskDifficultySchema(
-            difficulty_score=DEFAULT_SCORE,
-            reasoning=f"Internal error during LLM call: {e.__class__.__name__}.",
-        )
+class _BatchItem(TaskDifficultySchema):
+    index: int
+
+
+async def estimate_task_difficulty_batch(
+    tasks: list[tuple[str, str | None, str | None]],
+) -> list[TaskDifficultySchema | None]:
+    """
+    Scores several (name, description, deadline) tasks with one OpenRouter call.
+    Items missing from the reply or failing validation come back as None so
+    the caller can retry them one by one.
+    """
+
+    if not OPENROUTER_API_KEY:
+        return [default_task_difficulty() for _ in tasks]
+
+    listed = "\n\n".join(
+        f"    Task {index}:\n{_format_task(*task)}" for index, task in enumerate(tasks)
+    )
+    system_prompt = f"""
+    {_ANALYZER_INSTRUCTIONS}
+
+    You will be given {len(tasks)} independent tasks, numbered from 0. Score each
+    one on its own. Make sure to ONLY respond with a JSON object matching the schema:
+    {{
+        "results": [
+            {{"index": int, "difficulty_score": int, "reasoning": str | null}}
+        ]
+    }}
+
+    The tasks are:
+{listed}
+    """
+
+    async def estimate_with(model: str) -> list[TaskDifficultySchema | None]:
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {
+                    "role": "user",
+                    "content": "Analyze every task and determine its difficulty score (0-100) and provide reasoning.",
+                },
+            ],
+            "response_format": {"type": "json_object"},
+            "stream": False,
+            "temperature": 0.1,
+        }
+
+        results: list[TaskDifficultySchema | None] = [None] * len(tasks)
+        try:
+            response = await _post_completion(payload)
+            response.raise_for_status()
+            json_content = response.json()["choices"][0]["message"]["content"]
+            items = json.loads(json_content)["results"]
+        except CircuitOpenError:
+            # Single calls would fail fast too and return the default score
+            return results
+        except Exception as e:
+            logger.warning(
+                "OpenRouter batch call failed (%s): %s: %s", model, e.__class__.__name__, e
+            )
+            return results
+
+        for raw_item in items if isinstance(items, list) else []:
+            try:
+                item = _BatchItem.model_validate(raw_item)
+            except ValidationError:
+                continue
+            if 0 <= item.index < len(tasks) and results[item.index] is None:
+                results[item.index] = TaskDifficultySchema(
+                    difficulty_score=item.difficulty_score, reasoning=item.reasoning
+                )
+        return results
+
+    return await get_hedged_call("batch").run(
+        estimate_with, lambda results: any(result is not None for result in results)
+    )
@@ -0,0 +1,184 @@
+# Keyset (cursor) pagination of GET /tasks/.
+#
+# Pages are ordered by (sort key, id) and the cursor carries the last row's
+# (sort key, id), so the next page is a range scan on the matching composite
+# index starting right after it: page N costs the same as page 1 and rows
+# inserted meanwhile never shift page boundaries.
+#
+# Rows whose sort key is NULL (no due date, difficulty still pending) come
+# last in both directions, ordered by id. The cursor then carries a NULL
+# value and the query walks the NULL rows by id only.
+#
+# Pages are plain rows of `TASK_ROW_COLUMNS` (task joined to its difficulty),
+# no ORM objects, see task_json.py.
+
+import base64
+import binascii
+import datetime
+import json
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from fastapi import HTTPException, status
+from sqlalchemy import Row, Select, and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Task, TaskDifficulty
+
+from .task_json import TASK_ROW_COLUMNS
+from .task_queries import only_open
+
+TaskSort = Literal["id", "due_date", "create_time", "difficulty"]
+SortOrder = Literal["asc", "desc"]
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Cursor values of the other sort keys are ints
+_DATETIME_SORTS = ("due_date", "create_time")
+_NULLABLE_SORTS = ("due_date", "difficulty")
+
+
+@dataclass
+class Cursor:
+    sort: TaskSort
+    order: SortOrder
+    # Sort key of the last row, None once the page walks the NULL rows
+    value: Any
+    last_id: int
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    value = cursor.value.isoformat() if isinstance(cursor.value, datetime.datetime) else cursor.value
+    raw = json.dumps([cursor.sort, cursor.order, value, cursor.last_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor_or_error(token: str, sort: TaskSort, order: SortOrder) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        cursor_sort, cursor_order, value, last_id = json.loads(raw)
+        if cursor_sort in _DATETIME_SORTS and value is not None:
+            value = datetime.datetime.fromisoformat(value)
+        if not isinstance(last_id, int):
+            raise ValueError(last_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cursor was issued for sort={cursor_sort}&order={cursor_order}.",
+        )
+    return Cursor(sort, order, value, last_id)
+
+
+def _sort_column(sort: TaskSort):
+    return {
+        "id": Task.id,
+        "due_date": Task.due_date,
+        "create_time": Task.create_time,
+        "difficulty": TaskDifficulty.score,
+    }[sort]
+
+
+def _tie_column(sort: TaskSort):
+    # Same value as Task.id, but the second column of the score index
+    return TaskDifficulty.task_id if sort == "difficulty" else Task.id
+
+
+def _after(column, tie, order: SortOrder, value: Any, last_id: int):
+    # `col >= v AND (col > v OR id > last)` rather than a row value compare,
+    # both SQLite and Postgres turn the first term into an index range
+    if order == "asc":
+        return and_(column >= value, or_(column > value, tie > last_id))
+    return and_(column <= value, or_(column < value, tie < last_id))
+
+
+def _valued_rows_query(sort: TaskSort, order: SortOrder, after: Cursor | None) -> Select:
+    column = _sort_column(sort)
+    tie = _tie_column(sort)
+    if sort == "difficulty":
+        # Driven by the score index, each task then found by primary key
+        query = (
+            select(*TASK_ROW_COLUMNS)
+            .select_from(TaskDifficulty)
+            .join(Task, Task.id == TaskDifficulty.task_id)
+        )
+    else:
+        query = select(*TASK_ROW_COLUMNS).select_from(Task).outerjoin(Task.difficulty_record)
+        if sort in _NULLABLE_SORTS:
+            query = query.where(column.is_not(None))
+    if after is not None:
+        query = query.where(_after(column, tie, order, after.value, after.last_id))
+    if sort == "id":
+        return query.order_by(Task.id.asc() if order == "asc" else Task.id.desc())
+    if order == "asc":
+        return query.order_by(column.asc(), tie.asc())
+    return query.order_by(column.desc(), tie.desc())
+
+
+def _null_rows_query(sort: TaskSort, order: SortOrder, after: Cursor | None) -> Select:
+    query = select(*TASK_ROW_COLUMNS).select_from(Task).outerjoin(Task.difficulty_record)
+    if sort == "difficulty":
+        query = query.where(TaskDifficulty.id.is_(None))
+    else:
+        query = query.where(_sort_column(sort).is_(None))
+    if after is not None and after.value is None:
+        query = query.where(Task.id > after.last_id if order == "asc" else Task.id < after.last_id)
+    return query.order_by(Task.id.asc() if order == "asc" else Task.id.desc())
+
+
+def _sort_value(row: Row, sort: TaskSort) -> Any:
+    return row.difficulty_score if sort == "difficulty" else getattr(row, sort)
+
+
+async def _count(session: AsyncSession, query: Select) -> int:
+    return await session.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+
+
+async def fetch_task_page(
+    session: AsyncSession,
+    sort: TaskSort,
+    order: SortOrder,
+    limit: int,
+    after: Cursor | None = None,
+    skip: int = 0,
+    exclude_completed: bool = False,
+) -> tuple[list[Row], str | None]:
+    """One page of task rows and the cursor of the next one (None on the last
+    page).
+
+    `skip` is the legacy offset path, only honoured without a cursor. It walks
+    the same indexes in the same order but still reads the skipped rows.
+    """
+    if limit <= 0:
+        return [], None
+
+    queries = []
+    if after is None or after.value is not None:
+        queries.append(_valued_rows_query(sort, order, after))
+    if sort in _NULLABLE_SORTS:
+        queries.append(_null_rows_query(sort, order, after))
+
+    # One row more than asked tells whether there is a next page
+    tasks: list[Row] = []
+    offset = skip if after is None else 0
+    for query in queries:
+        if exclude_completed:
+            query = only_open(query)
+        rows = (
+            await session.execute(query.offset(offset or None).limit(limit + 1 - len(tasks)))
+        ).all()
+        if offset and not rows:
+            # Skipped past all of these rows, the rest of the offset applies
+            # to the NULL rows
+            offset = max(offset - await _count(session, query), 0)
+        else:
+            offset = 0
+        tasks.extend(rows)
+        if len(tasks) > limit:
+            break
+
+    if len(tasks) <= limit:
+        return tasks, None
+    last = tasks[limit - 1]
+    return tasks[:limit], encode_cursor(Cursor(sort, order, _sort_value(last, sort), last.id))
@@ -0,0 +1,225 @@
+# Re-score every task, e.g. after changing `OPENROUTER__MODEL` or the prompt.
+#
+#   python -m api.utils.reestimate_all [--concurrency 8] [--chunk-size 200]
+#                                      [--checkpoint reestimate.checkpoint.json]
+#                                      [--pool-size 2] [--restart] [--no-cache]
+#
+# Tasks are read in id order, one keyset window at a time through a streamed
+# (server-side on Postgres) cursor, and estimated with bounded concurrency
+# through the regular estimator pipeline (cache, batching, gateway). Each
+# window is written with a single multi-row upsert, then its last id is saved
+# to the checkpoint file, so a crashed run resumes where it stopped.
+#
+# Only model answers are written: default scores (upstream failed) and local
+# model guesses (the fallback during an outage) are counted as skipped and
+# the stored score is kept; run again with --restart once the upstream is back.
+#
+# Connections are only held to read a window and to write it back, and the
+# engine is rebuilt with a small pool, so the live API keeps its connections.
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import database_session
+from core.config import get_settings
+from models import Task, TaskDifficulty
+
+from .estimator import run_estimate_task_difficulty
+from .local_estimator import LOCAL_REASONING_PREFIX, load_local_model_in_background
+from .openrouter import (
+    PROMPT_VERSION,
+    TaskDifficultySchema,
+    close_http_client,
+    is_default_task_difficulty,
+    start_http_client,
+)
+from .task_changes import record_task_changes
+from .task_events import close_event_hub, start_event_hub
+from .task_stats import read_counted, update_task_stats
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Checkpoint:
+    model: str
+    prompt_version: int
+    last_task_id: int = 0
+    processed: int = 0
+    # Tasks left untouched because the estimator only produced a default
+    # score or a local model guess
+    skipped: int = 0
+
+    @classmethod
+    def load(cls, path: Path, model: str) -> "Checkpoint":
+        fresh = cls(model=model, prompt_version=PROMPT_VERSION)
+        if not path.exists():
+            return fresh
+        saved = cls(**json.loads(path.read_text()))
+        if (saved.model, saved.prompt_version) != (fresh.model, fresh.prompt_version):
+            logger.warning("Checkpoint %s is for another model or prompt, starting over", path)
+            return fresh
+        return saved
+
+    def save(self, path: Path) -> None:
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        tmp_path.write_text(json.dumps(asdict(self)))
+        tmp_path.replace(path)
+
+
+async def upsert_task_difficulties(
+    session: AsyncSession, scores: dict[int, TaskDifficultySchema]
+) -> int:
+    """Write many difficulty records with one statement, skipping tasks that
+    were deleted in the meantime. The caller commits."""
+    existing = (
+        await session.execute(select(Task.id).where(Task.id.in_(scores)))
+    ).scalars().all()
+    if not existing:
+        return 0
+    before = await read_counted(session, existing)
+    now = datetime.datetime.now(datetime.UTC)
+    stmt = database_session.dialect_insert(session, TaskDifficulty).values(
+        [
+            {
+                "task_id": task_id,
+                "score": scores[task_id].difficulty_score,
+                "reasoning": scores[task_id].reasoning,
+                "create_time": now,
+            }
+            for task_id in existing
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TaskDifficulty.task_id],
+        set_={
+            "score": stmt.excluded.score,
+            "reasoning": stmt.excluded.reasoning,
+            "create_time": stmt.excluded.create_time,
+            "update_time": func.now(),
+        },
+    )
+    await session.execute(stmt)
+    await update_task_stats(session, before, existing)
+    await record_task_changes(session, difficulty_ready=existing)
+    return len(existing)
+
+
+async def _read_window(after_id: int, size: int) -> list:
+    query = (
+        select(Task.id, Task.name, Task.description, Task.due_date, Task.create_time)
+        .where(Task.id > after_id)
+        .order_by(Task.id)
+        .limit(size)
+        .execution_options(yield_per=size)
+    )
+    async with database_session.get_async_session() as session:
+        result = await session.stream(query)
+        return [row async for row in result]
+
+
+async def reestimate_all(
+    checkpoint_path: Path, concurrency: int, chunk_size: int, restart: bool = False
+) -> Checkpoint:
+    model = get_settings().openrouter.model
+    if restart:
+        checkpoint_path.unlink(missing_ok=True)
+    checkpoint = Checkpoint.load(checkpoint_path, model)
+
+    async with database_session.get_async_session() as session:
+        remaining = await session.scalar(
+            select(func.count(Task.id)).where(Task.id > checkpoint.last_task_id)
+        )
+    logger.info(
+        "Re-estimating %s tasks after id %s with %s", remaining, checkpoint.last_task_id, model
+    )
+
+    limit = asyncio.Semaphore(concurrency)
+
+    async def estimate(row) -> tuple[int, TaskDifficultySchema]:
+        async with limit:
+            return row.id, await run_estimate_task_difficulty(row)
+
+    started = time.monotonic()
+    done_this_run = 0
+    while rows := await _read_window(checkpoint.last_task_id, chunk_size):
+        scores = dict(await asyncio.gather(*(estimate(row) for row in rows)))
+        # An unhealthy upstream must not overwrite real scores with the
+        # default or with the guesses of the local fallback
+        usable = {
+            task_id: score
+            for task_id, score in scores.items()
+            if not is_default_task_difficulty(score.difficulty_score, score.reasoning)
+            and not (score.reasoning or "").startswith(LOCAL_REASONING_PREFIX)
+        }
+        if usable:
+            async with database_session.get_async_session() as session:
+                await upsert_task_difficulties(session, usable)
+                await session.commit()
+
+        checkpoint.last_task_id = rows[-1].id
+        checkpoint.processed += len(rows)
+        checkpoint.skipped += len(scores) - len(usable)
+        checkpoint.save(checkpoint_path)
+
+        done_this_run += len(rows)
+        elapsed = time.monotonic() - started
+        rate = done_this_run / elapsed if elapsed else 0.0
+        left = max((remaining or 0) - done_this_run, 0)
+        eta = datetime.timedelta(seconds=round(left / rate)) if rate else "unknown"
+        logger.info(
+            "%s/%s tasks, %.1f tasks/s, ETA %s (last id %s, %s skipped)",
+            done_this_run,
+            remaining,
+            rate,
+            eta,
+            checkpoint.last_task_id,
+            checkpoint.skipped,
+        )
+    return checkpoint
+
+
+async def _main(args: argparse.Namespace) -> None:
+    if args.no_cache:
+        get_settings().estimator.cache_enabled = False
+    await database_session.use_small_pool(args.pool_size)
+    await start_http_client()
+    await start_event_hub()
+    await load_local_model_in_background()
+    try:
+        checkpoint = await reestimate_all(
+            Path(args.checkpoint), args.concurrency, args.chunk_size, args.restart
+        )
+    finally:
+        await close_http_client()
+        await close_event_hub()
+    print(
+        f"Re-estimated {checkpoint.processed - checkpoint.skipped} tasks, "
+        f"{checkpoint.skipped} skipped without a model estimate, "
+        f"last id {checkpoint.last_task_id}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-estimate the difficulty of every task")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--checkpoint", default="reestimate.checkpoint.json")
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument(
+        "--no-cache", action="store_true", help="do not answer from the difficulty cache"
+    )
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        print("Interrupted, run again to resume from the checkpoint")
@@ -0,0 +1,547 @@
+# Delivery of fired reminders through the sinks of reminder_sinks.py.
+#
+# The reminder handler `enqueue_deliveries` only adds an outbox row per
+# reminder and sink (`reminder_deliveries`) in the transaction of the reminder
+# tick, so a burst at the top of the hour costs the scheduler one INSERT. A
+# `DeliveryPipeline` (in-process from the app lifespan, or standalone with
+# `python -m api.utils.reminder_delivery`) sends them:
+#
+# - a dispatcher claims the due rows of each sink into a bounded queue, no
+#   more than the queue has room for, under a lease like the estimation jobs
+#   (one UPDATE ... RETURNING per claim, several processes never take the
+#   same row);
+# - `concurrency` senders per sink take batches of up to `batch_size` from
+#   its queue and hand them to the sink;
+# - a failed batch is retried with exponential backoff, and moved to
+#   `reminder_dead_letters` after `max_attempts` or when the sink refuses it
+#   for good. Rows of a sender that died are claimed again once their lease
+#   expires.
+#
+# Deliveries are at least once. The idempotency key of each row (unique, the
+# outbox never holds a reminder twice) goes along to the sink, so the receiver
+# drops what it already got.
+#
+#   python -m api.utils.reminder_delivery           runs a standalone pipeline
+#   python -m api.utils.reminder_delivery replay    requeues the dead letters
+
+import asyncio
+import datetime
+import logging
+import os
+import random
+import socket
+import sys
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any
+
+import orjson
+from sqlalchemy import delete, event, literal, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core import database_session
+from core.config import Delivery as DeliverySettings
+from core.config import get_settings
+from models import ReminderDeadLetter, ReminderDelivery, Task
+from models.reminder_delivery import DELIVERY_PENDING, DELIVERY_SENDING, DELIVERY_SENT
+from models.task import due_epoch_us
+
+from .datetime import add_timezone_to_datetime
+from .hedging import LatencyHistogram
+from .reminder_sinks import Delivery, PermanentDeliveryError, ReminderSink, build_sinks, sink_names
+from .reminders import Reminder
+
+logger = logging.getLogger(__name__)
+
+# Set once a transaction adding deliveries commits, so the in-process
+# dispatcher does not have to wait for its next poll
+_NEW_DELIVERIES = asyncio.Event()
+_ADDED_DELIVERIES = "reminder_deliveries_added"
+
+# Reminders added per statement by `enqueue_deliveries`, sent rows purged
+# per statement
+_READ_CHUNK = 5000
+_PURGE_CHUNK = 10_000
+_PURGE_INTERVAL_SECS = 3600.0
+
+_OUTBOX_COLUMNS = [
+    ReminderDelivery.__table__.c[name]
+    for name in (
+        "idempotency_key",
+        "sink",
+        "task_id",
+        "due_date",
+        "payload",
+        "status",
+        "attempts",
+        "run_after",
+    )
+]
+_DEAD_LETTER_COLUMNS = [
+    "idempotency_key",
+    "sink",
+    "task_id",
+    "due_date",
+    "payload",
+    "attempts",
+    "last_error",
+]
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC)
+
+
+async def enqueue_deliveries(session: AsyncSession, reminders: list[Reminder]) -> None:
+    """Reminder handler: add a delivery of each reminder to every configured
+    sink, in the transaction of the tick."""
+    sinks = sink_names(get_settings().delivery)
+    if not sinks or not reminders:
+        return
+    now = _now()
+    # A tick holds few distinct due dates
+    due_dates: dict[datetime.datetime, tuple[datetime.datetime, int]] = {}
+    # A chunk at a time, the event loop runs between the statements
+    for start in range(0, len(reminders), _READ_CHUNK):
+        chunk = reminders[start : start + _READ_CHUNK]
+        tasks = await session.execute(
+            select(Task.id, Task.name, Task.description).where(
+                Task.id.in_([reminder.task_id for reminder in chunk])
+            )
+        )
+        names = {task.id: (task.name, task.description) for task in tasks}
+        rows = []
+        for reminder in chunk:
+            if (task := names.get(reminder.task_id)) is None:
+                continue
+            if reminder.due_date not in due_dates:
+                stored = reminder.due_date.astimezone(datetime.UTC).replace(tzinfo=None)
+                due_dates[reminder.due_date] = (stored, due_epoch_us(stored))
+            due_date, micros = due_dates[reminder.due_date]
+            # Same fields and formats as the task in API responses
+            payload = orjson.dumps(
+                {
+                    "id": str(reminder.task_id),
+                    "name": task[0],
+                    "description": task[1],
+                    "due_date": due_date,
+                }
+            ).decode()
+            rows.extend(
+                (
+                    f"{reminder.task_id}:{micros}:{sink}",
+                    sink,
+                    reminder.task_id,
+                    due_date,
+                    payload,
+                    DELIVERY_PENDING,
+                    0,
+                    now,
+                )
+                for sink in sinks
+            )
+        if not rows:
+            continue
+        # SQLite only reads ON CONFLICT after an INSERT ... SELECT with a WHERE
+        source = database_session.rows_select(session, _OUTBOX_COLUMNS, rows).where(true())
+        stmt = database_session.dialect_insert(session, ReminderDelivery).from_select(
+            [column.name for column in _OUTBOX_COLUMNS], source
+        )
+        await session.execute(stmt.on_conflict_do_nothing(index_elements=["idempotency_key"]))
+        session.info[_ADDED_DELIVERIES] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session: Session) -> None:
+    if session.info.pop(_ADDED_DELIVERIES, False):
+        _NEW_DELIVERIES.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_ADDED_DELIVERIES, None)
+
+
+@dataclass
+class SinkStats:
+    claimed: int = 0
+    in_flight: int = 0
+    sent: int = 0
+    batches: int = 0
+    failed_batches: int = 0
+    retried: int = 0
+    dead: int = 0
+    # Claimed again elsewhere after the lease expired, before the outcome
+    # was written
+    lost: int = 0
+
+
+class _Lane:
+    def __init__(self, sink: ReminderSink, queue_size: int) -> None:
+        self.sink = sink
+        self.queue: asyncio.Queue[Delivery] = asyncio.Queue(max(queue_size, 1))
+        self.taking = asyncio.Lock()
+        self.stats = SinkStats()
+        # Per batch sent, and from the due date until the delivery was sent
+        self.send_latency = LatencyHistogram()
+        self.delivery_lag = LatencyHistogram()
+        # The last claim filled the queue, more rows may be waiting
+        self.backlog = False
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            **asdict(self.stats),
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "send_latency": self.send_latency.snapshot(),
+            "delivery_lag": self.delivery_lag.snapshot(),
+        }
+
+
+class DeliveryPipeline:
+    def __init__(
+        self,
+        sinks: list[ReminderSink],
+        settings: DeliverySettings | None = None,
+        worker_id: str | None = None,
+    ) -> None:
+        self.settings = settings or get_settings().delivery
+        self.worker_id = worker_id or (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.lanes = {sink.name: _Lane(sink, self.settings.queue_size) for sink in sinks}
+        # Set by senders once a queue with a backlog has room again
+        self._room = asyncio.Event()
+
+    async def run(self) -> None:
+        senders = [
+            asyncio.create_task(self._send_loop(lane))
+            for lane in self.lanes.values()
+            for _ in range(lane.sink.concurrency)
+        ]
+        logger.info("Reminder delivery %s started: %s", self.worker_id, ", ".join(self.lanes))
+        last_purge = None
+        try:
+            while True:
+                _NEW_DELIVERIES.clear()
+                self._room.clear()
+                try:
+                    await self.dispatch()
+                    if last_purge is None or time.monotonic() - last_purge > _PURGE_INTERVAL_SECS:
+                        await self.purge_sent()
+                        last_purge = time.monotonic()
+                except Exception:
+                    logger.exception("Failed to claim reminder deliveries")
+                wakeups = [
+                    asyncio.create_task(_NEW_DELIVERIES.wait()),
+                    asyncio.create_task(self._room.wait()),
+                ]
+                try:
+                    await asyncio.wait(
+                        wakeups,
+                        timeout=self.settings.poll_interval_secs,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                finally:
+                    for wakeup in wakeups:
+                        wakeup.cancel()
+        finally:
+            for sender in senders:
+                sender.cancel()
+            await asyncio.gather(*senders, return_exceptions=True)
+            await self._release()
+            for lane in self.lanes.values():
+                await lane.sink.close()
+
+    async def dispatch(self) -> int:
+        """Claim due deliveries into the queues with room, returns how many."""
+        claimed = 0
+        for name, lane in self.lanes.items():
+            room = lane.queue.maxsize - lane.queue.qsize()
+            if room <= 0:
+                continue
+            deliveries = await self._claim(name, room)
+            lane.backlog = len(deliveries) == room
+            lane.stats.claimed += len(deliveries)
+            for delivery in deliveries:
+                lane.queue.put_nowait(delivery)
+            claimed += len(deliveries)
+        return claimed
+
+    async def _claim(self, sink: str, limit: int) -> list[Delivery]:
+        now = _now()
+        rows = []
+        async with database_session.get_async_session() as session:
+            # Expired leases first, then the pending rows; one status at a
+            # time, so each is a range of the index in (run_after, id) order
+            for status in (DELIVERY_SENDING, DELIVERY_PENDING):
+                claimable = (
+                    ReminderDelivery.sink == sink,
+                    ReminderDelivery.status == status,
+                    ReminderDelivery.run_after <= now,
+                )
+                candidates = (
+                    select(ReminderDelivery.id)
+                    .where(*claimable)
+                    .order_by(ReminderDelivery.run_after, ReminderDelivery.id)
+                    .limit(limit - len(rows))
+                )
+                if session.bind.dialect.name == "postgresql":
+                    candidates = candidates.with_for_update(skip_locked=True)
+                # Compare-and-set, rows claimed meanwhile fail the conditions
+                rows += (
+                    await session.execute(
+                        update(ReminderDelivery)
+                        .where(ReminderDelivery.id.in_(candidates), *claimable)
+                        .values(
+                            status=DELIVERY_SENDING,
+                            locked_by=self.worker_id,
+                            attempts=ReminderDelivery.attempts + 1,
+                            run_after=now + datetime.timedelta(seconds=self.settings.lease_secs),
+                        )
+                        .returning(
+                            ReminderDelivery.id,
+                            ReminderDelivery.idempotency_key,
+                            ReminderDelivery.task_id,
+                            ReminderDelivery.due_date,
+                            ReminderDelivery.payload,
+                            ReminderDelivery.attempts,
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+                ).all()
+                if len(rows) >= limit:
+                    break
+            await session.commit()
+        return [
+            Delivery(
+                delivery_id=row.id,
+                idempotency_key=row.idempotency_key,
+                task_id=row.task_id,
+                due_date=row.due_date,
+                payload=orjson.loads(row.payload),
+                attempts=row.attempts,
+            )
+            for row in rows
+        ]
+
+    async def _send_loop(self, lane: _Lane) -> None:
+        window = self.settings.batch_window_ms / 1000
+        while True:
+            # One sender fills a batch at a time, the others send theirs
+            async with lane.taking:
+                batch = [await lane.queue.get()]
+                if window > 0 and lane.queue.qsize() < lane.sink.batch_size - 1:
+                    # Let the batch fill up, under load it is full already
+                    await asyncio.sleep(window)
+                while len(batch) < lane.sink.batch_size and not lane.queue.empty():
+                    batch.append(lane.queue.get_nowait())
+            if lane.backlog and lane.queue.qsize() <= lane.queue.maxsize // 2:
+                self._room.set()
+            await self._deliver(lane, batch)
+
+    async def _deliver(self, lane: _Lane, batch: list[Delivery]) -> None:
+        lane.stats.in_flight += len(batch)
+        started = time.perf_counter()
+        error = None
+        try:
+            await lane.sink.send(batch)
+        except Exception as e:
+            error = e
+        finally:
+            lane.stats.in_flight -= len(batch)
+        lane.send_latency.observe(time.perf_counter() - started)
+        lane.stats.batches += 1
+        try:
+            if error is None:
+                await self._mark_sent(lane, batch)
+            else:
+                lane.stats.failed_batches += 1
+                logger.warning(
+                    "Failed to deliver %s reminders to %s: %r", len(batch), lane.sink.name, error
+                )
+                await self._mark_failed(lane, batch, error)
+        except Exception:
+            # Still leased, claimed and sent again once the lease expires
+            logger.exception("Failed to record %s reminder deliveries", len(batch))
+
+    def _owned(self, batch: list[Delivery]):
+        return (
+            ReminderDelivery.id.in_([delivery.delivery_id for delivery in batch]),
+            ReminderDelivery.status == DELIVERY_SENDING,
+            ReminderDelivery.locked_by == self.worker_id,
+        )
+
+    async def _mark_sent(self, lane: _Lane, batch: list[Delivery]) -> None:
+        now = _now()
+        async with database_session.get_async_session() as session:
+            result = await session.execute(
+                update(ReminderDelivery)
+                .where(*self._owned(batch))
+                .values(status=DELIVERY_SENT, locked_by=None, last_error=None, run_after=now)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        lane.stats.sent += result.rowcount
+        lane.stats.lost += len(batch) - result.rowcount
+        for delivery in batch:
+            lag = now - add_timezone_to_datetime(delivery.due_date)
+            lane.delivery_lag.observe(lag.total_seconds())
+
+    async def _mark_failed(self, lane: _Lane, batch: list[Delivery], error: Exception) -> None:
+        settings = self.settings
+        last_error = f"{error.__class__.__name__}: {error}"
+        permanent = isinstance(error, PermanentDeliveryError)
+        dead: list[Delivery] = []
+        retries: dict[int, list[Delivery]] = {}
+        for delivery in batch:
+            if permanent or delivery.attempts >= settings.max_attempts:
+                dead.append(delivery)
+            else:
+                retries.setdefault(delivery.attempts, []).append(delivery)
+
+        now = _now()
+        moved = retried = 0
+        async with database_session.get_async_session() as session:
+            if dead:
+                rows = select(
+                    *(ReminderDelivery.__table__.c[name] for name in _DEAD_LETTER_COLUMNS[:-1]),
+                    literal(last_error).label("last_error"),
+                ).where(*self._owned(dead))
+                await session.execute(
+                    database_session.dialect_insert(session, ReminderDeadLetter)
+                    .from_select(_DEAD_LETTER_COLUMNS, rows)
+                    .on_conflict_do_nothing(index_elements=["idempotency_key"])
+                )
+                result = await session.execute(
+                    delete(ReminderDelivery)
+                    .where(*self._owned(dead))
+                    .execution_options(synchronize_session=False)
+                )
+                moved = result.rowcount
+            for attempts, deliveries in retries.items():
+                backoff = min(
+                    settings.retry_base_delay_secs * 2 ** (attempts - 1),
+                    settings.retry_max_delay_secs,
+                )
+                # Spread out, a batch failing together is not retried together
+                backoff = random.uniform(backoff / 2, backoff)
+                result = await session.execute(
+                    update(ReminderDelivery)
+                    .where(*self._owned(deliveries))
+                    .values(
+                        status=DELIVERY_PENDING,
+                        locked_by=None,
+                        last_error=last_error,
+                        run_after=now + datetime.timedelta(seconds=backoff),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                retried += result.rowcount
+            await session.commit()
+        lane.stats.dead += moved
+        lane.stats.retried += retried
+        lane.stats.lost += len(batch) - moved - retried
+
+    async def _release(self) -> None:
+        # Queued or cut short by the shutdown: claimable again right away,
+        # the attempt does not count
+        try:
+            async with database_session.get_async_session() as session:
+                await session.execute(
+                    update(ReminderDelivery)
+                    .where(
+                        ReminderDelivery.status == DELIVERY_SENDING,
+                        ReminderDelivery.locked_by == self.worker_id,
+                    )
+                    .values(
+                        status=DELIVERY_PENDING,
+                        locked_by=None,
+                        attempts=ReminderDelivery.attempts - 1,
+                        run_after=_now(),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+        except Exception:
+            logger.exception("Failed to release reminder deliveries, they wait for their lease")
+
+    async def purge_sent(self) -> int:
+        """Delete the deliveries sent before `sent_retention_secs`."""
+        cutoff = _now() - datetime.timedelta(seconds=self.settings.sent_retention_secs)
+        purged = 0
+        for name in self.lanes:
+            while True:
+                async with database_session.get_async_session() as session:
+                    expired = (
+                        select(ReminderDelivery.id)
+                        .where(
+                            ReminderDelivery.sink == name,
+                            ReminderDelivery.status == DELIVERY_SENT,
+                            ReminderDelivery.run_after < cutoff,
+                        )
+                        .limit(_PURGE_CHUNK)
+                    )
+                    result = await session.execute(
+                        delete(ReminderDelivery)
+                        .where(ReminderDelivery.id.in_(expired))
+                        .execution_options(synchronize_session=False)
+                    )
+                    await session.commit()
+                purged += result.rowcount
+                if result.rowcount < _PURGE_CHUNK:
+                    break
+        return purged
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        return {name: lane.snapshot() for name, lane in self.lanes.items()}
+
+
+async def replay_dead_letters(sink: str | None = None) -> int:
+    """Move the dead letters (of `sink`, or all) back to the outbox, they are
+    sent again with a fresh count of attempts."""
+    async with database_session.get_async_session() as session:
+        selected = () if sink is None else (ReminderDeadLetter.sink == sink,)
+        rows = select(
+            ReminderDeadLetter.idempotency_key,
+            ReminderDeadLetter.sink,
+            ReminderDeadLetter.task_id,
+            ReminderDeadLetter.due_date,
+            ReminderDeadLetter.payload,
+            literal(DELIVERY_PENDING),
+            literal(0),
+            literal(_now(), ReminderDelivery.run_after.type),
+        ).where(true(), *selected)
+        await session.execute(
+            database_session.dialect_insert(session, ReminderDelivery)
+            .from_select([column.name for column in _OUTBOX_COLUMNS], rows)
+            .on_conflict_do_nothing(index_elements=["idempotency_key"])
+        )
+        result = await session.execute(delete(ReminderDeadLetter).where(*selected))
+        await session.commit()
+    return result.rowcount
+
+
+_DELIVERY_PIPELINE: DeliveryPipeline | None = None
+
+
+def get_delivery_pipeline() -> DeliveryPipeline:
+    global _DELIVERY_PIPELINE
+    if _DELIVERY_PIPELINE is None:
+        _DELIVERY_PIPELINE = DeliveryPipeline(build_sinks(get_settings().delivery))
+    return _DELIVERY_PIPELINE
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["replay"]:
+        print(f"Requeued {asyncio.run(replay_dead_letters(*sys.argv[2:3]))} dead letters")
+        sys.exit(0)
+    if sys.argv[1:]:
+        print("Usage: python -m api.utils.reminder_delivery [replay [SINK]]")
+        sys.exit(1)
+    try:
+        asyncio.run(get_delivery_pipeline().run())
+    except KeyboardInterrupt:
+        pass
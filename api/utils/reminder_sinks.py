@@ -0,0 +1,227 @@
+# Destinations of fired reminders, fed by the delivery pipeline of
+# reminder_delivery.py.
+#
+# A sink gets a whole batch of deliveries at once and raises when sending
+# failed: `PermanentDeliveryError` when sending the batch again cannot help
+# (the deliveries go to the dead letters), anything else is retried later.
+# Every delivery carries the idempotency key of its outbox row, so a batch
+# sent again (lost reply, expired lease) is recognised by the receiver:
+#
+# - "inbox" adds rows to `inbox_messages`, unique by key;
+# - "webhook" POSTs {"reminders": [...]} once per batch, each reminder with
+#   its "idempotency_key";
+# - "email" sends one message per reminder over one SMTP connection per
+#   batch, the Message-ID made from the key.
+
+import asyncio
+import datetime
+import logging
+import smtplib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from email.message import EmailMessage
+from typing import Any
+
+import httpx
+from sqlalchemy import true
+
+from core import database_session
+from core.config import Delivery as DeliverySettings
+from models import InboxMessage
+
+logger = logging.getLogger(__name__)
+
+# Client errors worth sending again, the receiver may accept them later
+_RETRYABLE_STATUS = frozenset({408, 409, 425, 429})
+_INBOX_COLUMNS = [
+    InboxMessage.__table__.c[name]
+    for name in ("idempotency_key", "task_id", "title", "body", "due_date")
+]
+
+
+@dataclass(frozen=True)
+class Delivery:
+    delivery_id: int
+    idempotency_key: str
+    task_id: int
+    # As stored: naive, in UTC
+    due_date: datetime.datetime
+    # The task when the reminder fired: id, name, description and due_date
+    payload: dict[str, Any]
+    attempts: int
+
+
+class PermanentDeliveryError(Exception):
+    """The sink refused the deliveries, sending them again cannot help."""
+
+
+class ReminderSink(ABC):
+    name: str
+
+    def __init__(self, batch_size: int, concurrency: int) -> None:
+        self.batch_size = max(batch_size, 1)
+        # Batches sent at the same time
+        self.concurrency = max(concurrency, 1)
+
+    @abstractmethod
+    async def send(self, deliveries: list[Delivery]) -> None:
+        """Send one batch, raising when it failed."""
+
+    async def close(self) -> None:
+        pass
+
+
+class InboxSink(ReminderSink):
+    name = "inbox"
+
+    async def send(self, deliveries: list[Delivery]) -> None:
+        rows = [
+            (
+                delivery.idempotency_key,
+                delivery.task_id,
+                delivery.payload["name"],
+                delivery.payload["description"],
+                delivery.due_date,
+            )
+            for delivery in deliveries
+        ]
+        async with database_session.get_async_session() as session:
+            # SQLite only reads ON CONFLICT after an INSERT ... SELECT with a WHERE
+            source = database_session.rows_select(session, _INBOX_COLUMNS, rows).where(true())
+            stmt = database_session.dialect_insert(session, InboxMessage).from_select(
+                [column.name for column in _INBOX_COLUMNS], source
+            )
+            await session.execute(stmt.on_conflict_do_nothing(index_elements=["idempotency_key"]))
+            await session.commit()
+
+
+class WebhookSink(ReminderSink):
+    name = "webhook"
+
+    def __init__(
+        self,
+        url: str,
+        timeout_secs: float,
+        batch_size: int,
+        concurrency: int,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        super().__init__(batch_size, concurrency)
+        self.url = url
+        self._client = httpx.AsyncClient(
+            timeout=timeout_secs,
+            limits=httpx.Limits(max_connections=self.concurrency),
+            transport=transport,
+        )
+
+    async def send(self, deliveries: list[Delivery]) -> None:
+        reminders = [
+            {**delivery.payload, "idempotency_key": delivery.idempotency_key}
+            for delivery in deliveries
+        ]
+        response = await self._client.post(self.url, json={"reminders": reminders})
+        if response.is_client_error and response.status_code not in _RETRYABLE_STATUS:
+            raise PermanentDeliveryError(f"Webhook answered {response.status_code}")
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class EmailSink(ReminderSink):
+    name = "email"
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        timeout_secs: float,
+        sender: str,
+        recipient: str,
+        batch_size: int,
+        concurrency: int,
+    ) -> None:
+        super().__init__(batch_size, concurrency)
+        self.host = host
+        self.port = port
+        self.timeout_secs = timeout_secs
+        self.sender = sender
+        self.recipient = recipient
+
+    def message(self, delivery: Delivery) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = self.recipient
+        message["Subject"] = f"Reminder: {delivery.payload['name']}"
+        domain = self.sender.rpartition("@")[2] or "localhost"
+        message["Message-ID"] = f"<{delivery.idempotency_key.replace(':', '.')}@{domain}>"
+        lines = [f"Due {delivery.due_date:%Y-%m-%d %H:%M} UTC"]
+        if delivery.payload["description"]:
+            lines[:0] = [delivery.payload["description"], ""]
+        message.set_content("\n".join(lines))
+        return message
+
+    def _send_messages(self, messages: list[EmailMessage]) -> None:
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout_secs) as smtp:
+                for message in messages:
+                    smtp.send_message(message)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentDeliveryError(f"Recipient refused: {e.recipients}") from e
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code >= 500:
+                raise PermanentDeliveryError(f"SMTP {e.smtp_code}: {e.smtp_error!r}") from e
+            raise
+
+    async def send(self, deliveries: list[Delivery]) -> None:
+        # smtplib blocks, the batch goes out from a worker thread
+        await asyncio.to_thread(self._send_messages, [self.message(d) for d in deliveries])
+
+
+def sink_names(settings: DeliverySettings) -> list[str]:
+    """The configured sinks that have what they need to send."""
+    names = []
+    for name in dict.fromkeys(settings.sinks):
+        if name == "webhook" and not settings.webhook_url:
+            continue
+        if name == "email" and not settings.email_to:
+            continue
+        names.append(name)
+    return names
+
+
+def build_sinks(settings: DeliverySettings) -> list[ReminderSink]:
+    names = sink_names(settings)
+    for name in dict.fromkeys(settings.sinks):
+        if name not in names:
+            logger.warning(
+                "Reminder sink %r is not configured (%s), skipped",
+                name,
+                "DELIVERY__WEBHOOK_URL" if name == "webhook" else "DELIVERY__EMAIL_TO",
+            )
+    sinks: list[ReminderSink] = []
+    for name in names:
+        if name == "inbox":
+            sinks.append(InboxSink(settings.inbox_batch_size, settings.inbox_concurrency))
+        elif name == "webhook":
+            sinks.append(
+                WebhookSink(
+                    settings.webhook_url,
+                    settings.webhook_timeout_secs,
+                    settings.webhook_batch_size,
+                    settings.webhook_concurrency,
+                )
+            )
+        elif name == "email":
+            sinks.append(
+                EmailSink(
+                    settings.smtp_host,
+                    settings.smtp_port,
+                    settings.smtp_timeout_secs,
+                    settings.email_from,
+                    settings.email_to,
+                    settings.email_batch_size,
+                    settings.email_concurrency,
+                )
+            )
+    return sinks
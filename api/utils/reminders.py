@@ -0,0 +1,387 @@
+# Reminder scheduler: fires a reminder once the clock passes the due date of
+# an open task, without polling the database.
+#
+# Upcoming reminders wait in a heap holding at most about
+# `reminders.max_loaded` of them: the earliest open tasks due after the
+# watermark, read in (due_date, id) order through ix_tasks_open_due_date_id.
+# The window is read further as it runs low; tasks due after its end stay in
+# the database until then, so a million pending reminders cost no more memory
+# than `max_loaded`. The heap follows task writes from any app process through
+# the task events hub, re-reading the changed tasks by id, and is reloaded
+# when events were missed.
+#
+# Reminders due within the same tick (`reminders.tick_secs`) fire together:
+# the handlers get them as one batch, inside the transaction that moves the
+# persisted watermark ("every reminder due until then has fired") to the end
+# of the tick. Handlers write their effects in that transaction, so each
+# reminder is handled once: a restarted scheduler resumes after the
+# watermark, catching up on the reminders that fell due while it was down,
+# and when several processes run one only the process that moves the
+# watermark fires a tick. The heap only tells when to tick: the process moving
+# the watermark fires every open task due since its previous value, read
+# through ix_tasks_open_due_date_id, including the ones only another process
+# had heard of. Setting a due date at or before the watermark fires nothing.
+#
+# Those tasks are read `reminders.max_loaded` at a time, by (due_date, id),
+# and the watermark moves to the last due date of each full page in its own
+# transaction; a catch-up after downtime holds one page at a time in memory.
+
+import asyncio
+import datetime
+import heapq
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import database_session
+from core.config import get_settings
+from models import TableVersion, Task
+from models.task import due_date_from_epoch_us, due_epoch_us
+
+from .datetime import add_timezone_to_datetime
+from .task_events import SubscriberOverflow, TaskEvent, get_event_hub
+from .task_queries import only_open
+
+logger = logging.getLogger(__name__)
+
+# table_versions row of the watermark, in microseconds since the epoch
+FIRED_THROUGH = "reminders_fired_through"
+# Tasks re-read per statement when following changes
+_READ_CHUNK = 5000
+
+@dataclass(frozen=True)
+class Reminder:
+    task_id: int
+    due_date: datetime.datetime
+
+
+# Called with the reminders of a tick inside its transaction, must not commit
+ReminderHandler = Callable[[AsyncSession, list[Reminder]], Awaitable[None]]
+
+
+@dataclass
+class SchedulerStats:
+    # Reminders in memory, and window reads from the database
+    loaded: int = 0
+    window_reads: int = 0
+    # Full reloads after missed task events
+    reloads: int = 0
+    ticks: int = 0
+    fired: int = 0
+    # Popped but no longer matching the task (completed or rescheduled by
+    # another process), or ticks fired by another process
+    stale: int = 0
+    skipped_ticks: int = 0
+    failed_ticks: int = 0
+
+
+async def get_fired_through(session: AsyncSession) -> int | None:
+    return await session.scalar(
+        select(TableVersion.version).where(TableVersion.name == FIRED_THROUGH)
+    )
+
+
+async def _advance_fired_through(
+    session: AsyncSession, micros: int, expected: int | None = None
+) -> bool:
+    """Move the watermark forward, from `expected` when given. False when it
+    is already there or moved from `expected` meanwhile (locked until commit
+    on Postgres, so a concurrent tick waits and then loses)."""
+    stmt = database_session.dialect_insert(session, TableVersion).values(
+        name=FIRED_THROUGH, version=micros
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TableVersion.name],
+        set_={"version": stmt.excluded.version, "update_time": func.now()},
+        where=(
+            TableVersion.version < stmt.excluded.version
+            if expected is None
+            else TableVersion.version == expected
+        ),
+    )
+    return await session.scalar(stmt.returning(TableVersion.name)) is not None
+
+
+class ReminderScheduler:
+    def __init__(self, tick_secs: float, max_loaded: int) -> None:
+        self.tick = max(round(tick_secs * 1_000_000), 1)
+        self.max_loaded = max_loaded
+        self.handlers: list[ReminderHandler] = []
+        self.stats = SchedulerStats()
+        self.fired_through = 0
+        # (due, task id); entries whose task moved or left are skipped when
+        # popped, `_due` has the current due date of every loaded task
+        self._heap: list[tuple[int, int]] = []
+        self._due: dict[int, int] = {}
+        # Last (due, task id) read into the window, None when every upcoming
+        # task is in it
+        self._window_end: tuple[int, int] | None = None
+        self._window_lock = asyncio.Lock()
+        self._changed = asyncio.Event()
+        self._ready = asyncio.Event()
+
+    def add_handler(self, handler: ReminderHandler) -> None:
+        if handler not in self.handlers:
+            self.handlers.append(handler)
+
+    def schedule(self, task_id: int, due: int | None) -> None:
+        """Track the due date (`due_epoch_us`) of an open task, None to drop it."""
+        if (
+            due is None
+            or due <= self.fired_through
+            or (self._window_end is not None and (due, task_id) > self._window_end)
+        ):
+            # Past already, or read with the rest of the window later on
+            self._due.pop(task_id, None)
+        elif self._due.get(task_id) != due:
+            self._due[task_id] = due
+            heapq.heappush(self._heap, (due, task_id))
+            self._changed.set()
+            if len(self._heap) > 2 * self.max_loaded:
+                self._trim()
+        self.stats.loaded = len(self._due)
+
+    def _trim(self) -> None:
+        # Drops the skipped entries, and the latest reminders once there are
+        # too many; they are read again with the rest of the window
+        entries = sorted((due, task_id) for task_id, due in self._due.items())
+        if len(entries) > self.max_loaded:
+            entries = entries[: self.max_loaded]
+            self._window_end = entries[-1]
+            self._due = {task_id: due for due, task_id in entries}
+        self._heap = entries
+
+    async def _read_window(self, reset: bool) -> None:
+        async with self._window_lock, database_session.get_async_session() as session:
+            if reset:
+                fired_through = await get_fired_through(session)
+                if fired_through is None:
+                    # First start, tasks already past due get no reminder
+                    fired_through = time.time_ns() // 1000
+                    await _advance_fired_through(session, fired_through)
+                    await session.commit()
+                self.fired_through = fired_through
+                self._heap, self._due, self._window_end = [], {}, None
+                after = None
+            elif self._window_end is None:
+                return
+            else:
+                after = self._window_end
+            # A single tick holding more reminders than that is read whole
+            limit = max(self.max_loaded - len(self._due), self.max_loaded // 4, 1)
+            query = select(Task.id, Task.due_date).where(
+                Task.due_date > due_date_from_epoch_us(self.fired_through)
+            )
+            if after is not None:
+                due_date = due_date_from_epoch_us(after[0])
+                query = query.where(
+                    or_(Task.due_date > due_date, and_(Task.due_date == due_date, Task.id > after[1]))
+                )
+            rows = (
+                await session.execute(
+                    only_open(query).order_by(Task.due_date, Task.id).limit(limit)
+                )
+            ).all()
+        if not reset and self._window_end != after:
+            # Trimmed meanwhile, read again from its new end
+            return
+        for row in rows:
+            due = due_epoch_us(row.due_date)
+            self._due[row.id] = due
+            self._heap.append((due, row.id))
+        heapq.heapify(self._heap)
+        self._window_end = None
+        if len(rows) == limit:
+            self._window_end = (due_epoch_us(rows[-1].due_date), rows[-1].id)
+        self.stats.window_reads += 1
+        self.stats.loaded = len(self._due)
+        self._changed.set()
+
+    def _next_tick(self) -> int | None:
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        # End of the tick the earliest reminder falls in
+        return -(-self._heap[0][0] // self.tick) * self.tick
+
+    async def _step(self) -> None:
+        self._changed.clear()
+        tick = self._next_tick()
+        if self._window_end is not None and (
+            tick is None or tick >= self._window_end[0] or len(self._due) < self.max_loaded // 4
+        ):
+            await self._read_window(reset=False)
+            return
+        delay = None if tick is None else (tick - time.time_ns() // 1000) / 1_000_000
+        if delay is None or delay > 0:
+            try:
+                await asyncio.wait_for(self._changed.wait(), delay)
+            except TimeoutError:
+                pass
+            return
+        await self._fire(tick)
+
+    async def _fire(self, tick: int) -> None:
+        batch: set[tuple[int, int]] = set()
+        while self._heap and self._heap[0][0] <= tick:
+            due, task_id = heapq.heappop(self._heap)
+            if self._due.get(task_id) == due:
+                del self._due[task_id]
+                batch.add((task_id, due))
+        self.stats.loaded = len(self._due)
+        # Popped entries not fired from the database end up stale
+        unfired = set(batch)
+        claimed = False
+        try:
+            while self.fired_through < tick:
+                async with database_session.get_async_session() as session:
+                    stored = await get_fired_through(session)
+                    previous = self.fired_through if stored is None else stored
+                    if previous >= tick:
+                        # The process that moved it fired these from the database
+                        self.fired_through = previous
+                        break
+                    fired, until = await self._fire_page(session, previous, tick, stored)
+                    if until is None:
+                        # Moved by another process meanwhile, read it again
+                        continue
+                    await session.commit()
+                claimed = True
+                self.fired_through = until
+                self.stats.fired += len(fired)
+                unfired -= fired
+        except Exception:
+            logger.exception("Failed to fire reminders due by %s, retrying", tick)
+            self.stats.failed_ticks += 1
+            for task_id, due in unfired:
+                if task_id not in self._due:
+                    self.schedule(task_id, due)
+            await asyncio.sleep(self.tick / 1_000_000)
+            return
+        if claimed:
+            self.stats.ticks += 1
+            self.stats.stale += len(unfired)
+        else:
+            self.stats.skipped_ticks += 1
+
+    async def _fire_page(
+        self, session: AsyncSession, previous: int, tick: int, stored: int | None
+    ) -> tuple[set[tuple[int, int]], int | None]:
+        """Fire a page of the open tasks due after `previous` up to `tick` and
+        move the watermark to its end. Returns the (task id, due) fired and
+        that end, or None when the watermark moved from `stored` meanwhile."""
+        # From the database rather than the heap: another process may have
+        # completed, moved or created a task without this one hearing of it
+        limit = max(self.max_loaded, 1)
+        page = await self._due_page(session, (previous, None), tick, limit)
+        # The watermark holds a due date only: a full page ends at its last
+        # one, and the other tasks due then are fired here too, a page at a time
+        until = tick if len(page) < limit else due_epoch_us(page[-1].due_date)
+        if not await _advance_fired_through(session, until, stored):
+            return set(), None
+        fired: set[tuple[int, int]] = set()
+        while page:
+            for handler in self.handlers:
+                await handler(session, page)
+            fired.update((reminder.task_id, due_epoch_us(reminder.due_date)) for reminder in page)
+            if len(page) < limit:
+                break
+            last = page[-1]
+            page = await self._due_page(
+                session, (due_epoch_us(last.due_date), last.task_id), until, limit
+            )
+        if fired:
+            logger.debug("Fired %s reminders due by %s", len(fired), due_date_from_epoch_us(until))
+        return fired, until
+
+    async def _due_page(
+        self, session: AsyncSession, after: tuple[int, int | None], until: int, limit: int
+    ) -> list[Reminder]:
+        """Open tasks due after `after` (a due date, and a task id within it
+        when given) and by `until`, in (due_date, id) order."""
+        due_date = due_date_from_epoch_us(after[0])
+        after_clause = (
+            Task.due_date > due_date
+            if after[1] is None
+            else or_(Task.due_date > due_date, and_(Task.due_date == due_date, Task.id > after[1]))
+        )
+        rows = await session.execute(
+            only_open(
+                select(Task.id, Task.due_date).where(
+                    after_clause, Task.due_date <= due_date_from_epoch_us(until)
+                )
+            )
+            .order_by(Task.due_date, Task.id)
+            .limit(limit)
+        )
+        return [Reminder(row.id, add_timezone_to_datetime(row.due_date)) for row in rows]
+
+    async def _apply(self, events: list[TaskEvent]) -> None:
+        changed = []
+        for task_event in events:
+            if task_event.type == "deleted":
+                self.schedule(task_event.task_id, None)
+            elif task_event.type in ("created", "updated"):
+                changed.append(task_event.task_id)
+        for start in range(0, len(changed), _READ_CHUNK):
+            task_ids = changed[start : start + _READ_CHUNK]
+            async with database_session.get_async_session() as session:
+                rows = await session.execute(
+                    select(Task.id, Task.due_date, Task.is_completed).where(Task.id.in_(task_ids))
+                )
+            current = {
+                row.id: due_epoch_us(row.due_date)
+                for row in rows
+                if row.due_date is not None and not row.is_completed
+            }
+            for task_id in task_ids:
+                self.schedule(task_id, current.get(task_id))
+
+    async def _follow_changes(self) -> None:
+        hub = get_event_hub()
+        while True:
+            # Subscribed before reading, no write falls in between
+            with hub.subscribe() as subscription:
+                try:
+                    await self._read_window(reset=True)
+                    self._ready.set()
+                    while True:
+                        await self._apply(await subscription.get())
+                except SubscriberOverflow:
+                    logger.info("Missed task events, reloading upcoming reminders")
+                except Exception:
+                    logger.exception("Failed to follow task changes, reloading reminders")
+                    await asyncio.sleep(self.tick / 1_000_000)
+            self.stats.reloads += 1
+
+    async def run(self) -> None:
+        follower = asyncio.create_task(self._follow_changes())
+        try:
+            await self._ready.wait()
+            while True:
+                try:
+                    await self._step()
+                except Exception:
+                    logger.exception("Failed to read upcoming reminders")
+                    await asyncio.sleep(self.tick / 1_000_000)
+        finally:
+            follower.cancel()
+
+    def snapshot(self) -> dict[str, int]:
+        return {**asdict(self.stats), "fired_through": self.fired_through}
+
+
+_REMINDER_SCHEDULER: ReminderScheduler | None = None
+
+
+def get_reminder_scheduler() -> ReminderScheduler:
+    global _REMINDER_SCHEDULER
+    if _REMINDER_SCHEDULER is None:
+        settings = get_settings().reminders
+        _REMINDER_SCHEDULER = ReminderScheduler(settings.tick_secs, settings.max_loaded)
+    return _REMINDER_SCHEDULER
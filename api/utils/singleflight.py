@@ -0,0 +1,48 @@
+# Single-flight: concurrent callers asking for the same key share one call.
+#
+# The shared call runs as its own task and every caller awaits it through
+# `asyncio.shield`, so a caller that gets cancelled (client went away, request
+# timeout) only stops waiting, it never cancels the work the others wait on.
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import asdict, dataclass
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class SingleFlightStats:
+    calls: int = 0
+    shared: int = 0
+
+
+class SingleFlight(Generic[T]):
+    def __init__(self) -> None:
+        self.stats = SingleFlightStats()
+        self._in_flight: dict[Hashable, asyncio.Task[T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key)
+        if task is None:
+            self.stats.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.stats.shared += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task[T]) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every waiter is gone
+            task.exception()
+
+    def snapshot(self) -> dict[str, int]:
+        return {**asdict(self.stats), "in_flight": len(self._in_flight)}
@@ -0,0 +1,19 @@
+import json
+from typing import Any
+
+# https://html.spec.whatwg.org/multipage/server-sent-events.html
+SSE_MEDIA_TYPE = "text/event-stream"
+# Proxies (nginx) must not buffer the stream, clients must not cache it
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_sse(event: str, data: Any, event_id: str | None = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def format_sse_comment(text: str) -> str:
+    return f": {text}\n\n"
@@ -0,0 +1,184 @@
+# Bookkeeping that has to happen in the same transaction as every write to
+# tasks or their difficulty records: call `record_task_changes` right before
+# committing. It
+#
+# - appends to the `task_changes` journal, which GET /tasks/changes reads to
+#   send clients only the tasks changed (or deleted) since their cursor;
+# - bumps the tasks change counter behind the ETags of GET /tasks/ and
+#   GET /tasks/{task_id}, a poll that sees the same version gets a 304;
+# - queues the events pushed on /tasks/events once the transaction commits,
+#   see task_events.py.
+#
+# Compaction drops journal entries superseded by a newer one for the same
+# task, which no cursor can need, and tombstones older than the retention.
+# Cursors from before the newest dropped tombstone get a 410 and resync.
+#
+#   python -m api.utils.task_changes compact
+
+import asyncio
+import datetime
+import logging
+import sys
+from collections.abc import Iterable
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import database_session
+from core.config import get_settings
+from models import TableVersion, TaskChange
+from models.task_change import CHANGE_DELETE, CHANGE_UPSERT
+
+from .task_events import TaskEvent, TaskEventType, queue_task_events
+
+logger = logging.getLogger(__name__)
+
+TASKS_TABLE = "tasks"
+# Journal id of the newest tombstone dropped by compaction
+JOURNAL_HORIZON = "task_changes_horizon"
+_JOURNAL_COLUMNS = [TaskChange.__table__.c[name] for name in ("task_id", "op", "create_time")]
+
+
+async def record_task_changes(
+    session: AsyncSession,
+    created: Iterable[int] = (),
+    updated: Iterable[int] = (),
+    deleted: Iterable[int] = (),
+    difficulty_ready: Iterable[int] = (),
+) -> None:
+    """Journal the tasks written by the current transaction, bump the tasks
+    version and queue their events for after the commit. The caller commits."""
+    changes: dict[TaskEventType, list[int]] = {
+        "created": list(dict.fromkeys(created)),
+        "updated": list(dict.fromkeys(updated)),
+        "deleted": list(dict.fromkeys(deleted)),
+        "difficulty_ready": list(dict.fromkeys(difficulty_ready)),
+    }
+    entries = [
+        (task_id, CHANGE_DELETE if kind == "deleted" else CHANGE_UPSERT)
+        for kind, task_ids in changes.items()
+        for task_id in task_ids
+    ]
+    # The counter row stays locked until commit on Postgres, journal ids taken
+    # after it are in commit order and a cursor never skips a late commit
+    await _bump_version(session, TASKS_TABLE)
+    if entries:
+        # create_time set here, server defaults have no sub-second precision
+        # on SQLite. A single statement, imports journal thousands of tasks
+        now = datetime.datetime.now(datetime.UTC)
+        await session.execute(
+            insert(TaskChange.__table__).from_select(
+                [column.name for column in _JOURNAL_COLUMNS],
+                database_session.rows_select(
+                    session, _JOURNAL_COLUMNS, [(*entry, now) for entry in entries]
+                ),
+            )
+        )
+    queue_task_events(
+        session,
+        [TaskEvent(kind, task_id) for kind, task_ids in changes.items() for task_id in task_ids],
+    )
+
+
+async def _bump_version(session: AsyncSession, name: str, to: int | None = None) -> None:
+    # Upsert, the row may be missing in databases built with create_all.
+    # On Postgres this locks the counter row until commit, so it comes right
+    # before committing.
+    stmt = database_session.dialect_insert(session, TableVersion).values(
+        name=name, version=1 if to is None else to
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TableVersion.name],
+        set_={
+            "version": TableVersion.version + 1 if to is None else stmt.excluded.version,
+            "update_time": func.now(),
+        },
+    )
+    await session.execute(stmt)
+
+
+async def _get_version(session: AsyncSession, name: str) -> int:
+    version = await session.scalar(select(TableVersion.version).where(TableVersion.name == name))
+    return version or 0
+
+
+async def get_tasks_version(session: AsyncSession) -> int:
+    return await _get_version(session, TASKS_TABLE)
+
+
+async def get_journal_horizon(session: AsyncSession) -> int:
+    return await _get_version(session, JOURNAL_HORIZON)
+
+
+async def read_task_changes(
+    session: AsyncSession, since: int, limit: int
+) -> tuple[dict[int, str], int, bool]:
+    """Latest op per task among the next `limit` journal entries after `since`,
+    the id of the last entry read and whether more entries follow."""
+    entries = (
+        await session.execute(
+            select(TaskChange.id, TaskChange.task_id, TaskChange.op)
+            .where(TaskChange.id > since)
+            .order_by(TaskChange.id)
+            .limit(limit + 1)
+        )
+    ).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    ops: dict[int, str] = {}
+    for entry in entries:
+        ops.pop(entry.task_id, None)
+        ops[entry.task_id] = entry.op
+    return ops, entries[-1].id if entries else since, has_more
+
+
+async def get_journal_head(session: AsyncSession) -> int:
+    return await session.scalar(select(func.max(TaskChange.id))) or 0
+
+
+async def compact_journal(force: bool = False) -> int:
+    """Compact once the journal holds more than `change_journal.max_rows`
+    entries (always with `force`). Returns the number of entries dropped."""
+    settings = get_settings().change_journal
+    async with database_session.get_async_session() as session:
+        rows = await session.scalar(select(func.count()).select_from(TaskChange))
+        if not force and rows <= settings.max_rows:
+            return 0
+
+        newest_per_task = select(func.max(TaskChange.id)).group_by(TaskChange.task_id)
+        superseded = await session.execute(
+            delete(TaskChange).where(TaskChange.id.not_in(newest_per_task))
+        )
+
+        cutoff = datetime.datetime.now(datetime.UTC) - datetime.timedelta(
+            seconds=settings.tombstone_retention_secs
+        )
+        expired = TaskChange.op == CHANGE_DELETE, TaskChange.create_time < cutoff
+        horizon = await session.scalar(select(func.max(TaskChange.id)).where(*expired))
+        dropped = superseded.rowcount
+        if horizon is not None:
+            result = await session.execute(
+                delete(TaskChange).where(TaskChange.op == CHANGE_DELETE, TaskChange.id <= horizon)
+            )
+            dropped += result.rowcount
+            await _bump_version(session, JOURNAL_HORIZON, to=horizon)
+        await session.commit()
+    logger.info("Compacted the task change journal, %s of %s entries dropped", dropped, rows)
+    return dropped
+
+
+async def run_compaction_loop() -> None:
+    interval = get_settings().change_journal.compact_interval_secs
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await compact_journal()
+        except Exception:
+            logger.exception("Task change journal compaction failed")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print("Usage: python -m api.utils.task_changes compact")
+        sys.exit(1)
+    print(f"Dropped {asyncio.run(compact_journal(force=True))} journal entries")
@@ -0,0 +1,89 @@
+# Due date ranges of GET /tasks/due and GET /tasks/overdue, filtered and
+# ordered in SQL.
+#
+# Both compare `tasks.due_epoch_us` (the due date in microseconds since the
+# epoch, UTC) as a plain integer, through ix_tasks_due_epoch_us_id or, for
+# open tasks only, ix_tasks_open_due_epoch_us_id: no date parsing or time zone
+# conversion per row, the same answer on SQLite and Postgres. Ranges include
+# their start and exclude their end. Pages are ordered by (due_epoch_us, id)
+# and the cursor carries the last row's pair, as in pagination.py.
+
+import base64
+import binascii
+import datetime
+import json
+from dataclasses import dataclass
+
+from fastapi import HTTPException, status
+from sqlalchemy import Row, and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Task
+from models.task import due_epoch_us
+
+from .task_json import TASK_ROW_COLUMNS
+from .task_queries import only_open
+
+
+@dataclass
+class DueCursor:
+    due_epoch_us: int
+    last_id: int
+
+
+def encode_due_cursor(cursor: DueCursor) -> str:
+    raw = json.dumps([cursor.due_epoch_us, cursor.last_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_due_cursor_or_error(token: str) -> DueCursor:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        due, last_id = json.loads(raw)
+        if not isinstance(due, int) or not isinstance(last_id, int):
+            raise ValueError(due, last_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    return DueCursor(due, last_id)
+
+
+async def fetch_due_page(
+    session: AsyncSession,
+    start: datetime.datetime | None,
+    end: datetime.datetime,
+    limit: int,
+    after: DueCursor | None = None,
+    exclude_completed: bool = False,
+) -> tuple[list[Row], str | None]:
+    """One page of the tasks due in [start, end) (before `end` when start is
+    None), rows of `TASK_ROW_COLUMNS`, and the cursor of the next page (None
+    on the last page)."""
+    if limit <= 0:
+        return [], None
+    query = (
+        select(*TASK_ROW_COLUMNS, Task.due_epoch_us)
+        .select_from(Task)
+        .outerjoin(Task.difficulty_record)
+        .where(Task.due_epoch_us < due_epoch_us(end))
+    )
+    if start is not None:
+        query = query.where(Task.due_epoch_us >= due_epoch_us(start))
+    else:
+        query = query.where(Task.due_epoch_us.is_not(None))
+    if after is not None:
+        # As pagination._after, the first term is an index range
+        query = query.where(
+            and_(
+                Task.due_epoch_us >= after.due_epoch_us,
+                or_(Task.due_epoch_us > after.due_epoch_us, Task.id > after.last_id),
+            )
+        )
+    if exclude_completed:
+        query = only_open(query)
+    query = query.order_by(Task.due_epoch_us, Task.id)
+
+    rows = (await session.execute(query.limit(limit + 1))).all()
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_due_cursor(DueCursor(last.due_epoch_us, last.id))
@@ -0,0 +1,321 @@
+# Push of task changes to clients, served by /tasks/events (WebSocket, or
+# Server-Sent Events for clients without one).
+#
+# `record_task_changes` queues an event per written task on the session, and
+# they are published once the transaction commits (dropped on rollback). The
+# event backend carries them to the hub of every app process, which fans them
+# out to its subscribers:
+#
+# - "memory": no backend, this process only, enough for a single uvicorn
+#   worker.
+# - "unix": every process sharing `events.unix_socket_dir` on this host, each
+#   binds a datagram socket there and publishes to all of them. A stand-in for
+#   a broker (Redis pub/sub, Postgres NOTIFY) behind the same interface.
+#   Datagrams are numbered per sender; a receiver seeing a gap (one dropped
+#   on a full socket buffer) sends every subscriber a "resync".
+#
+# Backpressure: a subscriber buffers at most one event per task, a newer event
+# for the same task replaces the pending one. A subscriber with more than
+# `events.max_pending` tasks pending is dropped with a "resync" event and is
+# expected to catch up through GET /tasks/changes.
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import socket
+import uuid
+from collections.abc import AsyncIterator, Callable, Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Literal, Protocol
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+TaskEventType = Literal["created", "updated", "deleted", "difficulty_ready"]
+
+# Session.info key of the events waiting for the commit
+_PENDING_EVENTS = "task_events"
+# Events per datagram, well below the default socket buffer size
+_DATAGRAM_EVENTS = 1000
+
+
+@dataclass(frozen=True)
+class TaskEvent:
+    type: TaskEventType
+    task_id: int
+
+    def to_message(self) -> dict[str, str]:
+        return {"type": self.type, "task_id": str(self.task_id)}
+
+
+class SubscriberOverflow(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, max_pending: int) -> None:
+        self.max_pending = max_pending
+        self.overflowed = False
+        self._pending: dict[int, TaskEvent] = {}
+        self._wakeup = asyncio.Event()
+
+    def push(self, task_event: TaskEvent) -> None:
+        if self.overflowed:
+            return
+        previous = self._pending.pop(task_event.task_id, None)
+        if previous and previous.type == "created" and task_event.type != "deleted":
+            # Still new to this subscriber
+            task_event = previous
+        self._pending[task_event.task_id] = task_event
+        if len(self._pending) > self.max_pending:
+            self.overflow()
+        self._wakeup.set()
+
+    def overflow(self) -> None:
+        """Drop the pending events, the next `get` raises `SubscriberOverflow`."""
+        self.overflowed = True
+        self._pending.clear()
+        self._wakeup.set()
+
+    async def get(self, timeout: float | None = None) -> list[TaskEvent]:
+        """Wait for the next events, oldest first, or `timeout` seconds for
+        none. Raises `SubscriberOverflow` once the subscriber fell too far
+        behind."""
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        self._wakeup.clear()
+        if self.overflowed:
+            raise SubscriberOverflow
+        events = list(self._pending.values())
+        self._pending.clear()
+        return events
+
+
+@dataclass
+class HubStats:
+    published: int = 0
+    delivered: int = 0
+    subscribers: int = 0
+    dropped_subscribers: int = 0
+    # Events lost between processes
+    resyncs: int = 0
+
+
+class EventBackend(Protocol):
+    async def start(
+        self, deliver: Callable[[list[TaskEvent]], None], resync: Callable[[], None]
+    ) -> None: ...
+
+    def publish(self, events: list[TaskEvent]) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(
+        self, deliver: Callable[[list[TaskEvent]], None], resync: Callable[[], None]
+    ) -> None:
+        self.deliver = deliver
+        self.resync = resync
+        # Sender -> number of the last datagram received from it
+        self._received: dict[str, int] = {}
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            sender, number, raw_events = json.loads(data)
+            events = [TaskEvent(kind, task_id) for kind, task_id in raw_events]
+        except (ValueError, TypeError):
+            logger.warning("Ignoring a malformed task event datagram")
+            return
+        last = self._received.get(sender)
+        self._received[sender] = number
+        if last is not None and number != last + 1:
+            logger.warning("Missed %s task event datagrams from %s", number - last - 1, sender)
+            self.resync()
+        self.deliver(events)
+
+
+class UnixSocketBackend:
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.path = directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+        self._transport: asyncio.DatagramTransport | None = None
+        self._sender: socket.socket | None = None
+        # Number of the last datagram published, every peer gets each number
+        self._sent = 0
+
+    async def start(
+        self, deliver: Callable[[list[TaskEvent]], None], resync: Callable[[], None]
+    ) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: _DatagramProtocol(deliver, resync),
+            local_addr=str(self.path),
+            family=socket.AF_UNIX,
+        )
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+
+    def publish(self, events: list[TaskEvent]) -> None:
+        if self._sender is None:
+            return
+        peers = list(self.directory.glob("*.sock"))
+        for start in range(0, len(events), _DATAGRAM_EVENTS):
+            chunk = events[start : start + _DATAGRAM_EVENTS]
+            self._sent += 1
+            payload = json.dumps(
+                [self.path.name, self._sent, [[e.type, e.task_id] for e in chunk]]
+            ).encode()
+            for peer in peers:
+                try:
+                    self._sender.sendto(payload, str(peer))
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Left behind by a process that exited without cleaning up
+                    peer.unlink(missing_ok=True)
+                except BlockingIOError:
+                    # The peer resyncs its subscribers when the next one arrives
+                    logger.warning("Task events to %s dropped, its socket buffer is full", peer)
+
+    async def close(self) -> None:
+        if self._transport:
+            self._transport.close()
+        if self._sender:
+            self._sender.close()
+        self._transport, self._sender = None, None
+        self.path.unlink(missing_ok=True)
+
+
+class TaskEventHub:
+    def __init__(self, max_pending: int, backend: EventBackend | None = None) -> None:
+        self.backend = backend
+        self.max_pending = max_pending
+        self.stats = HubStats()
+        self._subscriptions: set[Subscription] = set()
+
+    async def start(self) -> None:
+        if self.backend:
+            await self.backend.start(self.deliver, self.resync)
+
+    async def close(self) -> None:
+        if self.backend:
+            await self.backend.close()
+
+    def publish(self, events: list[TaskEvent]) -> None:
+        self.stats.published += len(events)
+        # Without a backend, only the subscribers of this process get them
+        if self.backend:
+            self.backend.publish(events)
+        else:
+            self.deliver(events)
+
+    def deliver(self, events: list[TaskEvent]) -> None:
+        for subscription in self._subscriptions:
+            was_overflowed = subscription.overflowed
+            for task_event in events:
+                subscription.push(task_event)
+            if subscription.overflowed and not was_overflowed:
+                self.stats.dropped_subscribers += 1
+        self.stats.delivered += len(events) * len(self._subscriptions)
+
+    def resync(self) -> None:
+        """Events were lost on the way, every subscriber starts over."""
+        self.stats.resyncs += 1
+        for subscription in self._subscriptions:
+            if not subscription.overflowed:
+                subscription.overflow()
+                self.stats.dropped_subscribers += 1
+
+    @contextlib.contextmanager
+    def subscribe(self) -> Iterator[Subscription]:
+        subscription = Subscription(self.max_pending)
+        self._subscriptions.add(subscription)
+        self.stats.subscribers = len(self._subscriptions)
+        try:
+            yield subscription
+        finally:
+            self._subscriptions.discard(subscription)
+            self.stats.subscribers = len(self._subscriptions)
+
+    def snapshot(self) -> dict[str, int]:
+        return asdict(self.stats)
+
+
+_EVENT_HUB: TaskEventHub | None = None
+
+
+def get_event_hub() -> TaskEventHub:
+    """The hub of this process, in-memory until `start_event_hub` is called."""
+    global _EVENT_HUB
+    if _EVENT_HUB is None:
+        _EVENT_HUB = TaskEventHub(get_settings().events.max_pending)
+    return _EVENT_HUB
+
+
+async def start_event_hub() -> None:
+    """Swap in the configured backend, called on startup."""
+    global _EVENT_HUB
+    settings = get_settings().events
+    backend = None
+    if settings.backend == "unix":
+        backend = UnixSocketBackend(Path(settings.unix_socket_dir))
+    hub = TaskEventHub(settings.max_pending, backend)
+    await hub.start()
+    if _EVENT_HUB is not None:
+        await _EVENT_HUB.close()
+    _EVENT_HUB = hub
+
+
+async def close_event_hub() -> None:
+    global _EVENT_HUB
+    if _EVENT_HUB is not None:
+        await _EVENT_HUB.close()
+        _EVENT_HUB = None
+
+
+async def task_event_messages() -> AsyncIterator[dict[str, str] | None]:
+    """Messages for one client of /tasks/events. None once subscribed and
+    then every `events.keepalive_secs` without events, the stream ends after
+    a "resync" message."""
+    keepalive_secs = get_settings().events.keepalive_secs
+    with get_event_hub().subscribe() as subscription:
+        yield None
+        while True:
+            try:
+                events = await subscription.get(keepalive_secs)
+            except SubscriberOverflow:
+                yield {"type": "resync"}
+                return
+            if not events:
+                yield None
+            for task_event in events:
+                yield task_event.to_message()
+
+
+def queue_task_events(session: AsyncSession | Session, events: list[TaskEvent]) -> None:
+    """Publish `events` once the session's transaction commits."""
+    session.info.setdefault(_PENDING_EVENTS, []).extend(events)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session) -> None:
+    events = session.info.pop(_PENDING_EVENTS, None)
+    if not events:
+        return
+    try:
+        get_event_hub().publish(events)
+    except Exception:
+        # The transaction is committed already, clients catch up on reconnect
+        logger.exception("Failed to publish %s task events", len(events))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_EVENTS, None)
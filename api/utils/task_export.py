@@ -0,0 +1,72 @@
+# Streaming export of every task, served by GET /tasks/export.
+#
+# Rows are read through a streamed result (a server-side cursor on Postgres,
+# chunked fetches on SQLite) `EXPORT_CHUNK_ROWS` at a time and each chunk is
+# encoded and sent before the next one is fetched, so memory stays flat
+# whatever the table size. When the client goes away the response stops
+# iterating, which closes the cursor and returns the connection.
+
+from collections.abc import AsyncIterator, Sequence
+from typing import Literal
+
+from sqlalchemy import Row, select
+
+from core import database_session
+from models import Task
+
+from .task_json import (
+    TASK_ROW_COLUMNS,
+    encode_task_rows_csv,
+    encode_task_rows_ndjson,
+)
+from .task_queries import only_open
+
+ExportFormat = Literal["ndjson", "csv"]
+
+EXPORT_MEDIA_TYPES: dict[ExportFormat, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+EXPORT_CHUNK_ROWS = 1000
+
+
+def export_query(exclude_completed: bool = False):
+    query = (
+        select(*TASK_ROW_COLUMNS)
+        .select_from(Task)
+        .outerjoin(Task.difficulty_record)
+        .order_by(Task.id)
+        # Reads the whole table by design, tagged for query logs and plan tests
+        .prefix_with("/* task export */")
+    )
+    return only_open(query) if exclude_completed else query
+
+
+async def stream_task_rows(
+    exclude_completed: bool = False, chunk_rows: int = EXPORT_CHUNK_ROWS
+) -> AsyncIterator[Sequence[Row]]:
+    # Own session, held only while the export is being sent
+    async with database_session.get_async_session() as session:
+        result = await session.stream(
+            export_query(exclude_completed).execution_options(yield_per=chunk_rows)
+        )
+        try:
+            async for rows in result.partitions():
+                yield rows
+        finally:
+            await result.close()
+
+
+async def export_tasks(
+    export_format: ExportFormat, exclude_completed: bool = False
+) -> AsyncIterator[bytes | str]:
+    if export_format == "csv":
+        header = True
+        async for rows in stream_task_rows(exclude_completed):
+            yield encode_task_rows_csv(rows, header=header)
+            header = False
+        if header:
+            yield encode_task_rows_csv([], header=True)
+        return
+    async for rows in stream_task_rows(exclude_completed):
+        yield encode_task_rows_ndjson(rows)
@@ -0,0 +1,333 @@
+# Bulk import of tasks, served by POST /tasks/import and
+#
+#   python -m api.utils.task_import tasks.ndjson [--format csv] [--chunk-rows 5000]
+#                                   [--no-estimate] [--pool-size 2]
+#
+# Input is NDJSON (one task object per line) or CSV with a header row, the
+# fields of CreateTaskRequest plus `is_completed`; other fields (such as those
+# of GET /tasks/export) are ignored. It is read as a stream and handled
+# `chunk_rows` rows at a time: rows are parsed and validated, then the valid
+# ones are written by one INSERT ... SELECT per chunk, the rows passed as a
+# single JSON array (SQLite) or as arrays (Postgres), in one transaction. An
+# invalid row is reported with its number and skipped, the run goes on.
+#
+# Imported tasks are journaled like any other write. Their estimates are not
+# run inline: each gets an estimation job whose `run_after` is spread out at
+# `estimator.import_estimates_per_sec`, after the jobs already scheduled, so
+# the worker scores them in the background without starving new tasks.
+
+import argparse
+import asyncio
+import codecs
+import csv
+import datetime
+import sys
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Literal
+
+import orjson
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import database_session
+from core.config import get_settings
+from models import EstimationJob, Task
+from models.task import due_epoch_us, utc_due_date
+from models.estimation_job import JOB_PENDING
+
+from .datetime import add_timezone_to_datetime, parse_date
+from .estimation_queue import notify_new_jobs
+from .task_changes import record_task_changes
+from .task_stats import Counted, apply_task_stats
+
+ImportFormat = Literal["ndjson", "csv"]
+
+IMPORT_CHUNK_ROWS = 5000
+# Errors listed in the report, the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+# Column sizes of the tasks table
+_MAX_NAME = 255
+_MAX_DESCRIPTION = 65535
+_CSV_TRUE = {"true", "1", "yes"}
+_CSV_FALSE = {"false", "0", "no", ""}
+
+
+@dataclass
+class RowError:
+    # 1-based, the CSV header row not counted
+    row: int
+    detail: str
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    imported: int = 0
+    failed: int = 0
+    errors: list[RowError] = field(default_factory=list)
+    elapsed_secs: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed_secs if self.elapsed_secs else 0.0
+
+    def add_error(self, row: int, detail: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(row, detail))
+
+
+async def _record_chunks(
+    chunks: AsyncIterable[bytes], import_format: ImportFormat, chunk_rows: int
+) -> AsyncIterator[list[str]]:
+    """Batches of up to `chunk_rows` complete records as text lines, blank
+    lines skipped. A quoted CSV field may span lines, a record ends where
+    quotes are balanced."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    batch: list[str] = []
+    record: list[str] = []
+    in_quotes = False
+
+    def take(lines: Iterable[str]) -> None:
+        nonlocal in_quotes
+        for line in lines:
+            if not in_quotes and not line.strip():
+                continue
+            if import_format == "ndjson":
+                batch.append(line)
+                continue
+            record.append(line)
+            in_quotes ^= line.count('"') % 2 == 1
+            if not in_quotes:
+                batch.append("".join(record))
+                record.clear()
+
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        # The last line may continue in the next chunk, or its "\r" be
+        # followed by a "\n" there
+        pending = lines.pop() if lines and not lines[-1].endswith("\n") else ""
+        take(lines)
+        while len(batch) >= chunk_rows:
+            yield batch[:chunk_rows]
+            del batch[:chunk_rows]
+    pending += decoder.decode(b"", final=True)
+    take([pending] if pending else [])
+    if record:
+        batch.append("".join(record))
+    if batch:
+        yield batch
+
+
+def _parse_records(
+    lines: list[str], import_format: ImportFormat, header: list[str] | None
+) -> list[dict[str, Any] | str]:
+    """Each record as a dict, or the reason it could not be read."""
+    if import_format == "csv":
+        assert header is not None
+        parsed: list[dict[str, Any] | str] = []
+        for values in csv.reader(lines):
+            if len(values) != len(header):
+                parsed.append(f"Expected {len(header)} columns, got {len(values)}")
+            else:
+                parsed.append(dict(zip(header, values)))
+        return parsed
+    parsed = []
+    for line in lines:
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            parsed.append("Invalid JSON")
+            continue
+        parsed.append(record if isinstance(record, dict) else "Expected a JSON object")
+    return parsed
+
+
+def _validate(
+    record: dict[str, Any], import_format: ImportFormat, dates: dict[str, tuple]
+) -> tuple | str:
+    """Name, description, due date (and its epoch) and completion of a task,
+    or why the record is invalid."""
+    name = record.get("name")
+    if not isinstance(name, str) or not name.strip():
+        return "name is required"
+    if len(name) > _MAX_NAME:
+        return f"name is longer than {_MAX_NAME} characters"
+
+    description = record.get("description")
+    if import_format == "csv" and description == "":
+        description = None
+    if description is not None and not isinstance(description, str):
+        return "description must be a string"
+    if description and len(description) > _MAX_DESCRIPTION:
+        return f"description is longer than {_MAX_DESCRIPTION} characters"
+
+    due = record.get("due_date") or None
+    due_date = due_epoch = None
+    if due is not None:
+        if not isinstance(due, str):
+            return "due_date must be an ISO 8601 string"
+        # Imports repeat the same dates a lot, each one is parsed once
+        if due not in dates:
+            try:
+                parsed = parse_date(due)
+            except ValueError:
+                return f"Invalid date format: {due}. Expected ISO format."
+            dates[due] = (utc_due_date(parsed), due_epoch_us(parsed))
+        due_date, due_epoch = dates[due]
+
+    is_completed = record.get("is_completed", False)
+    if import_format == "csv" and isinstance(is_completed, str):
+        if is_completed.lower() in _CSV_TRUE:
+            is_completed = True
+        elif is_completed.lower() in _CSV_FALSE:
+            is_completed = False
+    if not isinstance(is_completed, bool):
+        return "is_completed must be a boolean"
+
+    return name, description or "", due_date, due_epoch, is_completed
+
+
+_TASK_COLUMNS = [
+    Task.__table__.c[name]
+    for name in (
+        "name",
+        "description",
+        "due_date",
+        "due_epoch_us",
+        "is_completed",
+        "completed_at",
+        "create_time",
+        "update_time",
+    )
+]
+_JOB_COLUMNS = [
+    EstimationJob.__table__.c[name] for name in ("task_id", "status", "attempts", "run_after")
+]
+
+
+async def _insert_chunk(tasks: list[tuple], estimate: bool) -> list[int]:
+    now = datetime.datetime.now(datetime.UTC)
+    async with database_session.get_async_session() as session:
+        # One INSERT ... SELECT ... RETURNING per chunk with the rows in a
+        # single parameter; an executemany binds and converts every value, a
+        # few microseconds each. The ids are not in input order.
+        task_ids = list(
+            await session.scalars(
+                insert(Task.__table__)
+                .from_select(
+                    [column.name for column in _TASK_COLUMNS],
+                    database_session.rows_select(
+                        session, _TASK_COLUMNS, [(*task, now if task[4] else None, now, now) for task in tasks]
+                    ),
+                )
+                .returning(Task.__table__.c.id)
+            )
+        )
+        if estimate:
+            await _schedule_estimates(session, task_ids, now)
+        await apply_task_stats(
+            session,
+            [],
+            [Counted(task[4], task[3], None, now, now if task[4] else None) for task in tasks],
+        )
+        await record_task_changes(session, created=task_ids)
+        await session.commit()
+    return task_ids
+
+
+async def _schedule_estimates(
+    session: AsyncSession, task_ids: list[int], now: datetime.datetime
+) -> None:
+    per_sec = get_settings().estimator.import_estimates_per_sec
+    last_scheduled = await session.scalar(
+        select(func.max(EstimationJob.run_after)).where(EstimationJob.status == JOB_PENDING)
+    )
+    start = max(now, add_timezone_to_datetime(last_scheduled)) if last_scheduled else now
+    # `per_sec` jobs become due each second
+    due = [
+        start + datetime.timedelta(seconds=second + 1)
+        for second in range(int(len(task_ids) // per_sec) + 1)
+    ]
+    jobs = [
+        (task_id, JOB_PENDING, 0, due[int(i // per_sec)]) for i, task_id in enumerate(task_ids)
+    ]
+    await session.execute(
+        insert(EstimationJob.__table__).from_select(
+            [column.name for column in _JOB_COLUMNS],
+            database_session.rows_select(session, _JOB_COLUMNS, jobs),
+        )
+    )
+
+
+async def import_tasks(
+    chunks: AsyncIterable[bytes],
+    import_format: ImportFormat,
+    estimate: bool = True,
+    chunk_rows: int = IMPORT_CHUNK_ROWS,
+) -> ImportReport:
+    report = ImportReport()
+    started = time.perf_counter()
+    header: list[str] | None = None
+    dates: dict[str, tuple] = {}
+
+    async for lines in _record_chunks(chunks, import_format, chunk_rows):
+        if import_format == "csv" and header is None:
+            header = [column.strip() for column in next(csv.reader(lines[:1]))]
+            lines = lines[1:]
+            if "name" not in header:
+                report.add_error(0, "CSV header has no name column")
+                break
+        valid: list[tuple] = []
+        for record in _parse_records(lines, import_format, header):
+            report.rows += 1
+            task = record if isinstance(record, str) else _validate(record, import_format, dates)
+            if isinstance(task, str):
+                report.add_error(report.rows, task)
+            else:
+                valid.append(task)
+        if valid:
+            report.imported += len(await _insert_chunk(valid, estimate))
+        if len(dates) > 100_000:
+            dates.clear()
+
+    report.elapsed_secs = time.perf_counter() - started
+    if estimate and report.imported:
+        notify_new_jobs()
+    return report
+
+
+async def _read_file(path: Path, size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with path.open("rb") as file:
+        while chunk := file.read(size):
+            yield chunk
+
+
+async def _main(args: argparse.Namespace) -> None:
+    path = Path(args.path)
+    import_format = args.format or ("csv" if path.suffix == ".csv" else "ndjson")
+    await database_session.use_small_pool(args.pool_size)
+    report = await import_tasks(
+        _read_file(path), import_format, not args.no_estimate, args.chunk_rows
+    )
+    for error in report.errors:
+        print(f"row {error.row}: {error.detail}", file=sys.stderr)
+    print(
+        f"Imported {report.imported} of {report.rows} rows ({report.failed} failed) "
+        f"in {report.elapsed_secs:.1f}s, {report.rows_per_sec:.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import tasks from an NDJSON or CSV file")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="default: from the suffix")
+    parser.add_argument("--chunk-rows", type=int, default=IMPORT_CHUNK_ROWS)
+    parser.add_argument("--no-estimate", action="store_true", help="do not schedule estimates")
+    parser.add_argument("--pool-size", type=int, default=2)
+    asyncio.run(_main(parser.parse_args()))
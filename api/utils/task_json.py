@@ -0,0 +1,92 @@
+# Fast path of the task list: GET /tasks/ selects only the columns of
+# `TASK_ROW_COLUMNS` (each task outer-joined to its difficulty record) as
+# plain rows and encodes them straight to JSON bytes with orjson. No ORM
+# objects, no `TaskResponse` models, no response_model validation; the bytes
+# match what `create_task_response` and FastAPI would have produced.
+# GET /tasks/export streams the same rows as NDJSON or CSV, GET /tasks/search
+# adds the rank and snippet of each hit.
+#
+#   python -m api.utils.benchmark_task_list   compares it with the ORM path
+
+import csv
+import datetime
+import io
+from collections.abc import Sequence
+from typing import Any
+
+import orjson
+from sqlalchemy import Row
+
+from models import Task, TaskDifficulty
+from schemas.responses import DIFFICULTY_PENDING, DIFFICULTY_READY, TaskResponse
+
+TASK_ROW_COLUMNS = (
+    Task.id,
+    Task.name,
+    Task.description,
+    Task.due_date,
+    Task.is_completed,
+    Task.create_time,
+    Task.update_time,
+    # NOT NULL on the table, NULL here only when there is no record yet
+    TaskDifficulty.score.label("difficulty_score"),
+    TaskDifficulty.reasoning,
+    TaskDifficulty.create_time.label("difficulty_estimation_time"),
+)
+
+
+def _task_dict(row: Row) -> dict[str, Any]:
+    return {
+        "id": str(row.id),
+        "name": row.name,
+        "description": row.description,
+        "due_date": row.due_date,
+        "is_completed": row.is_completed,
+        "difficulty_score": row.difficulty_score,
+        "reasoning": row.reasoning,
+        "difficulty_estimation_time": row.difficulty_estimation_time,
+        "difficulty_status": (
+            DIFFICULTY_PENDING if row.difficulty_score is None else DIFFICULTY_READY
+        ),
+        "create_time": row.create_time,
+        "update_time": row.update_time,
+    }
+
+
+# Keys of every encoded task, in order
+TASK_FIELDS = tuple(TaskResponse.model_fields)
+
+
+def encode_task_rows(rows: Sequence[Row]) -> bytes:
+    # orjson writes datetimes as isoformat() does
+    return orjson.dumps([_task_dict(row) for row in rows])
+
+
+def encode_task_page(rows: Sequence[Row], next_cursor: str | None) -> bytes:
+    """A `TaskPageResponse`, the rows and the cursor of the next page."""
+    return orjson.dumps({"items": [_task_dict(row) for row in rows], "next_cursor": next_cursor})
+
+
+def encode_search_rows(rows: Sequence[Row]) -> bytes:
+    """Hits of `search_tasks`, tasks with their `rank` and `snippet`."""
+    return orjson.dumps(
+        [{**_task_dict(row), "rank": row.rank, "snippet": row.snippet} for row in rows]
+    )
+
+
+def encode_task_rows_ndjson(rows: Sequence[Row]) -> bytes:
+    return b"".join(orjson.dumps(_task_dict(row), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+
+def encode_task_rows_csv(rows: Sequence[Row], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(TASK_FIELDS)
+    for row in rows:
+        task = _task_dict(row)
+        writer.writerow(
+            "" if value is None else value.isoformat() if isinstance(value, datetime.datetime) else value
+            for value in task.values()
+        )
+    return buffer.getvalue()
@@ -0,0 +1,49 @@
+# Statements issued by the task endpoints, kept in one place so each of them
+# stays index-backed; tests/test_utils/test_query_plans.py EXPLAINs them all.
+# List pages are built in pagination.py on top of these helpers.
+#
+# Indexes they rely on (declared on the models, created by migrations):
+#   tasks              PK, (due_date, id), (create_time, id),
+#                      (due_date, id) WHERE is_completed = false,
+#                      (due_epoch_us, id) and the same WHERE is_completed =
+#                      false, used by task_due.py
+#   task_difficulties  UNIQUE (task_id), (task_id, score), (score, task_id)
+#   estimation_jobs    (task_id), (status, run_after)
+#   task_changes       PK, (task_id, id)
+#   tasks_fts          full-text index of tasks (models/task_search.py), used
+#                      by task_search.py
+
+from sqlalchemy import Delete, Select, delete, select
+from sqlalchemy.orm import selectinload
+
+from models import Task, TaskDifficulty
+
+
+def only_open(query: Select) -> Select:
+    # Spelled like the partial index predicate (`is_completed = false`, a
+    # literal and not a bound parameter), otherwise SQLite ignores the index
+    return query.where(Task.is_completed == False)
+
+
+def task_with_difficulty(task_id: int) -> Select:
+    return (
+        select(Task)
+        .where(Task.id == task_id)
+        .options(selectinload(Task.difficulty_record))
+    )
+
+
+def tasks_with_difficulty(task_ids: list[int]) -> Select:
+    return (
+        select(Task)
+        .where(Task.id.in_(task_ids))
+        .options(selectinload(Task.difficulty_record))
+    )
+
+
+def difficulty_of_task(task_id: int) -> Select:
+    return select(TaskDifficulty).where(TaskDifficulty.task_id == task_id)
+
+
+def delete_difficulty_of_task(task_id: int) -> Delete:
+    return delete(TaskDifficulty).where(TaskDifficulty.task_id == task_id)
@@ -0,0 +1,274 @@
+# Daily rollups behind GET /tasks/stats/timeseries: per UTC day, the tasks
+# created, the tasks completed, and a histogram of the difficulty scores of
+# the tasks completed, one `task_daily_stats` row per (day, statistic).
+#
+# Scores are integers from 0 to 100, so the histogram holds every completed
+# score exactly in at most 101 counters per day: percentiles and sums come
+# from it without reading tasks, days merge into weeks by adding counters,
+# and unlike a t-digest a task can leave it again. The rollups describe the
+# tasks as they are: a deleted task leaves its days, a reopened one its
+# completion day, a re-estimated one moves to its new score.
+#
+# The task writes move the rollups in their transaction, along with the
+# counters of task_stats.py. Writes racing on Postgres can leave a day off by
+# a few; the reconciliation of task_stats.py recounts the last days. Rollups
+# of the days before the table existed are built once, a few days per
+# transaction, resuming where a previous run stopped:
+#
+#   python -m api.utils.task_rollups backfill [--chunk-days 7] [--restart]
+
+import argparse
+import asyncio
+import datetime
+import logging
+import math
+import time
+from collections import Counter
+from typing import Literal
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import database_session
+from models import TableVersion, Task, TaskDailyStat, TaskDifficulty
+from schemas.responses import TaskTimeseriesBucket, TaskTimeseriesResponse
+
+from .datetime import add_timezone_to_datetime
+
+logger = logging.getLogger(__name__)
+
+Granularity = Literal["day", "week"]
+
+CREATED = "created"
+COMPLETED = "completed"
+_SCORE = "score_"
+PERCENTILES = (50, 90, 99)
+MAX_BUCKETS = 1000
+# table_versions rows: the day (ordinal) the backfill reached, and the last
+# reconciliation in microseconds since the epoch
+BACKFILLED_THROUGH = "task_rollups_backfilled_through"
+RECONCILED_AT = "task_rollups_reconciled_at"
+# Tasks fetched at a time while recounting
+_STREAM_ROWS = 10_000
+
+
+def utc_day(moment: datetime.datetime) -> datetime.date:
+    return add_timezone_to_datetime(moment).astimezone(datetime.UTC).date()
+
+
+def week_start(day: datetime.date) -> datetime.date:
+    # Weeks start on Monday
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def count_task(
+    counts: Counter,
+    create_time: datetime.datetime | None,
+    completed_at: datetime.datetime | None,
+    score: int | None,
+    sign: int,
+) -> None:
+    """Add (sign 1) or take away (-1) what a task adds to the rollups, keyed
+    by (day, statistic). `completed_at` is None for an open task."""
+    if create_time is not None:
+        counts[utc_day(create_time), CREATED] += sign
+    if completed_at is not None:
+        day = utc_day(completed_at)
+        counts[day, COMPLETED] += sign
+        if score is not None:
+            counts[day, f"{_SCORE}{score}"] += sign
+
+
+async def add_to_rollups(session: AsyncSession, counts: Counter) -> None:
+    """The caller commits."""
+    deltas = sorted((day, name, value) for (day, name), value in counts.items() if value)
+    if not deltas:
+        return
+    stmt = database_session.dialect_insert(session, TaskDailyStat).values(
+        [{"day": day, "name": name, "value": value} for day, name, value in deltas]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TaskDailyStat.day, TaskDailyStat.name],
+        set_={"value": TaskDailyStat.value + stmt.excluded.value, "update_time": func.now()},
+    )
+    await session.execute(stmt)
+
+
+async def _read_rollups(
+    session: AsyncSession, start: datetime.date, end: datetime.date
+) -> Counter:
+    rows = await session.execute(
+        select(TaskDailyStat.day, TaskDailyStat.name, TaskDailyStat.value).where(
+            TaskDailyStat.day >= start, TaskDailyStat.day < end
+        )
+    )
+    return Counter({(row.day, row.name): row.value for row in rows})
+
+
+def _percentile(scores: Counter, total: int, percent: int) -> int:
+    # Nearest rank
+    rank = max(math.ceil(total * percent / 100), 1)
+    seen = 0
+    for score in sorted(scores):
+        seen += scores[score]
+        if seen >= rank:
+            return score
+    raise AssertionError("rank past the histogram")
+
+
+def bucket_starts(
+    granularity: Granularity, start: datetime.date, end: datetime.date
+) -> list[datetime.date]:
+    """First days of the buckets holding the days from `start` to `end`
+    (excluded)."""
+    step = datetime.timedelta(days=7 if granularity == "week" else 1)
+    first = week_start(start) if granularity == "week" else start
+    return [first + step * i for i in range(math.ceil((end - first) / step))]
+
+
+async def read_timeseries(
+    session: AsyncSession, granularity: Granularity, start: datetime.date, end: datetime.date
+) -> TaskTimeseriesResponse:
+    """Buckets from the one holding `start` to the one holding the day before
+    `end`, whole, empty ones included."""
+    starts = bucket_starts(granularity, start, end)
+    step = datetime.timedelta(days=7 if granularity == "week" else 1)
+    counts = await _read_rollups(session, starts[0], starts[-1] + step) if starts else Counter()
+    created: Counter = Counter()
+    completed: Counter = Counter()
+    scores: dict[datetime.date, Counter] = {bucket: Counter() for bucket in starts}
+    for (day, name), value in counts.items():
+        bucket = week_start(day) if granularity == "week" else day
+        if name == CREATED:
+            created[bucket] += value
+        elif name == COMPLETED:
+            completed[bucket] += value
+        elif name.startswith(_SCORE) and value:
+            scores[bucket][int(name.removeprefix(_SCORE))] += value
+
+    buckets = []
+    for bucket in starts:
+        histogram = +scores[bucket]
+        scored = sum(histogram.values())
+        percentiles = {
+            f"difficulty_p{percent}": _percentile(histogram, scored, percent) if scored else None
+            for percent in PERCENTILES
+        }
+        buckets.append(
+            TaskTimeseriesBucket(
+                start=bucket.isoformat(),
+                created=created[bucket],
+                completed=completed[bucket],
+                scored=scored,
+                difficulty_sum=sum(score * count for score, count in histogram.items()),
+                **percentiles,
+            )
+        )
+    return TaskTimeseriesResponse(granularity=granularity, buckets=buckets)
+
+
+def _day_start(day: datetime.date) -> datetime.datetime:
+    return datetime.datetime.combine(day, datetime.time(), datetime.UTC)
+
+
+async def _recount(session: AsyncSession, start: datetime.date, end: datetime.date) -> Counter:
+    counts: Counter = Counter()
+    since, until = _day_start(start), _day_start(end)
+    created = await session.stream(
+        select(Task.create_time)
+        .where(Task.create_time >= since, Task.create_time < until)
+        .execution_options(yield_per=_STREAM_ROWS)
+    )
+    async for create_time in created.scalars():
+        count_task(counts, create_time, None, None, 1)
+    completed = await session.stream(
+        select(Task.completed_at, TaskDifficulty.score)
+        .outerjoin(Task.difficulty_record)
+        .where(Task.completed_at >= since, Task.completed_at < until, Task.is_completed)
+        .execution_options(yield_per=_STREAM_ROWS)
+    )
+    async for row in completed:
+        count_task(counts, None, row.completed_at, row.score, 1)
+    return counts
+
+
+async def reconcile_rollups(
+    start: datetime.date, end: datetime.date, progress: str = RECONCILED_AT, version: int = 0
+) -> Counter:
+    """Recount the days from `start` to `end` (excluded) from the tables in
+    one transaction and add the difference to the rollups, then set the
+    `progress` row of table_versions to `version`. Returns the drift fixed."""
+    async with database_session.get_async_session() as session:
+        if session.bind.dialect.name == "postgresql":
+            # Writers wait until the recount commits (readers do not), their
+            # changes are then either counted here or added after it
+            await session.execute(text("LOCK TABLE task_daily_stats IN SHARE ROW EXCLUSIVE MODE"))
+        # Written first: on SQLite the recount then holds the write lock
+        stmt = database_session.dialect_insert(session, TableVersion).values(
+            name=progress, version=version
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[TableVersion.name],
+                set_={"version": stmt.excluded.version, "update_time": func.now()},
+            )
+        )
+        drift = await _recount(session, start, end)
+        drift.subtract(await _read_rollups(session, start, end))
+        drift = Counter({key: value for key, value in drift.items() if value})
+        await add_to_rollups(session, drift)
+        await session.commit()
+    return drift
+
+
+async def reconcile_recent_rollups(days: int = 2) -> Counter:
+    """Recount today and the days before, the ones still being written."""
+    end = datetime.datetime.now(datetime.UTC).date() + datetime.timedelta(days=1)
+    drift = await reconcile_rollups(
+        end - datetime.timedelta(days=days), end, RECONCILED_AT, time.time_ns() // 1000
+    )
+    if drift:
+        logger.warning("Task rollups drifted, fixed: %s", dict(drift))
+    return drift
+
+
+async def backfill_rollups(chunk_days: int = 7, restart: bool = False) -> int:
+    """Build the rollups of every day up to today from the tables, `chunk_days`
+    days per transaction. Returns the number of days recounted."""
+    async with database_session.get_async_session() as session:
+        reached = None if restart else await session.scalar(
+            select(TableVersion.version).where(TableVersion.name == BACKFILLED_THROUGH)
+        )
+        if reached is None:
+            earliest = [
+                await session.scalar(select(func.min(Task.create_time))),
+                await session.scalar(select(func.min(Task.completed_at))),
+            ]
+            earliest = [utc_day(moment) for moment in earliest if moment is not None]
+            if not earliest:
+                return 0
+            day = min(earliest)
+        else:
+            day = datetime.date.fromordinal(reached)
+    end = datetime.datetime.now(datetime.UTC).date() + datetime.timedelta(days=1)
+    total = (end - day).days
+    chunk = datetime.timedelta(days=max(chunk_days, 1))
+    while day < end:
+        until = min(day + chunk, end)
+        drift = await reconcile_rollups(day, until, BACKFILLED_THROUGH, until.toordinal())
+        logger.info(
+            "Rolled up %s to %s, %s statistics changed", day, until, len(drift)
+        )
+        day = until
+    return max(total, 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m api.utils.task_rollups")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--chunk-days", type=int, default=7)
+    parser.add_argument("--restart", action="store_true", help="start again from the first day")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    days = asyncio.run(backfill_rollups(args.chunk_days, args.restart))
+    print(f"Rolled up {days} days")
@@ -0,0 +1,139 @@
+# Full-text search of GET /tasks/search, over the index of
+# models/task_search.py (FTS5 on SQLite, tsvector + GIN on Postgres).
+#
+# The query string is reduced to its words, all of which must match, the last
+# one as a prefix (search as you type); no operators are passed through. Hits
+# are ordered by relevance, then id: bm25 (negated, higher is better) on
+# SQLite, ts_rank on Postgres, a match in the name weighing more than one in
+# the description. The cursor carries the last hit's (rank, id), the next page
+# continues right after it.
+
+import base64
+import binascii
+import json
+import re
+from dataclasses import dataclass
+
+from fastapi import HTTPException, status
+from sqlalchemy import Row, and_, column, func, literal, literal_column, or_, select, table
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Task
+from models.task_search import SEARCH_CONFIG, TASK_SEARCH_VECTOR, TASKS_FTS
+
+from .task_json import TASK_ROW_COLUMNS
+from .task_queries import only_open
+
+# Around the matched words in `snippet`; the rest of the text is not escaped
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+SNIPPET_WORDS = 16
+MAX_SEARCH_TERMS = 16
+
+_WORD = re.compile(r"\w+")
+_FTS = table(TASKS_FTS, column("rowid"))
+# bm25 weights of the FTS5 columns (name, description)
+_BM25_WEIGHTS = (10.0, 1.0)
+
+
+@dataclass
+class SearchCursor:
+    # The words searched, a cursor only continues the same search
+    terms: list[str]
+    rank: float
+    last_id: int
+
+
+def search_terms(q: str) -> list[str]:
+    return _WORD.findall(q.lower())[:MAX_SEARCH_TERMS]
+
+
+def encode_search_cursor(cursor: SearchCursor) -> str:
+    raw = json.dumps([cursor.terms, cursor.rank, cursor.last_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_search_cursor_or_error(token: str, terms: list[str]) -> SearchCursor:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        cursor_terms, rank, last_id = json.loads(raw)
+        if not isinstance(rank, (int, float)) or not isinstance(last_id, int):
+            raise ValueError(rank, last_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    if cursor_terms != terms:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor was issued for another search.",
+        )
+    return SearchCursor(terms, float(rank), last_id)
+
+
+def _sqlite_query(terms: list[str]):
+    fts = literal_column(TASKS_FTS)
+    # Each word as an FTS5 string, so none of it is read as syntax
+    match = " ".join(f'"{term}"' for term in terms) + "*"
+    rank = -func.bm25(fts, *_BM25_WEIGHTS)
+    snippet = func.snippet(fts, -1, HIGHLIGHT_START, HIGHLIGHT_END, "…", SNIPPET_WORDS)
+    query = (
+        select(*TASK_ROW_COLUMNS, rank.label("rank"), snippet.label("snippet"))
+        .select_from(_FTS)
+        .join(Task, Task.id == _FTS.c.rowid)
+        .outerjoin(Task.difficulty_record)
+        .where(fts.op("MATCH")(match))
+    )
+    return query, rank
+
+
+def _postgres_query(terms: list[str]):
+    config = literal(SEARCH_CONFIG, REGCONFIG)
+    # The indexed expression, as written in the index
+    vector = literal_column(f"({TASK_SEARCH_VECTOR})")
+    tsquery = func.to_tsquery(config, " & ".join(terms) + ":*")
+    rank = func.ts_rank(vector, tsquery)
+    snippet = func.ts_headline(
+        config,
+        func.concat_ws(" ", Task.name, Task.description),
+        tsquery,
+        f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, "
+        f"MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}",
+    )
+    query = (
+        select(*TASK_ROW_COLUMNS, rank.label("rank"), snippet.label("snippet"))
+        .select_from(Task)
+        .outerjoin(Task.difficulty_record)
+        .where(vector.op("@@")(tsquery))
+    )
+    return query, rank
+
+
+async def search_tasks(
+    session: AsyncSession,
+    terms: list[str],
+    limit: int,
+    after: SearchCursor | None = None,
+    exclude_completed: bool = False,
+) -> tuple[list[Row], str | None]:
+    """One page of hits, rows of `TASK_ROW_COLUMNS` plus `rank` and
+    `snippet`, and the cursor of the next page (None on the last page)."""
+    if limit <= 0 or not terms:
+        return [], None
+    if session.bind.dialect.name == "postgresql":
+        query, rank = _postgres_query(terms)
+    else:
+        query, rank = _sqlite_query(terms)
+    if after is not None:
+        query = query.where(
+            or_(rank < after.rank, and_(rank == after.rank, Task.id > after.last_id))
+        )
+    if exclude_completed:
+        query = only_open(query)
+    # Every match is ranked before the first page is known
+    query = query.prefix_with("/* task search */").order_by(rank.desc(), Task.id)
+
+    rows = (await session.execute(query.limit(limit + 1))).all()
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_search_cursor(SearchCursor(terms, last.rank, last.id))
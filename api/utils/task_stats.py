@@ -0,0 +1,298 @@
+# Task statistics of GET /tasks/stats, read from counters instead of counted
+# over the tables: open and completed tasks, overdue tasks, and the count,
+# sum and histogram of difficulty scores.
+#
+# Every write to tasks or their difficulty records moves the counters in its
+# own transaction: read the changed tasks with `read_counted` before writing,
+# then call `update_task_stats` (or `apply_task_stats` when the new state is
+# already known) before committing. Each statistic is spread over
+# `task_stats.counter_shards` rows of `task_counters`, a transaction adds to
+# the rows of one shard picked at random, so concurrent writers seldom wait
+# on each other's row locks. Reading sums at most shards x statistics rows,
+# whatever the number of tasks.
+#
+# A task is overdue once the reminder scheduler has passed its due date: open
+# and due at or before the scheduler's watermark (reminders.py). Writes count
+# against the watermark they read, the tick moving the watermark counts the
+# reminders it fires (`count_overdue`), so the overdue count is as of the last
+# tick, `overdue_as_of`.
+#
+# The same calls move the daily rollups of task_rollups.py, which the
+# reconciliation recounts for the last days too.
+#
+# Writes racing with a tick or with each other on Postgres can leave the
+# counters off by a few, and tasks written outside the write paths are not
+# counted at all. The reconciliation job recounts from the tables every
+# `task_stats.reconcile_interval_secs` and fixes the drift:
+#
+#   python -m api.utils.task_stats reconcile
+
+import asyncio
+import datetime
+import logging
+import random
+import sys
+import time
+from collections import Counter
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import database_session
+from core.config import get_settings
+from models import TableVersion, Task, TaskCounter, TaskDifficulty
+from schemas.responses import DifficultyBucket, TaskStatsResponse
+
+from . import task_rollups
+from .reminders import Reminder, get_fired_through
+from .task_queries import only_open
+
+logger = logging.getLogger(__name__)
+
+OPEN = "open"
+COMPLETED = "completed"
+OVERDUE = "overdue"
+DIFFICULTY_COUNT = "difficulty_count"
+DIFFICULTY_SUM = "difficulty_sum"
+# Scores are 0 to 100, in buckets of ten; 100 falls in the last one
+DIFFICULTY_BUCKET_WIDTH = 10
+DIFFICULTY_BUCKETS = range(0, 100, DIFFICULTY_BUCKET_WIDTH)
+# table_versions row of the last reconciliation, in microseconds since the epoch
+RECONCILED_AT = "task_stats_reconciled_at"
+# Tasks read per statement
+_READ_CHUNK = 5000
+
+
+class Counted(NamedTuple):
+    """What a task adds to the statistics."""
+
+    is_completed: bool
+    due_epoch_us: int | None
+    score: int | None
+    create_time: datetime.datetime | None
+    # Set while completed only
+    completed_at: datetime.datetime | None
+
+
+def _bucket(score: int) -> str:
+    start = min(score // DIFFICULTY_BUCKET_WIDTH * DIFFICULTY_BUCKET_WIDTH, DIFFICULTY_BUCKETS[-1])
+    return f"difficulty_{start}"
+
+
+def _count(counts: Counter, task: Counted, overdue_through: int | None, sign: int) -> None:
+    counts[COMPLETED if task.is_completed else OPEN] += sign
+    if (
+        not task.is_completed
+        and task.due_epoch_us is not None
+        and overdue_through is not None
+        and task.due_epoch_us <= overdue_through
+    ):
+        counts[OVERDUE] += sign
+    if task.score is not None:
+        counts[DIFFICULTY_COUNT] += sign
+        counts[DIFFICULTY_SUM] += sign * task.score
+        counts[_bucket(task.score)] += sign
+
+
+async def read_counted(session: AsyncSession, task_ids: Iterable[int]) -> dict[int, Counted]:
+    task_ids = list(dict.fromkeys(task_ids))
+    counted = {}
+    for start in range(0, len(task_ids), _READ_CHUNK):
+        rows = await session.execute(
+            select(
+                Task.id,
+                Task.is_completed,
+                Task.due_epoch_us,
+                TaskDifficulty.score,
+                Task.create_time,
+                Task.completed_at,
+            )
+            .outerjoin(Task.difficulty_record)
+            .where(Task.id.in_(task_ids[start : start + _READ_CHUNK]))
+        )
+        counted.update(
+            (
+                row.id,
+                Counted(
+                    row.is_completed,
+                    row.due_epoch_us,
+                    row.score,
+                    row.create_time,
+                    row.completed_at if row.is_completed else None,
+                ),
+            )
+            for row in rows
+        )
+    return counted
+
+
+async def add_to_counters(
+    session: AsyncSession, counts: Counter, shard: int | None = None
+) -> None:
+    """Add to the counters, in one shard. The caller commits."""
+    deltas = sorted((name, value) for name, value in counts.items() if value)
+    if not deltas:
+        return
+    if shard is None:
+        shard = random.randrange(max(get_settings().task_stats.counter_shards, 1))
+    stmt = database_session.dialect_insert(session, TaskCounter).values(
+        [{"name": name, "shard": shard, "value": value} for name, value in deltas]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TaskCounter.name, TaskCounter.shard],
+        set_={"value": TaskCounter.value + stmt.excluded.value, "update_time": func.now()},
+    )
+    await session.execute(stmt)
+
+
+async def apply_task_stats(
+    session: AsyncSession, before: Iterable[Counted], after: Iterable[Counted]
+) -> None:
+    """Move the counters and the daily rollups from the tasks as they were to
+    the tasks as they are (absent when created or deleted). The caller commits."""
+    overdue_through = await get_fired_through(session)
+    counts: Counter = Counter()
+    rollups: Counter = Counter()
+    for sign, tasks in ((-1, before), (1, after)):
+        for task in tasks:
+            _count(counts, task, overdue_through, sign)
+            task_rollups.count_task(
+                rollups, task.create_time, task.completed_at, task.score, sign
+            )
+    await add_to_counters(session, counts)
+    await task_rollups.add_to_rollups(session, rollups)
+
+
+async def update_task_stats(
+    session: AsyncSession, before: dict[int, Counted], task_ids: Iterable[int]
+) -> None:
+    """`apply_task_stats` with the tasks read again once written."""
+    after = await read_counted(session, task_ids)
+    await apply_task_stats(session, before.values(), after.values())
+
+
+async def count_overdue(session: AsyncSession, reminders: list[Reminder]) -> None:
+    """Reminder handler: the tasks of the tick just became overdue."""
+    await add_to_counters(session, Counter({OVERDUE: len(reminders)}))
+
+
+async def _read_counters(session: AsyncSession) -> Counter:
+    # Every row, shards x statistics of them however many tasks there are
+    rows = await session.execute(
+        select(TaskCounter.name, func.sum(TaskCounter.value))
+        .prefix_with("/* task stats */")
+        .group_by(TaskCounter.name)
+    )
+    return Counter({name: int(value) for name, value in rows})
+
+
+def _from_micros(micros: int) -> datetime.datetime:
+    return datetime.datetime(1970, 1, 1, tzinfo=datetime.UTC) + datetime.timedelta(
+        microseconds=micros
+    )
+
+
+async def read_task_stats(session: AsyncSession) -> TaskStatsResponse:
+    counts = await _read_counters(session)
+    overdue_through = await get_fired_through(session)
+    scored = counts[DIFFICULTY_COUNT]
+    return TaskStatsResponse(
+        open=counts[OPEN],
+        completed=counts[COMPLETED],
+        overdue=counts[OVERDUE],
+        overdue_as_of=(
+            _from_micros(overdue_through).isoformat() if overdue_through is not None else None
+        ),
+        scored=scored,
+        mean_difficulty=counts[DIFFICULTY_SUM] / scored if scored else None,
+        difficulty_histogram=[
+            DifficultyBucket(
+                min_score=start,
+                max_score=(
+                    100
+                    if start == DIFFICULTY_BUCKETS[-1]
+                    else start + DIFFICULTY_BUCKET_WIDTH - 1
+                ),
+                count=counts[f"difficulty_{start}"],
+            )
+            for start in DIFFICULTY_BUCKETS
+        ],
+    )
+
+
+async def _recount(session: AsyncSession) -> Counter:
+    counts: Counter = Counter()
+    for is_completed, count in await session.execute(
+        select(Task.is_completed, func.count()).group_by(Task.is_completed)
+    ):
+        counts[COMPLETED if is_completed else OPEN] += count
+    overdue_through = await get_fired_through(session)
+    if overdue_through is not None:
+        counts[OVERDUE] = await session.scalar(
+            only_open(select(func.count()).where(Task.due_epoch_us <= overdue_through))
+        )
+    for score, count in await session.execute(
+        select(TaskDifficulty.score, func.count()).group_by(TaskDifficulty.score)
+    ):
+        counts[DIFFICULTY_COUNT] += count
+        counts[DIFFICULTY_SUM] += score * count
+        counts[_bucket(score)] += count
+    return counts
+
+
+async def reconcile_task_stats(force: bool = False) -> dict[str, int]:
+    """Recount the statistics from the tables and add the difference to the
+    counters, unless reconciled within `task_stats.reconcile_interval_secs`
+    (always with `force`). Returns the drift fixed, per counter."""
+    interval = get_settings().task_stats.reconcile_interval_secs
+    now = time.time_ns() // 1000
+    async with database_session.get_async_session() as session:
+        if session.bind.dialect.name == "postgresql":
+            # Writers wait until the recount commits (readers do not), their
+            # changes are then either counted here or added after it
+            await session.execute(text("LOCK TABLE task_counters IN SHARE ROW EXCLUSIVE MODE"))
+        reconciled_at = await session.scalar(
+            select(TableVersion.version).where(TableVersion.name == RECONCILED_AT)
+        )
+        if not force and reconciled_at is not None and now - reconciled_at < interval * 1e6:
+            return {}
+        # Written first: on SQLite the recount then holds the write lock
+        stmt = database_session.dialect_insert(session, TableVersion).values(
+            name=RECONCILED_AT, version=now
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[TableVersion.name],
+                set_={"version": stmt.excluded.version, "update_time": func.now()},
+            )
+        )
+        expected = await _recount(session)
+        current = await _read_counters(session)
+        drift = Counter(expected)
+        drift.subtract(current)
+        drift = Counter({name: value for name, value in drift.items() if value})
+        await add_to_counters(session, drift, shard=0)
+        await session.commit()
+    if drift:
+        logger.warning("Task statistics drifted, fixed: %s", dict(drift))
+    return dict(drift)
+
+
+async def run_reconcile_loop() -> None:
+    interval = get_settings().task_stats.reconcile_interval_secs
+    while True:
+        try:
+            await reconcile_task_stats()
+            await task_rollups.reconcile_recent_rollups()
+        except Exception:
+            logger.exception("Task statistics reconciliation failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "reconcile":
+        print("Usage: python -m api.utils.task_stats reconcile")
+        sys.exit(1)
+    print(f"Drift fixed: {asyncio.run(reconcile_task_stats(force=True))}")
@@ -18,6 +18,7 @@ import logging.config
 import os
 from functools import lru_cache
 from pathlib import Path
+from typing import Literal
 
 from pydantic import AnyHttpUrl, BaseModel, Field, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -35,8 +36,141 @@ class Security(BaseModel):
     backend_cors_origins: list[AnyHttpUrl] = ["http://localhost", "http://localhost:3000", "http://127.0.0.1", "http://127.0.0.1:3000"]
 
 
+class Estimator(BaseModel):
+    run_worker_in_process: bool = True
+    worker_concurrency: int = 10
+    worker_poll_interval_secs: float = 1.0
+    # Renewed every third of it while the job runs, a dead worker's jobs are
+    # reclaimed once it runs out
+    job_lease_secs: int = 120
+    job_max_attempts: int = 5
+    job_retry_backoff_secs: float = 5.0
+    cache_enabled: bool = True
+    cache_max_entries: int = 10_000
+    cache_ttl_secs: int = 24 * 3600  # 1d
+    cache_persistent_ttl_secs: int = 30 * 24 * 3600  # 30d
+    batching_enabled: bool = True
+    batch_window_ms: int = 50
+    batch_max_size: int = 10
+    # "local" answers from the offline model only, "openrouter" falls back to
+    # it (when `local_fallback`) if the API key is missing or the call fails
+    backend: Literal["openrouter", "local"] = "openrouter"
+    local_fallback: bool = True
+    local_model_path: str = "difficulty_model.npz"
+    # Estimates of imported tasks are spread out at this rate, see
+    # api/utils/task_import.py
+    import_estimates_per_sec: float = Field(5.0, gt=0)
+
+
+class OpenRouter(BaseModel):
+    base_url: str = "https://openrouter.ai/api/v1/chat/completions"
+    model: str = "openai/gpt-4o-mini"
+    http2: bool = True
+    timeout_secs: float = 30.0
+    connect_timeout_secs: float = 5.0
+    pool_max_connections: int = 20
+    pool_max_keepalive_connections: int = 10
+    keepalive_expiry_secs: float = 60.0
+    warm_up_on_startup: bool = True
+    # Estimator gateway, see api/utils/estimator_gateway.py
+    initial_concurrency: int = 4
+    min_concurrency: int = 1
+    max_concurrency: int = 16
+    rate_limit_per_sec: float = 10.0
+    rate_limit_burst: int = 20
+    max_attempts: int = 3
+    retry_base_delay_secs: float = 0.5
+    retry_max_delay_secs: float = 30.0
+    circuit_failure_threshold: int = 5
+    circuit_reset_secs: float = 30.0
+    # Hedged requests, see api/utils/hedging.py. Models tried after `model`
+    # when it is slow or fails, e.g. OPENROUTER__HEDGE_MODELS='["google/gemini-2.0-flash-001"]'
+    hedge_models: list[str] = []
+    hedge_percentile: float = 0.95
+    # Used until the primary model has `hedge_min_samples` latencies
+    hedge_initial_delay_secs: float = 5.0
+    hedge_min_delay_secs: float = 0.5
+    hedge_max_delay_secs: float = 20.0
+    hedge_min_samples: int = 20
+
+    @property
+    def models(self) -> list[str]:
+        """The primary model followed by the hedge models, without duplicates."""
+        return list(dict.fromkeys([self.model, *self.hedge_models]))
+
+
+class ChangeJournal(BaseModel):
+    # Change journal behind GET /tasks/changes, see api/utils/task_changes.py
+    max_rows: int = 100_000
+    tombstone_retention_secs: int = 30 * 24 * 3600  # 30d
+    compact_interval_secs: float = 300.0
+    max_page_size: int = 1000
+
+
+class Events(BaseModel):
+    # Push of task changes on /tasks/events, see api/utils/task_events.py
+    backend: Literal["memory", "unix"] = "memory"
+    unix_socket_dir: str = "/tmp/reminder-app-events"
+    max_pending: int = 1000
+    keepalive_secs: float = 15.0
+
+
+class Reminders(BaseModel):
+    # Reminder scheduler, see api/utils/reminders.py
+    enabled: bool = True
+    # Reminders due within the same tick fire together
+    tick_secs: float = 1.0
+    # Upcoming reminders held in memory, the rest stay in the database
+    max_loaded: int = 100_000
+
+
+class Delivery(BaseModel):
+    # Delivery of fired reminders, see api/utils/reminder_delivery.py
+    run_in_process: bool = True
+    sinks: list[Literal["inbox", "webhook", "email"]] = ["inbox"]
+    # Per sink: deliveries claimed ahead of the senders, then a batch is
+    # taken once it is full or `batch_window_ms` after its first delivery
+    queue_size: int = 1000
+    batch_window_ms: int = 100
+    poll_interval_secs: float = 1.0
+    lease_secs: int = 60
+    max_attempts: int = 8
+    retry_base_delay_secs: float = 5.0
+    retry_max_delay_secs: float = 3600.0
+    sent_retention_secs: int = 7 * 24 * 3600  # 7d
+    inbox_batch_size: int = 500
+    inbox_concurrency: int = 1
+    # Gets {"reminders": [...]} POSTed, see api/utils/reminder_sinks.py
+    webhook_url: str = ""
+    webhook_timeout_secs: float = 10.0
+    webhook_batch_size: int = 100
+    webhook_concurrency: int = 4
+    # A local relay or stand-in such as `python -m aiosmtpd -n -l localhost:1025`
+    smtp_host: str = "localhost"
+    smtp_port: int = 1025
+    smtp_timeout_secs: float = 10.0
+    email_from: str = "reminders@localhost"
+    email_to: str = ""
+    email_batch_size: int = 50
+    email_concurrency: int = 2
+
+
+class TaskStats(BaseModel):
+    # Counters behind GET /tasks/stats, see api/utils/task_stats.py
+    counter_shards: int = 16
+    # Recounts from the tables, fixing whatever drift the counters picked up
+    reconcile_interval_secs: float = 3600.0
+
+
 class Settings(BaseSettings):
     security: Security = Field(default_factory=Security)
+    estimator: Estimator = Field(default_factory=Estimator)
+    openrouter: OpenRouter = Field(default_factory=OpenRouter)
+    change_journal: ChangeJournal = Field(default_factory=ChangeJournal)
+    events: Events = Field(default_factory=Events)
+    reminders: Reminders = Field(default_factory=Reminders)
+    delivery: Delivery = Field(default_factory=Delivery)
+    task_stats: TaskStats = Field(default_factory=TaskStats)
     log_level: str = "INFO"
     sqlalchemy_database_uri: str = os.getenv("DATABASE_URL") or (
         "sqlite+aiosqlite:///tasks.db"
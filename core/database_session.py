@@ -6,6 +6,12 @@
 # https://docs.sqlalchemy.org/en/20/core/pooling.html#sqlalchemy.pool.Pool
 
 
+from collections.abc import Sequence
+from typing import Any
+
+import orjson
+from sqlalchemy import Column, Insert, Select, String, Table, bindparam, func, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.engine.url import URL
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
@@ -17,12 +23,12 @@ from sqlalchemy.ext.asyncio import (
 from core.config import get_settings
 
 
-def new_async_engine(uri: URL | str) -> AsyncEngine:
+def new_async_engine(uri: URL | str, pool_size: int = 5, max_overflow: int = 10) -> AsyncEngine:
     return create_async_engine(
         uri,
         pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=10,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
         pool_timeout=30.0,
         pool_recycle=600,
     )
@@ -34,3 +40,54 @@ _ASYNC_SESSIONMAKER = async_sessionmaker(_ASYNC_ENGINE, expire_on_commit=False)
 
 def get_async_session() -> AsyncSession:  # pragma: no cover
     return _ASYNC_SESSIONMAKER()
+
+
+async def use_small_pool(pool_size: int, max_overflow: int = 0) -> None:
+    """Rebuild the engine with a smaller pool, for CLI tools running next to the
+    live API so they cannot take the database's connections away from it."""
+    global _ASYNC_ENGINE, _ASYNC_SESSIONMAKER
+    await _ASYNC_ENGINE.dispose()
+    _ASYNC_ENGINE = new_async_engine(
+        get_settings().sqlalchemy_database_uri, pool_size=pool_size, max_overflow=max_overflow
+    )
+    _ASYNC_SESSIONMAKER = async_sessionmaker(_ASYNC_ENGINE, expire_on_commit=False)
+
+
+def dialect_insert(session: AsyncSession, table: Table | type) -> Insert:
+    """INSERT construct of the session's dialect, supports `on_conflict_do_*`
+    upserts on both SQLite and Postgres."""
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def rows_select(
+    session: AsyncSession, columns: Sequence[Column], rows: Sequence[Sequence[Any]]
+) -> Select:
+    """SELECT yielding `rows` (values of `columns`, in order), for an
+    `insert().from_select()` of thousands of rows. All values travel in a
+    single parameter instead of one bound and processed parameter each:
+    unnest of arrays on Postgres, json_each of a JSON array on SQLite."""
+    dialect = session.bind.dialect
+    values = [[row[i] for row in rows] for i in range(len(columns))]
+    if dialect.name == "postgresql":
+        arrays = [
+            bindparam(None, column_values, type_=postgresql.ARRAY(column.type))
+            for column, column_values in zip(columns, values)
+        ]
+        source = func.unnest(*arrays).table_valued(*(c.name for c in columns)).render_derived()
+        return select(*source.c)
+
+    # As the driver would get them, converted once per distinct value
+    for i, column in enumerate(columns):
+        if process := column.type.dialect_impl(dialect).bind_processor(dialect):
+            converted = {value: process(value) for value in set(values[i])}
+            values[i] = [converted[value] for value in values[i]]
+    payload = orjson.dumps(list(zip(*values))).decode()
+    source = func.json_each(bindparam(None, payload, type_=String)).table_valued("value")
+    return select(
+        *(
+            func.json_extract(source.c.value, f"$[{i}]").label(column.name)
+            for i, column in enumerate(columns)
+        )
+    )
@@ -1,16 +1,92 @@
+import asyncio
+import contextlib
+from collections.abc import AsyncGenerator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from api.api_router import api_router
+from api.utils import (
+    local_estimator,
+    openrouter,
+    reminder_delivery,
+    reminders,
+    task_changes,
+    task_events,
+    task_stats,
+)
+from api.utils.estimation_queue import EstimationWorker
 from core.config import get_settings
 
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
+    await openrouter.start_http_client()
+    await task_events.start_event_hub()
+    warm_up_task = None
+    if get_settings().openrouter.warm_up_on_startup and openrouter.OPENROUTER_API_KEY:
+        # Runs in the background so a slow upstream does not delay startup
+        warm_up_task = asyncio.create_task(openrouter.warm_up_http_client())
+
+    # Loaded off the event loop, estimates use it as soon as it is ready
+    model_load_task = asyncio.create_task(local_estimator.load_local_model_in_background())
+
+    worker, worker_task = None, None
+    if get_settings().estimator.run_worker_in_process:
+        worker = EstimationWorker()
+        worker_task = asyncio.create_task(worker.run())
+
+    compaction_task = asyncio.create_task(task_changes.run_compaction_loop())
+    reconcile_task = asyncio.create_task(task_stats.run_reconcile_loop())
+
+    reminder_task = None
+    if get_settings().reminders.enabled:
+        scheduler = reminders.get_reminder_scheduler()
+        # Fired reminders land in the delivery outbox, in the tick's transaction
+        scheduler.add_handler(reminder_delivery.enqueue_deliveries)
+        # Tasks it fires become overdue, counted in the same transaction
+        scheduler.add_handler(task_stats.count_overdue)
+        reminder_task = asyncio.create_task(scheduler.run())
+
+    delivery_task = None
+    if get_settings().delivery.run_in_process:
+        delivery_task = asyncio.create_task(reminder_delivery.get_delivery_pipeline().run())
+
+    yield
+
+    compaction_task.cancel()
+    reconcile_task.cancel()
+    if reminder_task:
+        # A tick cut short rolls back and fires again on the next start
+        reminder_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await reminder_task
+    if delivery_task:
+        # Queued deliveries are handed back to the outbox
+        delivery_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await delivery_task
+    if worker and worker_task:
+        worker.stop()
+        # Jobs still running after the grace period keep their lease and are
+        # picked up again by the next worker once it expires
+        with contextlib.suppress(TimeoutError, asyncio.CancelledError):
+            await asyncio.wait_for(worker_task, timeout=10)
+    if warm_up_task:
+        warm_up_task.cancel()
+    model_load_task.cancel()
+    await openrouter.close_http_client()
+    await task_events.close_event_hub()
+
+
 app = FastAPI(
     title="TODO App",
     version="0.1.0",
     description="https://github.com/A-Random-NOVA-Team/reminder-app",
     openapi_url="/openapi.json",
     docs_url="/",
+    lifespan=lifespan,
 )
 print(get_settings().security.backend_cors_origins)
 
@@ -24,6 +100,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 # Guards against HTTP Host Header attacks
@@ -1,3 +1,13 @@
 from .base import Base as Base
 from .task import Task as Task
 from .task_difficulty import TaskDifficulty as TaskDifficulty
+from .estimation_job import EstimationJob as EstimationJob
+from .difficulty_cache_entry import DifficultyCacheEntry as DifficultyCacheEntry
+from .table_version import TableVersion as TableVersion
+from .task_change import TaskChange as TaskChange
+from .reminder_delivery import ReminderDelivery as ReminderDelivery
+from .reminder_dead_letter import ReminderDeadLetter as ReminderDeadLetter
+from .inbox_message import InboxMessage as InboxMessage
+from .task_counter import TaskCounter as TaskCounter
+from .task_daily_stat import TaskDailyStat as TaskDailyStat
+from .task_search import is_search_object as is_search_object
@@ -0,0 +1,22 @@
+import datetime
+
+from sqlalchemy import DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class DifficultyCacheEntry(Base):
+    """Persistent tier of the difficulty cache, shared by all processes."""
+
+    __tablename__ = "difficulty_cache"
+
+    # sha256 of the normalized prompt inputs, see api/utils/difficulty_cache.py
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    score: Mapped[int] = mapped_column(Integer, nullable=False)
+    reasoning: Mapped[str | None] = mapped_column(String, nullable=True)
+    model: Mapped[str] = mapped_column(String(255), nullable=False)
+    prompt_version: Mapped[int] = mapped_column(Integer, nullable=False)
+    expires_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
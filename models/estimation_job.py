@@ -0,0 +1,43 @@
+import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class EstimationJob(Base):
+    __tablename__ = "estimation_jobs"
+    __table_args__ = (
+        # The worker claims jobs by (status, run_after), oldest first
+        Index("ix_estimation_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    task_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default=JOB_PENDING)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    # Earliest time the job may be (re)claimed, pushed forward on retry
+    run_after: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    # Lease of the worker currently holding the job; an expired lease means
+    # the worker died and the job can be claimed again
+    locked_by: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    locked_until: Mapped[datetime.datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
+
+    def __repr__(self) -> str:
+        return (
+            f"EstimationJob(id={self.id!r}, task_id={self.task_id!r}, status={self.status!r})"
+        )
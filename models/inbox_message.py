@@ -0,0 +1,24 @@
+import datetime
+
+from sqlalchemy import DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class InboxMessage(Base):
+    """In-app inbox, filled by the "inbox" reminder sink."""
+
+    __tablename__ = "inbox_messages"
+
+    # Newest first by id, see api/endpoints/inbox.py
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Of the delivery, a redelivered reminder is not added twice
+    idempotency_key: Mapped[str] = mapped_column(String(128), nullable=False, unique=True)
+    task_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    title: Mapped[str] = mapped_column(String(255), nullable=False)
+    body: Mapped[str | None] = mapped_column(String(65535), nullable=True)
+    due_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"InboxMessage(id={self.id!r}, task_id={self.task_id!r}, title={self.title!r})"
@@ -0,0 +1,25 @@
+import datetime
+
+from sqlalchemy import DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class ReminderDeadLetter(Base):
+    """Reminder deliveries given up on, out of attempts or refused by the
+    sink, kept for inspection and replay."""
+
+    __tablename__ = "reminder_dead_letters"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    idempotency_key: Mapped[str] = mapped_column(String(128), nullable=False, unique=True)
+    sink: Mapped[str] = mapped_column(String(16), nullable=False)
+    task_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    due_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    payload: Mapped[str] = mapped_column(String, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"ReminderDeadLetter(id={self.id!r}, key={self.idempotency_key!r})"
@@ -0,0 +1,50 @@
+import datetime
+
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+DELIVERY_PENDING = "pending"
+DELIVERY_SENDING = "sending"
+DELIVERY_SENT = "sent"
+
+
+class ReminderDelivery(Base):
+    """Outbox of fired reminders, one row per sink, written in the transaction
+    of the reminder tick and sent by api/utils/reminder_delivery.py."""
+
+    __tablename__ = "reminder_deliveries"
+    __table_args__ = (
+        # The dispatcher claims the rows of a sink by (status, run_after)
+        Index("ix_reminder_deliveries_sink_status_run_after", "sink", "status", "run_after"),
+    )
+
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    # "<task id>:<due date, µs since the epoch>:<sink>", one row per reminder
+    # and sink; sent along so receivers can drop a redelivery
+    idempotency_key: Mapped[str] = mapped_column(String(128), nullable=False, unique=True)
+    sink: Mapped[str] = mapped_column(String(16), nullable=False)
+    # No foreign key, the reminder fired and is delivered even if the task
+    # is deleted in the meantime
+    task_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    due_date: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    # JSON of the task as it was when the reminder fired
+    payload: Mapped[str] = mapped_column(String, nullable=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default=DELIVERY_PENDING)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Earliest time of the next attempt; while sending, when the lease of
+    # `locked_by` expires; once sent, when it was
+    run_after: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    locked_by: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
+
+    def __repr__(self) -> str:
+        return (
+            f"ReminderDelivery(id={self.id!r}, key={self.idempotency_key!r}, "
+            f"status={self.status!r})"
+        )
@@ -1,19 +1,76 @@
-from datetime import datetime
+from datetime import UTC, datetime, timedelta
 
-from sqlalchemy import Boolean, DateTime, String, create_engine, func
-from sqlalchemy.orm import Mapped, mapped_column, relationship, sessionmaker
+from sqlalchemy import BigInteger, Boolean, DateTime, Index, String, create_engine, func, text
+from sqlalchemy.orm import Mapped, mapped_column, relationship, sessionmaker, validates
 
 from .base import Base
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def utc_due_date(due_date: datetime | None) -> datetime | None:
+    """As due_date is stored: naive, in UTC. Naive values are UTC already."""
+    if due_date is None or due_date.tzinfo is None:
+        return due_date
+    return due_date.astimezone(UTC).replace(tzinfo=None)
+
+
+def due_epoch_us(due_date: datetime | None) -> int | None:
+    """Microseconds since the epoch, exact. Naive values are UTC."""
+    if due_date is None:
+        return None
+    if due_date.tzinfo is None:
+        due_date = due_date.replace(tzinfo=UTC)
+    return (due_date - _EPOCH) // timedelta(microseconds=1)
+
+
+def due_date_from_epoch_us(micros: int) -> datetime:
+    """The due_date of `due_epoch_us`, as stored: naive, in UTC."""
+    return (_EPOCH + timedelta(microseconds=micros)).replace(tzinfo=None)
+
+
+def due_values(due_date: datetime | None) -> dict:
+    """Both due columns, for the bulk writes that skip `Task`'s validator."""
+    return {"due_date": utc_due_date(due_date), "due_epoch_us": due_epoch_us(due_date)}
+
 
 # --- 2. Define the Task Model ---
 class Task(Base):
     __tablename__ = "tasks"  # The name of the table in the database
+    __table_args__ = (
+        # Keyset pagination of GET /tasks/ by (sort key, id)
+        Index("ix_tasks_due_date_id", "due_date", "id"),
+        Index("ix_tasks_create_time_id", "create_time", "id"),
+        # Open tasks by due date (exclude_completed), see api/utils/task_queries.py
+        Index(
+            "ix_tasks_open_due_date_id",
+            "due_date",
+            "id",
+            sqlite_where=text("is_completed = 0"),
+            postgresql_where=text("is_completed = false"),
+        ),
+        # Due date ranges and overdue tasks, see api/utils/task_due.py
+        Index("ix_tasks_due_epoch_us_id", "due_epoch_us", "id"),
+        Index(
+            "ix_tasks_open_due_epoch_us_id",
+            "due_epoch_us",
+            "id",
+            sqlite_where=text("is_completed = 0"),
+            postgresql_where=text("is_completed = false"),
+        ),
+        # Completions by day, see api/utils/task_rollups.py
+        Index("ix_tasks_completed_at", "completed_at"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(255))
     description: Mapped[str] = mapped_column(String(65535), nullable=True)
     due_date: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    # due_date as microseconds since the epoch, compared as a plain integer
+    # by range queries whatever the time zone of the database or the client
+    due_epoch_us: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     is_completed: Mapped[bool] = mapped_column(Boolean, default=False)
+    # When is_completed last turned true, NULL while open
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     create_time: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
@@ -28,6 +85,20 @@ class Task(Base):
         cascade="all, delete-orphan",  # Optional: Deletes difficulty when task is deleted
     )
 
+    @validates("due_date")
+    def _validate_due_date(self, key, due_date):
+        # Stored in UTC, its epoch kept in step
+        self.due_epoch_us = due_epoch_us(due_date)
+        return utc_due_date(due_date)
+
+    @validates("is_completed")
+    def _validate_is_completed(self, key, is_completed):
+        if is_completed and not self.is_completed:
+            self.completed_at = datetime.now(UTC)
+        elif not is_completed:
+            self.completed_at = None
+        return is_completed
+
     def mark_complete(self):
         self.is_completed = True
         print(f"Task '{self.name}' marked as complete.")
@@ -36,7 +107,9 @@ class Task(Base):
         self.is_completed = False
 
     def is_overdue(self):
-        return self.due_date < datetime.now() and not self.is_completed
+        if self.due_epoch_us is None or self.is_completed:
+            return False
+        return self.due_epoch_us < due_epoch_us(datetime.now(UTC))
 
     def __str__(self) -> str:
         status_icon = "[X]" if self.is_completed else "[ ]"
@@ -0,0 +1,28 @@
+from sqlalchemy import BigInteger, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+CHANGE_UPSERT = "upsert"
+CHANGE_DELETE = "delete"
+
+
+class TaskChange(Base):
+    """Append-only journal of task writes, read by GET /tasks/changes."""
+
+    __tablename__ = "task_changes"
+    __table_args__ = (
+        # Compaction keeps the newest entry per task
+        Index("ix_task_changes_task_id_id", "task_id", "id"),
+    )
+
+    # Doubles as the sync cursor, strictly increasing
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    # No foreign key, delete tombstones outlive their task
+    task_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    op: Mapped[str] = mapped_column(String(16), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"TaskChange(id={self.id!r}, task_id={self.task_id!r}, op={self.op!r})"
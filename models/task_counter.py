@@ -0,0 +1,19 @@
+from sqlalchemy import BigInteger, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class TaskCounter(Base):
+    """One shard of a task statistic, the statistic is the sum of its shards.
+    Moved by the task writes in their transaction, see api/utils/task_stats.py."""
+
+    __tablename__ = "task_counters"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Writers spread over the shards instead of all waiting on one row lock
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"TaskCounter(name={self.name!r}, shard={self.shard!r}, value={self.value!r})"
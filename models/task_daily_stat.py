@@ -0,0 +1,20 @@
+import datetime
+
+from sqlalchemy import BigInteger, Date, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class TaskDailyStat(Base):
+    """One statistic of one UTC day: tasks created, tasks completed, or
+    completed tasks of one difficulty score. See api/utils/task_rollups.py."""
+
+    __tablename__ = "task_daily_stats"
+
+    day: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    name: Mapped[str] = mapped_column(String(16), primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"TaskDailyStat(day={self.day!r}, name={self.name!r}, value={self.value!r})"
@@ -1,6 +1,6 @@
 import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
@@ -9,6 +9,12 @@ from .task import Task
 
 class TaskDifficulty(Base):
     __tablename__ = "task_difficulties"
+    __table_args__ = (
+        # GET /tasks/?sort=difficulty pages by (score, task_id)
+        Index("ix_task_difficulties_score_task_id", "score", "task_id"),
+        # Covers joins from tasks that only need the score
+        Index("ix_task_difficulties_task_id_score", "task_id", "score"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
 
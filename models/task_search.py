@@ -0,0 +1,85 @@
+# Full-text index over the text columns of tasks, outside of the mapped
+# models:
+#
+# - SQLite: FTS5 table `tasks_fts` with external content (the tasks table
+#   itself, by rowid = tasks.id), kept in sync by the triggers below;
+# - Postgres: GIN index on `TASK_SEARCH_VECTOR`, a weighted tsvector
+#   expression; queries must spell it the same way to use the index.
+#
+# `create_all` creates it along with the tasks table. Migrations spell the DDL
+# out; a migration that rebuilds the tasks table (SQLite batch mode drops its
+# triggers) or changes a text column must drop and recreate it, which also
+# reindexes every task. tests/test_utils/test_task_search.py compares the
+# migrated schema with this one.
+
+from sqlalchemy import event
+
+from .task import Task
+
+# Text columns of Task, in index column order: matches in `name` rank higher
+SEARCH_COLUMNS = ("name", "description")
+SEARCH_CONFIG = "english"
+TASKS_FTS = "tasks_fts"
+SEARCH_INDEX = "ix_tasks_search"
+
+TASK_SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', name), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')"
+)
+
+_SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE {TASKS_FTS} USING fts5(
+    name, description, content='tasks', content_rowid='id',
+    tokenize='porter unicode61 remove_diacritics 2'
+)""",
+    f"""CREATE TRIGGER {TASKS_FTS}_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO {TASKS_FTS}(rowid, name, description)
+    VALUES (new.id, new.name, new.description);
+END""",
+    f"""CREATE TRIGGER {TASKS_FTS}_delete AFTER DELETE ON tasks BEGIN
+    INSERT INTO {TASKS_FTS}({TASKS_FTS}, rowid, name, description)
+    VALUES ('delete', old.id, old.name, old.description);
+END""",
+    f"""CREATE TRIGGER {TASKS_FTS}_update AFTER UPDATE OF name, description ON tasks BEGIN
+    INSERT INTO {TASKS_FTS}({TASKS_FTS}, rowid, name, description)
+    VALUES ('delete', old.id, old.name, old.description);
+    INSERT INTO {TASKS_FTS}(rowid, name, description)
+    VALUES (new.id, new.name, new.description);
+END""",
+    # Index the tasks already there
+    f"INSERT INTO {TASKS_FTS}({TASKS_FTS}) VALUES ('rebuild')",
+]
+
+_POSTGRES_DDL = [f"CREATE INDEX {SEARCH_INDEX} ON tasks USING gin (({TASK_SEARCH_VECTOR}))"]
+
+
+def search_index_ddl(dialect_name: str) -> list[str]:
+    return _POSTGRES_DDL if dialect_name == "postgresql" else _SQLITE_DDL
+
+
+def drop_search_index_ddl(dialect_name: str) -> list[str]:
+    if dialect_name == "postgresql":
+        return [f"DROP INDEX IF EXISTS {SEARCH_INDEX}"]
+    return [
+        *(f"DROP TRIGGER IF EXISTS {TASKS_FTS}_{name}" for name in ("insert", "delete", "update")),
+        f"DROP TABLE IF EXISTS {TASKS_FTS}",
+    ]
+
+
+def is_search_object(name: str) -> bool:
+    """Tables and indexes of the search index (FTS5 creates shadow tables
+    named after its table), unknown to the models and so left out of
+    autogenerate."""
+    return name == SEARCH_INDEX or name.startswith(TASKS_FTS)
+
+
+@event.listens_for(Task.__table__, "after_create")
+def _create_search_index(target, connection, **kw) -> None:
+    for statement in search_index_ddl(connection.dialect.name):
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Task.__table__, "before_drop")
+def _drop_search_index(target, connection, **kw) -> None:
+    for statement in drop_search_index_ddl(connection.dialect.name):
+        connection.exec_driver_sql(statement)
@@ -42,5 +42,16 @@ class UpdateTaskRequest(BaseRequest):
     is_completed: bool | None = None
 
 
+class BatchUpdateTaskRequest(UpdateTaskRequest):
+    task_id: int
+
+
+class BatchTasksRequest(BaseRequest):
+    # Applied in one transaction: creates, then updates, then deletes
+    create: list[CreateTaskRequest] = []
+    update: list[BatchUpdateTaskRequest] = []
+    delete: list[int] = []
+
+
 class DeleteTaskRequest(BaseRequest):
     task_id: str
@@ -1,5 +1,10 @@
+from typing import Any, Literal
+
 from pydantic import BaseModel, ConfigDict, EmailStr
 
+DIFFICULTY_PENDING = "pending"
+DIFFICULTY_READY = "ready"
+
 
 class BaseResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -27,5 +32,142 @@ class TaskResponse(BaseResponse):
     difficulty_score: int | None = None
     reasoning: str | None = None
     difficulty_estimation_time: str | None = None
+    difficulty_status: Literal["pending", "ready"] = DIFFICULTY_READY
     create_time: str
     update_time: str
+
+
+class TaskSearchResult(TaskResponse):
+    # Relevance, higher is better; only comparable within one search
+    rank: float
+    # Best matching part of the text, matched words within <mark></mark>; the
+    # text itself is not HTML-escaped
+    snippet: str
+
+
+class TaskPageResponse(BaseResponse):
+    # GET /tasks/?envelope=true, the page and the `cursor` of the next one
+    items: list[TaskResponse]
+    next_cursor: str | None
+
+
+class TaskChangesResponse(BaseResponse):
+    # Current state of the tasks created or updated since the cursor
+    upserts: list[TaskResponse]
+    # Ids of the tasks deleted since the cursor
+    deletes: list[str]
+    # `since` of the next call
+    cursor: str
+    has_more: bool
+
+
+class BatchItemResult(BaseResponse):
+    # Position of the operation in its request array
+    index: int
+    status: Literal["created", "updated", "deleted", "not_found", "invalid"]
+    task_id: str | None = None
+    task: TaskResponse | None = None
+    detail: str | None = None
+
+
+class BatchTasksResponse(BaseResponse):
+    created: list[BatchItemResult]
+    updated: list[BatchItemResult]
+    deleted: list[BatchItemResult]
+
+
+class DifficultyBucket(BaseResponse):
+    min_score: int
+    max_score: int
+    count: int
+
+
+class TaskStatsResponse(BaseResponse):
+    open: int
+    completed: int
+    # Open tasks due at or before `overdue_as_of`, the last reminder tick
+    overdue: int
+    overdue_as_of: str | None
+    # Tasks with a difficulty score, and their mean score
+    scored: int
+    mean_difficulty: float | None
+    difficulty_histogram: list[DifficultyBucket]
+
+
+class TaskTimeseriesBucket(BaseResponse):
+    # First UTC day of the bucket, a Monday for weeks
+    start: str
+    created: int
+    completed: int
+    # Tasks completed in the bucket with a difficulty score, and their scores
+    scored: int
+    difficulty_sum: int
+    difficulty_p50: int | None
+    difficulty_p90: int | None
+    difficulty_p99: int | None
+
+
+class TaskTimeseriesResponse(BaseResponse):
+    granularity: str
+    buckets: list[TaskTimeseriesBucket]
+
+
+class ImportRowError(BaseResponse):
+    # 1-based, the CSV header row not counted
+    row: int
+    detail: str
+
+
+class TaskImportResponse(BaseResponse):
+    rows: int
+    imported: int
+    failed: int
+    # The first errors only, `failed` counts them all
+    errors: list[ImportRowError]
+    elapsed_secs: float
+    rows_per_sec: float
+
+
+class EstimatorMetricsResponse(BaseResponse):
+    cache: dict[str, int]
+    batcher: dict[str, int]
+    single_flight: dict[str, int]
+    gateway: dict[str, float | int | str]
+    # Per kind of call ("single", "batch"): hedge counters and model latencies
+    hedging: dict[str, dict[str, Any]]
+
+
+class TaskEventsMetricsResponse(BaseResponse):
+    published: int
+    delivered: int
+    subscribers: int
+    dropped_subscribers: int
+    # Gaps in the events from other processes, each resyncing every subscriber
+    resyncs: int
+
+
+class RemindersMetricsResponse(BaseResponse):
+    loaded: int
+    window_reads: int
+    reloads: int
+    ticks: int
+    fired: int
+    stale: int
+    skipped_ticks: int
+    failed_ticks: int
+    # Every reminder due until then (microseconds since the epoch) has fired
+    fired_through: int
+
+
+class DeliveryMetricsResponse(BaseResponse):
+    # Per sink: queue depth, batches, retries, dead letters, latencies
+    sinks: dict[str, dict[str, Any]]
+
+
+class InboxMessageResponse(BaseResponse):
+    id: str
+    task_id: str
+    title: str
+    body: str | None
+    due_date: str
+    create_time: str
@@ -0,0 +1,56 @@
+import contextlib
+from collections.abc import AsyncIterator, Callable
+from contextlib import AbstractAsyncContextManager
+from pathlib import Path
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from core import database_session
+from main import app
+from models import Base
+
+
+@pytest.fixture(name="temp_database")
+def fixture_temp_database(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Callable[[str], AbstractAsyncContextManager[AsyncEngine]]:
+    """Opens a new SQLite database under tmp_path with every table created,
+    used by the app until the test ends or another one is opened."""
+
+    @contextlib.asynccontextmanager
+    async def open_database(name: str) -> AsyncIterator[AsyncEngine]:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        monkeypatch.setattr(database_session, "_ASYNC_ENGINE", engine)
+        monkeypatch.setattr(
+            database_session,
+            "_ASYNC_SESSIONMAKER",
+            async_sessionmaker(engine, expire_on_commit=False),
+        )
+        yield engine
+        await engine.dispose()
+
+    return open_database
+
+
+@pytest_asyncio.fixture(name="engine")
+async def fixture_engine(temp_database) -> AsyncIterator[AsyncEngine]:
+    async with temp_database("test.db") as engine:
+        yield engine
+
+
+@pytest.fixture(name="sessionmaker")
+def fixture_sessionmaker(engine: AsyncEngine) -> async_sessionmaker:
+    return database_session._ASYNC_SESSIONMAKER
+
+
+@pytest_asyncio.fixture(name="client")
+async def fixture_client(sessionmaker: async_sessionmaker) -> AsyncIterator[httpx.AsyncClient]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+        client.sessionmaker = sessionmaker
+        yield client
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from api.utils import difficulty_batcher
+from api.utils.difficulty_batcher import DifficultyBatcher
+from api.utils.openrouter import TaskDifficultySchema
+
+
+def score(value: int) -> TaskDifficultySchema:
+    return TaskDifficultySchema(difficulty_score=value, reasoning="test")
+
+
+@pytest.fixture(name="upstream")
+def fixture_upstream(monkeypatch: pytest.MonkeyPatch) -> dict[str, list]:
+    calls: dict[str, list] = {"batch": [], "single": []}
+
+    async def fake_batch(tasks):
+        calls["batch"].append([name for name, _, _ in tasks])
+        # the item called "broken" comes back malformed
+        return [None if name == "broken" else score(len(name)) for name, _, _ in tasks]
+
+    async def fake_single(task_name, task_description, task_deadline=None):
+        calls["single"].append(task_name)
+        return score(99)
+
+    monkeypatch.setattr(difficulty_batcher, "estimate_task_difficulty_batch", fake_batch)
+    monkeypatch.setattr(difficulty_batcher, "estimate_task_difficulty_full", fake_single)
+    return calls
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrent_estimates_share_one_call(upstream: dict[str, list]) -> None:
+    batcher = DifficultyBatcher(window_secs=0.01, max_batch_size=10)
+    results = await asyncio.gather(
+        *(batcher.estimate(name, None, None) for name in ("a", "bb", "ccc"))
+    )
+
+    assert [r.difficulty_score for r in results] == [1, 2, 3]
+    assert upstream["batch"] == [["a", "bb", "ccc"]]
+    assert upstream["single"] == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_full_batch_is_sent_without_waiting_for_the_window(
+    upstream: dict[str, list],
+) -> None:
+    batcher = DifficultyBatcher(window_secs=60, max_batch_size=2)
+    results = await asyncio.wait_for(
+        asyncio.gather(batcher.estimate("a", None, None), batcher.estimate("b", None, None)),
+        timeout=1,
+    )
+
+    assert len(results) == 2
+    assert upstream["batch"] == [["a", "b"]]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_malformed_items_fall_back_to_single_calls(upstream: dict[str, list]) -> None:
+    batcher = DifficultyBatcher(window_secs=0.01, max_batch_size=10)
+    ok, broken = await asyncio.gather(
+        batcher.estimate("ok", None, None), batcher.estimate("broken", None, None)
+    )
+
+    assert ok.difficulty_score == 2
+    assert broken.difficulty_score == 99
+    assert upstream["single"] == ["broken"]
+    assert batcher.stats.fallbacks == 1
@@ -0,0 +1,74 @@
+import datetime
+
+import pytest
+from freezegun import freeze_time
+
+from api.utils.difficulty_cache import (
+    DifficultyCache,
+    deadline_bucket,
+    difficulty_cache_key,
+)
+from api.utils.openrouter import TaskDifficultySchema, default_task_difficulty
+
+
+def score(value: int) -> TaskDifficultySchema:
+    return TaskDifficultySchema(difficulty_score=value, reasoning="test")
+
+
+def test_key_ignores_case_and_whitespace() -> None:
+    a = difficulty_cache_key("  Pay   RENT", None, None, "model")
+    b = difficulty_cache_key("pay rent", "", None, "model")
+    assert a == b
+
+
+def test_key_depends_on_model_prompt_version_and_deadline_bucket() -> None:
+    base = difficulty_cache_key("Pay rent", None, None, "model")
+    assert base != difficulty_cache_key("Pay rent", None, None, "other-model")
+    assert base != difficulty_cache_key("Pay rent", None, None, "model", prompt_version=999)
+    assert base != difficulty_cache_key(
+        "Pay rent", None, datetime.timedelta(days=2), "model"
+    )
+    assert difficulty_cache_key(
+        "Pay rent", None, datetime.timedelta(hours=25), "model"
+    ) == difficulty_cache_key("Pay rent", None, datetime.timedelta(hours=70), "model")
+
+
+def test_deadline_buckets() -> None:
+    assert deadline_bucket(None) == "none"
+    assert deadline_bucket(datetime.timedelta(hours=-1)) == "overdue"
+    assert deadline_bucket(datetime.timedelta(minutes=30)) == "<1h"
+    assert deadline_bucket(datetime.timedelta(days=365)) == ">=2160h"
+
+
+def test_lru_evicts_least_recently_used() -> None:
+    cache = DifficultyCache(max_entries=2, ttl_secs=60, persistent_ttl_secs=60, persistent=False)
+    cache.put_local("a", score(1))
+    cache.put_local("b", score(2))
+    assert cache.get_local("a") is not None
+    cache.put_local("c", score(3))
+
+    assert cache.get_local("b") is None
+    assert cache.get_local("a") is not None
+    assert cache.stats.evictions == 1
+
+
+def test_entries_expire_after_ttl() -> None:
+    with freeze_time("2026-01-01 00:00:00") as frozen:
+        cache = DifficultyCache(max_entries=10, ttl_secs=60, persistent_ttl_secs=60, persistent=False)
+        cache.put_local("a", score(1))
+        frozen.tick(61)
+        assert cache.get_local("a") is None
+    assert cache.stats.expirations == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_hits_misses_and_default_scores_are_not_cached() -> None:
+    cache = DifficultyCache(max_entries=10, ttl_secs=60, persistent_ttl_secs=60, persistent=False)
+    assert await cache.get("a") is None
+    await cache.put("a", score(7), "model")
+    await cache.put("b", default_task_difficulty(), "model")
+
+    assert (await cache.get("a")).difficulty_score == 7
+    assert await cache.get("b") is None
+    assert cache.snapshot()["hits"] == 1
+    assert cache.snapshot()["misses"] == 2
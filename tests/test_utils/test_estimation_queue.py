@@ -0,0 +1,180 @@
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import insert, select, update
+
+from api.endpoints import tasks as tasks_endpoint
+from api.utils import estimation_queue, openrouter
+from api.utils.estimation_queue import (
+    EstimationWorker,
+    claim_jobs,
+    complete_job,
+    enqueue_estimation,
+)
+from api.utils.openrouter import DEFAULT_SCORE, TaskDifficultySchema, default_task_difficulty
+from core.config import get_settings
+from models import EstimationJob, Task, TaskDifficulty
+from models.estimation_job import JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_RUNNING
+
+
+@pytest.fixture(name="sessionmaker")
+def fixture_sessionmaker(sessionmaker, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(openrouter, "OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr(get_settings().estimator, "job_max_attempts", 2)
+    monkeypatch.setattr(get_settings().estimator, "job_retry_backoff_secs", 60.0)
+    return sessionmaker
+
+
+async def _enqueue(sessionmaker, count: int) -> list[int]:
+    async with sessionmaker() as session:
+        task_ids = list(
+            await session.scalars(
+                insert(Task).returning(Task.id),
+                [{"name": f"Task {i}", "description": ""} for i in range(count)],
+            )
+        )
+        await enqueue_estimation(session, task_ids)
+        await session.commit()
+    return task_ids
+
+
+async def _jobs(sessionmaker) -> list[EstimationJob]:
+    async with sessionmaker() as session:
+        return list(await session.scalars(select(EstimationJob).order_by(EstimationJob.id)))
+
+
+async def _scores(sessionmaker) -> dict[int, int]:
+    async with sessionmaker() as session:
+        rows = await session.execute(select(TaskDifficulty.task_id, TaskDifficulty.score))
+        return dict(rows.all())
+
+
+async def _make_due(sessionmaker) -> None:
+    # Skips the retry backoff
+    past = datetime.datetime.now(datetime.UTC) - datetime.timedelta(seconds=1)
+    async with sessionmaker() as session:
+        await session.execute(update(EstimationJob).values(run_after=past))
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_claims_are_exclusive_until_the_lease_expires(sessionmaker) -> None:
+    await _enqueue(sessionmaker, 3)
+    first = await claim_jobs("first", 10)
+    assert len(first) == 3
+    assert await claim_jobs("second", 10) == []
+
+    # The first worker died, its leases run out
+    past = datetime.datetime.now(datetime.UTC) - datetime.timedelta(seconds=1)
+    async with sessionmaker() as session:
+        await session.execute(update(EstimationJob).values(locked_until=past))
+        await session.commit()
+    second = await claim_jobs("second", 10)
+    assert sorted(job.job_id for job in second) == sorted(job.job_id for job in first)
+    assert {job.attempts for job in second} == {2}
+
+    difficulty = TaskDifficultySchema(difficulty_score=70)
+    assert not await complete_job(first[0], "first", difficulty)
+    assert await complete_job(second[0], "second", difficulty)
+    assert await _scores(sessionmaker) == {second[0].task_id: 70}
+    assert [job.status for job in await _jobs(sessionmaker)].count(JOB_RUNNING) == 2
+
+
+@pytest.mark.asyncio
+async def test_running_jobs_keep_their_lease(sessionmaker, monkeypatch) -> None:
+    [task_id] = await _enqueue(sessionmaker, 1)
+    monkeypatch.setattr(get_settings().estimator, "job_lease_secs", 0.3)
+
+    async def estimate(job) -> TaskDifficultySchema:
+        # Slower than the lease, e.g. retries and a Retry-After pause
+        await asyncio.sleep(1)
+        return TaskDifficultySchema(difficulty_score=58, reasoning="Slow")
+
+    monkeypatch.setattr(estimation_queue, "run_estimate_task_difficulty", estimate)
+    worker = asyncio.create_task(EstimationWorker("slow", concurrency=5).run_once())
+    for _ in range(4):
+        await asyncio.sleep(0.2)
+        assert await claim_jobs("other", 10) == []
+    assert await worker == 1
+    [job] = await _jobs(sessionmaker)
+    assert (job.status, job.attempts) == (JOB_DONE, 1)
+    assert await _scores(sessionmaker) == {task_id: 58}
+
+
+@pytest.mark.asyncio
+async def test_upstream_failures_are_retried(sessionmaker, monkeypatch) -> None:
+    [task_id] = await _enqueue(sessionmaker, 1)
+    answers = [
+        default_task_difficulty("OpenRouter is unhealthy, default score applied."),
+        TaskDifficultySchema(difficulty_score=64, reasoning="Real"),
+    ]
+
+    async def estimate(job) -> TaskDifficultySchema:
+        return answers.pop(0)
+
+    monkeypatch.setattr(estimation_queue, "run_estimate_task_difficulty", estimate)
+    worker = EstimationWorker("worker", concurrency=5)
+
+    assert await worker.run_once() == 1
+    [job] = await _jobs(sessionmaker)
+    assert job.status == JOB_PENDING
+    assert job.last_error.startswith("EstimateUnavailableError: OpenRouter is unhealthy")
+    assert job.run_after.replace(tzinfo=datetime.UTC) > datetime.datetime.now(datetime.UTC)
+    # Not saved, and waiting out its backoff
+    assert await _scores(sessionmaker) == {}
+    assert await worker.run_once() == 0
+
+    await _make_due(sessionmaker)
+    assert await worker.run_once() == 1
+    [job] = await _jobs(sessionmaker)
+    assert (job.status, job.attempts) == (JOB_DONE, 2)
+    assert await _scores(sessionmaker) == {task_id: 64}
+
+
+@pytest.mark.asyncio
+async def test_default_score_only_when_giving_up(sessionmaker, monkeypatch) -> None:
+    [task_id] = await _enqueue(sessionmaker, 1)
+
+    async def estimate(job) -> TaskDifficultySchema:
+        return default_task_difficulty("OpenRouter API failed with status 503.")
+
+    monkeypatch.setattr(estimation_queue, "run_estimate_task_difficulty", estimate)
+    worker = EstimationWorker("worker", concurrency=5)
+    for _ in range(2):
+        await _make_due(sessionmaker)
+        assert await worker.run_once() == 1
+    [job] = await _jobs(sessionmaker)
+    assert (job.status, job.attempts) == (JOB_FAILED, 2)
+    assert await _scores(sessionmaker) == {task_id: DEFAULT_SCORE}
+
+    # Nothing to retry without an API key
+    monkeypatch.setattr(openrouter, "OPENROUTER_API_KEY", None)
+    [task_id] = await _enqueue(sessionmaker, 1)
+    assert await worker.run_once() == 1
+    job = (await _jobs(sessionmaker))[-1]
+    assert (job.status, job.attempts) == (JOB_FAILED, 1)
+    assert (await _scores(sessionmaker))[task_id] == DEFAULT_SCORE
+
+
+@pytest.mark.asyncio
+async def test_streamed_default_score_keeps_the_job(client, sessionmaker, monkeypatch) -> None:
+    [task_id] = await _enqueue(sessionmaker, 1)
+    answers = [
+        default_task_difficulty("OpenRouter API failed with status 503."),
+        TaskDifficultySchema(difficulty_score=71, reasoning="Real"),
+    ]
+
+    async def stream(task):
+        yield "score", answers.pop(0)
+
+    monkeypatch.setattr(tasks_endpoint, "stream_estimate_task_difficulty", stream)
+    response = await client.get(f"/tasks/{task_id}/difficulty/stream")
+    # Still sent to the client, but neither saved nor ending the job
+    assert f'"difficulty_score":{DEFAULT_SCORE}' in response.text.replace(" ", "")
+    assert await _scores(sessionmaker) == {}
+    assert [job.status for job in await _jobs(sessionmaker)] == [JOB_PENDING]
+
+    await client.get(f"/tasks/{task_id}/difficulty/stream")
+    assert await _scores(sessionmaker) == {task_id: 71}
+    assert [job.status for job in await _jobs(sessionmaker)] == [JOB_DONE]
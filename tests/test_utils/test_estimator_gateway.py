@@ -0,0 +1,178 @@
+import asyncio
+
+import httpx
+import pytest
+from freezegun import freeze_time
+
+from api.utils.estimator_gateway import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_HALF_OPEN,
+    CIRCUIT_OPEN,
+    AdaptiveConcurrencyLimit,
+    CircuitBreaker,
+    CircuitOpenError,
+    EstimatorGateway,
+    TokenBucket,
+    UpstreamOverloadedError,
+    parse_retry_after,
+)
+
+
+def new_gateway(max_attempts: int = 3, failure_threshold: int = 5) -> EstimatorGateway:
+    return EstimatorGateway(
+        limiter=AdaptiveConcurrencyLimit(initial=4, minimum=1, maximum=8),
+        bucket=TokenBucket(rate_per_sec=1000, burst=100),
+        breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout_secs=30),
+        max_attempts=max_attempts,
+        retry_base_delay_secs=0,
+        retry_max_delay_secs=0,
+    )
+
+
+def test_parse_retry_after() -> None:
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("garbage") is None
+    with freeze_time("2026-01-01 00:00:00"):
+        assert parse_retry_after("Thu, 01 Jan 2026 00:00:10 GMT") == 10.0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_aimd_limit_grows_on_success_and_halves_on_overload() -> None:
+    limit = AdaptiveConcurrencyLimit(initial=4, minimum=1, maximum=8)
+    for _ in range(4):
+        await limit.acquire()
+        await limit.release(overloaded=False)
+    assert limit.limit == pytest.approx(5, abs=0.2)
+
+    await limit.acquire()
+    await limit.release(overloaded=True)
+    assert limit.limit == pytest.approx(2.5, abs=0.1)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_retries_overloads_and_honours_retry_after() -> None:
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(503),
+        httpx.Response(200),
+    ]
+    gateway = new_gateway()
+
+    async def send() -> httpx.Response:
+        return responses.pop(0)
+
+    response = await gateway.call(send)
+
+    assert response.status_code == 200
+    assert gateway.stats.retries == 2
+    assert gateway.breaker.state == CIRCUIT_CLOSED
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_circuit_opens_and_fails_fast() -> None:
+    gateway = new_gateway(max_attempts=1, failure_threshold=2)
+    sent = 0
+
+    async def send() -> httpx.Response:
+        nonlocal sent
+        sent += 1
+        raise httpx.ConnectTimeout("timed out")
+
+    for _ in range(2):
+        with pytest.raises(UpstreamOverloadedError):
+            await gateway.call(send)
+    assert gateway.breaker.state == CIRCUIT_OPEN
+
+    with pytest.raises(CircuitOpenError):
+        await gateway.call(send)
+    assert sent == 2
+
+
+def test_half_open_lets_one_probe_through() -> None:
+    with freeze_time("2026-01-01 00:00:00") as frozen:
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout_secs=30)
+        breaker.record_failure()
+        assert not breaker.allow()
+
+        frozen.tick(31)
+        assert breaker.allow()
+        assert breaker.state == CIRCUIT_HALF_OPEN
+        assert not breaker.allow()
+
+        breaker.record_success()
+        assert breaker.state == CIRCUIT_CLOSED
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cancelled_call_leaves_limit_and_circuit_alone() -> None:
+    gateway = new_gateway()
+    started = asyncio.Event()
+
+    async def send() -> httpx.Response:
+        started.set()
+        await asyncio.sleep(5)
+        return httpx.Response(200)
+
+    call = asyncio.create_task(gateway.call(send))
+    await started.wait()
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+
+    assert gateway.limiter.limit == 4
+    assert gateway.limiter.in_flight == 0
+    assert gateway.breaker.state == CIRCUIT_CLOSED
+    assert gateway.breaker.consecutive_failures == 0
+
+
+def _open_breaker(gateway: EstimatorGateway) -> None:
+    # Half-open again on the next call
+    gateway.breaker.reset_timeout_secs = 0
+    gateway.breaker.failure_threshold = 1
+    gateway.breaker.record_failure()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize("waiting_on", ["bucket", "limiter"])
+async def test_cancelled_probe_is_handed_back(waiting_on: str) -> None:
+    gateway = new_gateway()
+    _open_breaker(gateway)
+    if waiting_on == "bucket":
+        gateway.bucket.pause(60)
+    else:
+        gateway.limiter.in_flight = 4
+
+    async def send() -> httpx.Response:
+        return httpx.Response(200)
+
+    call = asyncio.create_task(gateway.call(send))
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert not call.done()
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+
+    gateway.bucket.paused_until = 0.0
+    gateway.limiter.in_flight = 0
+    assert (await gateway.call(send)).status_code == 200
+    assert gateway.breaker.state == CIRCUIT_CLOSED
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_probe_is_handed_back_on_unexpected_errors() -> None:
+    gateway = new_gateway()
+    _open_breaker(gateway)
+
+    async def broken() -> httpx.Response:
+        raise ValueError("Bad request body")
+
+    with pytest.raises(ValueError):
+        await gateway.call(broken)
+
+    async def send() -> httpx.Response:
+        return httpx.Response(200)
+
+    assert (await gateway.call(send)).status_code == 200
+    assert gateway.breaker.state == CIRCUIT_CLOSED
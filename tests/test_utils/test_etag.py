@@ -0,0 +1,30 @@
+from starlette.requests import Request
+
+from api.utils.etag import etag_matches, make_etag, request_etag
+
+
+def get_request(path: str, query: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(), "headers": []})
+
+
+def test_etag_is_strong_and_stable() -> None:
+    etag = make_etag("/tasks/", 7)
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == make_etag("/tasks/", 7)
+    assert etag != make_etag("/tasks/", 8)
+
+
+def test_request_etag_ignores_query_parameter_order() -> None:
+    first = request_etag(get_request("/tasks/", "limit=5&sort=due_date"), 3)
+    assert first == request_etag(get_request("/tasks/", "sort=due_date&limit=5"), 3)
+    assert first != request_etag(get_request("/tasks/", "sort=due_date&limit=6"), 3)
+    assert first != request_etag(get_request("/tasks/1", "limit=5&sort=due_date"), 3)
+
+
+def test_if_none_match() -> None:
+    etag = make_etag("/tasks/", 1)
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
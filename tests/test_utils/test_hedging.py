@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from api.utils.hedging import HedgedCall, LatencyHistogram
+
+
+def new_hedged_call(models: list[str], initial_delay_secs: float = 0.05) -> HedgedCall:
+    return HedgedCall(
+        models=models,
+        percentile=0.9,
+        initial_delay_secs=initial_delay_secs,
+        min_delay_secs=0.01,
+        max_delay_secs=10,
+        min_samples=5,
+    )
+
+
+def test_histogram_percentile() -> None:
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.5) is None
+    for _ in range(9):
+        histogram.observe(0.1)
+    histogram.observe(3.0)
+    assert histogram.percentile(0.5) == pytest.approx(0.113)
+    assert histogram.percentile(0.99) == pytest.approx(4.325)
+
+
+def test_histogram_halves_old_samples() -> None:
+    histogram = LatencyHistogram(max_samples=10)
+    for _ in range(10):
+        histogram.observe(0.1)
+    assert histogram.total == 5
+    assert histogram.observed == 10
+
+
+def test_hedge_delay_follows_primary_latencies() -> None:
+    hedged = new_hedged_call(["a", "b"], initial_delay_secs=2)
+    assert hedged.hedge_delay() == 2
+    for _ in range(5):
+        hedged.histograms["a"].observe(0.3)
+    assert hedged.hedge_delay() == pytest.approx(0.38)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_fast_primary_does_not_hedge() -> None:
+    hedged = new_hedged_call(["a", "b"])
+    calls: list[str] = []
+
+    async def call(model: str) -> str:
+        calls.append(model)
+        return model
+
+    assert await hedged.run(call, bool) == "a"
+    assert calls == ["a"]
+    assert hedged.stats.hedges_fired == 0
+    assert hedged.histograms["a"].observed == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_slow_primary_is_hedged_and_cancelled() -> None:
+    hedged = new_hedged_call(["a", "b"])
+    cancelled: list[str] = []
+
+    async def call(model: str) -> str:
+        try:
+            await asyncio.sleep(5 if model == "a" else 0)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return model
+
+    assert await hedged.run(call, bool) == "b"
+    await asyncio.sleep(0)
+    assert cancelled == ["a"]
+    assert hedged.stats.hedges_fired == 1
+    assert hedged.stats.hedge_wins == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_failed_primary_hedges_immediately() -> None:
+    hedged = new_hedged_call(["a", "b"], initial_delay_secs=10)
+
+    async def call(model: str) -> str:
+        return "" if model == "a" else model
+
+    assert await asyncio.wait_for(hedged.run(call, bool), timeout=1) == "b"
+    # failures are not latency samples
+    assert hedged.histograms["a"].observed == 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_all_failed_returns_primary_result() -> None:
+    hedged = new_hedged_call(["a", "b"])
+
+    async def call(model: str) -> tuple[str, bool]:
+        return model, False
+
+    assert await hedged.run(call, lambda result: result[1]) == ("a", False)
+    assert hedged.stats.all_failed == 1
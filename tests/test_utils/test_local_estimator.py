@@ -0,0 +1,157 @@
+import datetime
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sqlalchemy import delete, insert
+
+from api.utils.local_estimator import (
+    ARTIFACT_VERSION,
+    LOCAL_REASONING_PREFIX,
+    N_FEATURES,
+    LocalDifficultyModel,
+    featurize,
+    retrain,
+)
+from api.utils.openrouter import TaskDifficultySchema
+from api.utils.reestimate_all import upsert_task_difficulties
+from core.config import get_settings
+from models import Task, TaskDifficulty
+
+EASY = [("take out the trash", None), ("water the plants", ""), ("buy milk", "at the store")]
+HARD = [
+    ("write thesis", "100 page dissertation on compilers"),
+    ("prepare tax audit", "collect five years of receipts and statements"),
+    ("learn japanese", "pass the JLPT N1 exam"),
+]
+
+
+def trained_model() -> LocalDifficultyModel:
+    rows = [(name, desc, None) for name, desc in EASY + HARD]
+    model = LocalDifficultyModel.empty()
+    model.fit_more(featurize(rows), np.array([5.0] * len(EASY) + [90.0] * len(HARD)))
+    model.solve()
+    return model
+
+
+def test_features_are_deterministic_and_normalized() -> None:
+    rows = [("Pay rent", "monthly", datetime.timedelta(days=3)), ("Pay rent", "monthly", None)]
+    first, second = featurize(rows), featurize(rows)
+
+    assert first.shape == (2, N_FEATURES)
+    assert np.array_equal(first, second)
+    assert np.isclose(np.linalg.norm(first[0, : N_FEATURES - 4]), 1.0)
+    assert first[0, -3] == 1.0 and first[1, -3] == 0.0
+
+
+def test_model_separates_easy_and_hard_tasks() -> None:
+    model = trained_model()
+    easy = model.predict("take out the trash", None, None)
+    hard = model.predict("write thesis", "100 page dissertation on compilers", None)
+
+    assert easy.difficulty_score < hard.difficulty_score
+    assert 1 <= easy.difficulty_score <= 100
+    assert easy.reasoning.startswith(LOCAL_REASONING_PREFIX)
+
+
+def test_incremental_fit_matches_full_fit() -> None:
+    rows = [(name, desc, None) for name, desc in EASY + HARD]
+    scores = np.array([5.0] * len(EASY) + [90.0] * len(HARD))
+    incremental = LocalDifficultyModel.empty()
+    incremental.fit_more(featurize(rows[:2]), scores[:2])
+    incremental.fit_more(featurize(rows[2:]), scores[2:])
+    incremental.solve()
+
+    assert np.allclose(incremental.weights, trained_model().weights)
+
+
+def test_artifact_round_trip(tmp_path: Path) -> None:
+    model = trained_model()
+    model.trained_until = datetime.datetime(2026, 1, 1, 12, 0)
+    path = tmp_path / "model.npz"
+    model.save(path)
+    loaded = LocalDifficultyModel.load(path)
+
+    assert loaded.n_rows == model.n_rows
+    assert loaded.trained_until == model.trained_until
+    assert np.array_equal(loaded.weights, model.weights)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("trained_until", ["", "2026-01-01T12:00:00"])
+async def test_retrain_replaces_legacy_artifacts(
+    sessionmaker, tmp_path, monkeypatch, trained_until
+) -> None:
+    async with sessionmaker() as session:
+        ids = list(
+            await session.scalars(
+                insert(Task).returning(Task.id, sort_by_parameter_order=True),
+                [{"name": name, "description": desc} for name, desc in EASY + HARD],
+            )
+        )
+        difficulties = {
+            task_id: TaskDifficultySchema(difficulty_score=score)
+            for task_id, score in zip(ids, [5, 5, 5, 90, 90, 90], strict=True)
+        }
+        await upsert_task_difficulties(session, difficulties)
+        await session.commit()
+    path = tmp_path / "m.npz"
+    monkeypatch.setattr(get_settings().estimator, "local_model_path", str(path))
+    # As written before `folded_rows` existed, trained on an empty table or not
+    legacy = trained_model()
+    np.savez(
+        path,
+        version=ARTIFACT_VERSION,
+        weights=legacy.weights,
+        xtx=legacy.xtx,
+        xty=legacy.xty,
+        n_rows=legacy.n_rows,
+        trained_until=trained_until,
+    )
+    assert LocalDifficultyModel.load(path).folded_rows is None
+
+    model = await retrain()
+    assert (model.n_rows, model.folded_rows) == (6, 6)
+    assert LocalDifficultyModel.load(path).folded_rows == 6
+
+
+@pytest.mark.asyncio
+async def test_retrain_starts_over_when_scores_change(
+    sessionmaker, tmp_path: Path, monkeypatch
+) -> None:
+    monkeypatch.setattr(get_settings().estimator, "local_model_path", str(tmp_path / "m.npz"))
+
+    async def score(scores: dict[int, int]) -> None:
+        async with sessionmaker() as session:
+            difficulties = {
+                task_id: TaskDifficultySchema(difficulty_score=value)
+                for task_id, value in scores.items()
+            }
+            await upsert_task_difficulties(session, difficulties)
+            await session.commit()
+
+    async with sessionmaker() as session:
+        ids = list(
+            await session.scalars(
+                insert(Task).returning(Task.id, sort_by_parameter_order=True),
+                [{"name": name, "description": desc} for name, desc in EASY + HARD],
+            )
+        )
+        await session.commit()
+    await score(dict(zip(ids[:4], [5, 5, 5, 90])))
+    assert (await retrain()).n_rows == 4
+
+    # New rows only are folded in
+    await score({ids[4]: 90})
+    assert (await retrain()).n_rows == 5
+
+    # Re-estimated in place, then deleted: counted once, then not at all
+    await score(dict(zip(ids, [5, 5, 5, 90, 90, 90])))
+    model = await retrain()
+    assert model.n_rows == 6
+    async with sessionmaker() as session:
+        await session.execute(delete(TaskDifficulty).where(TaskDifficulty.task_id == ids[0]))
+        await session.commit()
+    model = await retrain()
+    assert model.n_rows == 5
+    assert np.allclose(model.weights, (await retrain(full=True)).weights)
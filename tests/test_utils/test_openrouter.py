@@ -0,0 +1,125 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from api.utils import estimator_gateway, hedging, openrouter
+from api.utils.estimator_gateway import (
+    AdaptiveConcurrencyLimit,
+    CircuitBreaker,
+    EstimatorGateway,
+    TokenBucket,
+)
+
+
+def completion(content: dict) -> httpx.Response:
+    return httpx.Response(
+        200, json={"choices": [{"message": {"content": json.dumps(content)}}]}
+    )
+
+
+@pytest.fixture(name="api_key")
+def fixture_api_key(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(openrouter, "OPENROUTER_API_KEY", "sk-test")
+    # fresh gateway without retries, circuit state must not leak between tests
+    monkeypatch.setattr(
+        estimator_gateway,
+        "_ESTIMATOR_GATEWAY",
+        EstimatorGateway(
+            limiter=AdaptiveConcurrencyLimit(initial=4, minimum=1, maximum=4),
+            bucket=TokenBucket(rate_per_sec=1000, burst=100),
+            breaker=CircuitBreaker(failure_threshold=100, reset_timeout_secs=1),
+            max_attempts=1,
+            retry_base_delay_secs=0,
+            retry_max_delay_secs=0,
+        ),
+    )
+    monkeypatch.setattr(hedging, "_HEDGED_CALLS", {})
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_estimates_reuse_the_shared_client(api_key: None) -> None:
+    seen_clients = set()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return completion({"difficulty_score": 42, "reasoning": "ok"})
+
+    client = await openrouter.start_http_client(httpx.MockTransport(handler))
+    try:
+        for _ in range(3):
+            result = await openrouter.estimate_task_difficulty_full("Pay rent", "")
+            seen_clients.add(id(openrouter.get_http_client()))
+            assert result.difficulty_score == 42
+        assert seen_clients == {id(client)}
+    finally:
+        await openrouter.close_http_client()
+    assert client.is_closed
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_upstream_error_returns_default_score(api_key: None) -> None:
+    await openrouter.start_http_client(
+        httpx.MockTransport(lambda request: httpx.Response(503))
+    )
+    try:
+        result = await openrouter.estimate_task_difficulty_full("Pay rent", "")
+    finally:
+        await openrouter.close_http_client()
+
+    assert result.difficulty_score == openrouter.DEFAULT_SCORE
+    assert result.reasoning == "OpenRouter API failed with status 503."
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_stream_yields_tokens_then_validated_score(api_key: None) -> None:
+    pieces = ['{"difficulty_score": 6', '4, "reasoning": "long"}']
+    body = ": keep-alive\n\n"
+    body += "".join(
+        f"data: {json.dumps({'choices': [{'delta': {'content': piece}}]})}\n\n"
+        for piece in pieces
+    )
+    body += "data: [DONE]\n\n"
+
+    await openrouter.start_http_client(
+        httpx.MockTransport(lambda request: httpx.Response(200, text=body))
+    )
+    try:
+        chunks = [
+            chunk async for chunk in openrouter.stream_task_difficulty("Write thesis", "")
+        ]
+    finally:
+        await openrouter.close_http_client()
+
+    assert chunks[:-1] == [("token", piece) for piece in pieces]
+    kind, score = chunks[-1]
+    assert kind == "score"
+    assert score.difficulty_score == 64
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_slow_primary_model_is_hedged(
+    api_key: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(openrouter, "get_hedged_call", lambda kind: hedging.HedgedCall(
+        models=["slow/model", "fast/model"],
+        percentile=0.95,
+        initial_delay_secs=0.05,
+        min_delay_secs=0.01,
+        max_delay_secs=1,
+        min_samples=20,
+    ))
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        if model == "slow/model":
+            await asyncio.sleep(5)
+        return completion({"difficulty_score": 64, "reasoning": model})
+
+    await openrouter.start_http_client(httpx.MockTransport(handler))
+    try:
+        result = await openrouter.estimate_task_difficulty_full("Write thesis", "Chapter 3")
+    finally:
+        await openrouter.close_http_client()
+
+    assert result.reasoning == "fast/model"
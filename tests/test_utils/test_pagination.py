@@ -0,0 +1,122 @@
+import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from api.utils.pagination import Cursor, decode_cursor_or_error, encode_cursor, fetch_task_page
+from models import Task, TaskDifficulty
+from models.task import due_values
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        Cursor("id", "asc", 41, 41),
+        Cursor("due_date", "desc", datetime.datetime(2026, 1, 2, 3, 4, 5, 6), 7),
+        Cursor("due_date", "asc", None, 12),
+        Cursor("difficulty", "asc", 55, 3),
+    ],
+)
+def test_cursor_round_trip(cursor: Cursor) -> None:
+    token = encode_cursor(cursor)
+    assert "=" not in token
+    assert decode_cursor_or_error(token, cursor.sort, cursor.order) == cursor
+
+
+@pytest.mark.parametrize("token", ["garbage", "", encode_cursor(Cursor("id", "asc", 1, 1))[:-3]])
+def test_invalid_cursor_is_rejected(token: str) -> None:
+    with pytest.raises(HTTPException) as error:
+        decode_cursor_or_error(token, "id", "asc")
+    assert error.value.status_code == 400
+
+
+def test_cursor_is_bound_to_its_sort_order() -> None:
+    token = encode_cursor(Cursor("create_time", "asc", datetime.datetime(2026, 1, 1), 1))
+    with pytest.raises(HTTPException) as error:
+        decode_cursor_or_error(token, "create_time", "desc")
+    assert "sort=create_time&order=asc" in error.value.detail
+
+
+async def _sqlite_steps(session, query) -> int:
+    """SQLite virtual machine instructions `query(session)` runs."""
+    connection = (await (await session.connection()).get_raw_connection()).driver_connection
+    steps = 0
+
+    def count() -> int:
+        nonlocal steps
+        steps += 1
+        return 0
+
+    await connection.set_progress_handler(count, 1)
+    try:
+        await query(session)
+    finally:
+        await connection.set_progress_handler(None, 1)
+    return steps
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort", ["id", "due_date", "create_time", "difficulty"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+async def test_deep_pages_cost_the_same_as_the_first(client, sort, order) -> None:
+    start = datetime.datetime(2026, 1, 1)
+    async with client.sessionmaker() as session:
+        task_ids = list(
+            await session.scalars(
+                insert(Task).returning(Task.id),
+                [
+                    {
+                        "name": f"Task {i}",
+                        "create_time": start + datetime.timedelta(seconds=i),
+                        **due_values(start + datetime.timedelta(minutes=i % 500)),
+                    }
+                    for i in range(3000)
+                ],
+            )
+        )
+        await session.execute(
+            insert(TaskDifficulty),
+            [{"task_id": task_id, "score": task_id % 100} for task_id in task_ids],
+        )
+        await session.commit()
+
+        # The legacy offset path hands out the cursor of a deep page
+        _, token = await fetch_task_page(session, sort, order, 1, skip=2900)
+        deep = decode_cursor_or_error(token, sort, order)
+
+        async def page(after=None, skip=0):
+            return await fetch_task_page(session, sort, order, 20, after=after, skip=skip)
+
+        first_steps = await _sqlite_steps(session, lambda _: page())
+        deep_steps = await _sqlite_steps(session, lambda _: page(after=deep))
+        offset_steps = await _sqlite_steps(session, lambda _: page(skip=2900))
+    assert deep_steps < first_steps * 2
+    # The measure does see rows read and thrown away
+    assert offset_steps > first_steps * 20
+
+
+@pytest.mark.asyncio
+async def test_cursor_is_stable_across_inserts(client) -> None:
+    for day in range(1, 11):
+        await client.post("/tasks/", json={"name": f"Day {day}", "due_date": f"2026-11-{day:02d}"})
+    params = {"sort": "due_date", "limit": 4, "envelope": True}
+    response = await client.get("/tasks/", params=params)
+    page = response.json()
+    assert [task["name"] for task in page["items"]] == ["Day 1", "Day 2", "Day 3", "Day 4"]
+    assert page["next_cursor"] == response.headers["X-Next-Cursor"]
+
+    # Before the cursor, and between the rows of the next page
+    await client.post("/tasks/", json={"name": "Early", "due_date": "2026-10-01"})
+    await client.post("/tasks/", json={"name": "Day 5.5", "due_date": "2026-11-05T12:00:00"})
+    names = []
+    while page["next_cursor"]:
+        response = await client.get("/tasks/", params={**params, "cursor": page["next_cursor"]})
+        page = response.json()
+        names.extend(task["name"] for task in page["items"])
+    assert names == ["Day 5", "Day 5.5", "Day 6", "Day 7", "Day 8", "Day 9", "Day 10"]
+    assert page["next_cursor"] is None
+
+    # Without the envelope the body is the bare list
+    response = await client.get("/tasks/", params={"sort": "due_date", "limit": 2})
+    assert [task["name"] for task in response.json()] == ["Early", "Day 1"]
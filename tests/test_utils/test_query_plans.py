@@ -0,0 +1,217 @@
+# Runs the task endpoints against a scratch database, records every statement
+# they execute and EXPLAINs each one, failing on full table scans.
+#
+# SQLite always runs. Postgres runs when TEST_POSTGRES_URL is set (an asyncpg
+# URL); plans there are taken with enable_seqscan=off, so a "Seq Scan" means
+# no index can serve the query at all.
+
+import os
+import re
+from collections.abc import AsyncIterator, Callable
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from core import database_session
+from main import app
+from models import Base
+
+# The legacy `skip` path counts the rows it skipped once it runs past them;
+# offsets already read every skipped row, the count is an index-only scan.
+# The export reads every task by design. Search hits are ranked before the
+# first page is known, SQLite sorts the matches of the FTS5 table. The task
+# statistics sum the counter rows, a fixed number of them.
+_ALLOWED_FULL_SCANS = (
+    re.compile(r"^SELECT count\(\*\) AS count_1 \nFROM \(SELECT"),
+    re.compile(r"^SELECT /\* task export \*/"),
+    re.compile(r"^SELECT /\* task stats \*/"),
+)
+_ALLOWED_SQLITE_SORTS = (re.compile(r"^SELECT /\* task search \*/"),)
+
+Statement = tuple[str, tuple]
+
+
+async def _exercise_endpoints(client: httpx.AsyncClient) -> None:
+    ids = []
+    for i in range(30):
+        payload = {"name": f"Task {i}", "description": "Something to do"}
+        if i % 3:
+            payload["due_date"] = f"2026-11-{i % 28 + 1:02d}T12:00:00"
+        response = await client.post("/tasks/", json=payload)
+        ids.append(response.json()["id"])
+    for task_id in ids[::4]:
+        await client.put(f"/tasks/{task_id}", json={"is_completed": True})
+
+    for sort in ("id", "due_date", "create_time", "difficulty"):
+        for order in ("asc", "desc"):
+            for exclude_completed in (False, True):
+                params = {"sort": sort, "order": order, "limit": 7}
+                params["exclude_completed"] = exclude_completed
+                while True:
+                    response = await client.get("/tasks/", params=params)
+                    assert response.status_code == 200
+                    if "X-Next-Cursor" not in response.headers:
+                        break
+                    params["cursor"] = response.headers["X-Next-Cursor"]
+                await client.get("/tasks/", params={"sort": sort, "order": order, "skip": 5})
+                await client.get("/tasks/", params={"sort": sort, "order": order, "skip": 28})
+
+    await client.get(f"/tasks/{ids[1]}")
+    await client.put(f"/tasks/{ids[1]}", json={"name": "Renamed", "difficulty_reestimate": True})
+    async with client.stream("GET", f"/tasks/{ids[2]}/difficulty/stream") as response:
+        await response.aread()
+    await client.delete(f"/tasks/{ids[3]}")
+    response = await client.post(
+        "/tasks/batch",
+        json={
+            "create": [{"name": "Batch task", "due_date": "2026-12-01T09:00:00"}] * 3,
+            "update": [
+                {"task_id": ids[4], "name": "Batch renamed"},
+                {"task_id": ids[5], "difficulty_reestimate": True},
+            ],
+            "delete": [ids[6], ids[7]],
+        },
+    )
+    assert response.status_code == 200
+
+    response = await client.post(
+        "/tasks/import", content=b'{"name": "Imported"}\n{"name": "Due", "due_date": "2026-12-02"}'
+    )
+    assert response.json()["imported"] == 2
+
+    for export_format in ("ndjson", "csv"):
+        response = await client.get("/tasks/export", params={"format": export_format})
+        assert response.status_code == 200
+
+    params = {"q": "task", "limit": 4}
+    while True:
+        response = await client.get("/tasks/search", params=params)
+        assert response.status_code == 200
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    await client.get("/tasks/search", params={"q": "batch ren", "exclude_completed": True})
+
+    for exclude_completed in (False, True):
+        params = {"from": "2026-11-05", "to": "2026-11-20", "limit": 3}
+        params["exclude_completed"] = exclude_completed
+        while True:
+            response = await client.get("/tasks/due", params=params)
+            assert response.status_code == 200
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+    assert (await client.get("/tasks/stats")).status_code == 200
+    for granularity in ("day", "week"):
+        params = {"granularity": granularity}
+        assert (await client.get("/tasks/stats/timeseries", params=params)).status_code == 200
+    response = await client.get("/tasks/overdue", params={"limit": 3})
+    await client.get("/tasks/overdue", params={"cursor": response.headers.get("X-Next-Cursor")})
+
+    response = await client.get("/tasks/changes", params={"since": "0", "limit": 10})
+    await client.get("/tasks/changes", params={"since": response.json()["cursor"]})
+
+
+async def _record_statements(engine: AsyncEngine) -> list[Statement]:
+    statements: list[Statement] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            # Bulk UPDATEs by primary key run as executemany, one set is enough
+            if executemany:
+                parameters = parameters[0]
+            statements.append((statement, tuple(parameters or ())))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            await _exercise_endpoints(client)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    return list(dict.fromkeys(statements))
+
+
+@pytest_asyncio.fixture(name="use_engine", loop_scope="session")
+async def fixture_use_engine(
+    monkeypatch: pytest.MonkeyPatch,
+) -> AsyncIterator[Callable[[AsyncEngine], None]]:
+    def use(engine: AsyncEngine) -> None:
+        monkeypatch.setattr(database_session, "_ASYNC_ENGINE", engine)
+        monkeypatch.setattr(
+            database_session,
+            "_ASYNC_SESSIONMAKER",
+            async_sessionmaker(engine, expire_on_commit=False),
+        )
+
+    yield use
+
+
+def _sqlite_full_scans(statement: str, plan: list[str]) -> list[str]:
+    # An ordered walk stopped by LIMIT shows as SCAN too, it is only a full
+    # scan when nothing bounds it or the rows have to be sorted first. A
+    # full-text MATCH shows as a SCAN of the virtual table using its index.
+    sorts = not any(allowed.match(statement) for allowed in _ALLOWED_SQLITE_SORTS)
+    bounded = "LIMIT" in statement and not any("TEMP B-TREE FOR ORDER BY" in line for line in plan)
+    return [
+        line
+        for line in plan
+        if ("TEMP B-TREE FOR ORDER BY" in line and sorts)
+        or (line.startswith("SCAN ") and not bounded and "VIRTUAL TABLE INDEX" not in line)
+    ]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_sqlite_endpoint_queries_use_indexes(engine) -> None:
+    statements = await _record_statements(engine)
+    assert len(statements) > 20
+
+    offenders = []
+    async with engine.connect() as conn:
+        for statement, parameters in statements:
+            if any(allowed.match(statement) for allowed in _ALLOWED_FULL_SCANS):
+                continue
+            result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plan = [row[3] for row in result]
+            if scans := _sqlite_full_scans(statement, plan):
+                offenders.append(f"{statement}\n  -> {scans}")
+    assert not offenders, "\n\n".join(offenders)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+async def test_postgres_endpoint_queries_use_indexes(use_engine) -> None:
+    schema = "query_plans"
+    admin = create_async_engine(os.environ["TEST_POSTGRES_URL"])
+    async with admin.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+    await admin.dispose()
+
+    engine = create_async_engine(
+        os.environ["TEST_POSTGRES_URL"],
+        connect_args={"server_settings": {"search_path": schema, "enable_seqscan": "off"}},
+    )
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        use_engine(engine)
+
+        statements = await _record_statements(engine)
+        assert len(statements) > 20
+
+        offenders = []
+        async with engine.connect() as conn:
+            for statement, parameters in statements:
+                result = await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+                plan = [row[0] for row in result]
+                if scans := [line for line in plan if "Seq Scan" in line]:
+                    offenders.append(f"{statement}\n  -> {scans}")
+        assert not offenders, "\n\n".join(offenders)
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        await engine.dispose()
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert, select
+
+from api.utils import reestimate_all
+from api.utils.local_estimator import LOCAL_REASONING_PREFIX
+from api.utils.openrouter import PROMPT_VERSION, TaskDifficultySchema, default_task_difficulty
+from api.utils.reestimate_all import Checkpoint, upsert_task_difficulties
+from core.config import get_settings
+from models import Task, TaskDifficulty
+
+
+@pytest_asyncio.fixture(name="sessionmaker")
+async def fixture_sessionmaker(sessionmaker, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(get_settings().openrouter, "model", "test/model")
+    async with sessionmaker() as session:
+        await session.execute(insert(Task), [{"name": f"Task {i}"} for i in range(5)])
+        await session.commit()
+    return sessionmaker
+
+
+def _stub_estimator(monkeypatch: pytest.MonkeyPatch, fail_on: set[int] | None = None) -> list[int]:
+    """Scores task n with 10 * n, raising once for the ids in `fail_on`."""
+    calls: list[int] = []
+    failing = set(fail_on or ())
+
+    async def estimate(row) -> TaskDifficultySchema:
+        calls.append(row.id)
+        if row.id in failing:
+            failing.discard(row.id)
+            raise RuntimeError("Interrupted")
+        return TaskDifficultySchema(difficulty_score=10 * row.id, reasoning="Stub")
+
+    monkeypatch.setattr(reestimate_all, "run_estimate_task_difficulty", estimate)
+    return calls
+
+
+async def _scores(sessionmaker) -> dict[int, int]:
+    async with sessionmaker() as session:
+        rows = await session.execute(select(TaskDifficulty.task_id, TaskDifficulty.score))
+        return dict(rows.all())
+
+
+@pytest.mark.asyncio
+async def test_resumes_from_the_checkpoint(sessionmaker, tmp_path, monkeypatch) -> None:
+    path = tmp_path / "checkpoint.json"
+    calls = _stub_estimator(monkeypatch, fail_on={3})
+    with pytest.raises(RuntimeError):
+        await reestimate_all.reestimate_all(path, concurrency=2, chunk_size=2)
+    # The first window is written and checkpointed, the second one is not
+    assert await _scores(sessionmaker) == {1: 10, 2: 20}
+    assert Checkpoint.load(path, "test/model").last_task_id == 2
+
+    calls.clear()
+    checkpoint = await reestimate_all.reestimate_all(path, concurrency=2, chunk_size=2)
+    assert sorted(calls) == [3, 4, 5]
+    assert (checkpoint.last_task_id, checkpoint.processed, checkpoint.skipped) == (5, 5, 0)
+    assert await _scores(sessionmaker) == {n: 10 * n for n in range(1, 6)}
+
+    # Finished, nothing left after the checkpoint
+    calls.clear()
+    await reestimate_all.reestimate_all(path, concurrency=2, chunk_size=2)
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_another_model_or_prompt_starts_over(sessionmaker, tmp_path, monkeypatch) -> None:
+    path = tmp_path / "checkpoint.json"
+    Checkpoint("test/model", PROMPT_VERSION, last_task_id=4, processed=4).save(path)
+    assert Checkpoint.load(path, "test/model").last_task_id == 4
+    assert Checkpoint.load(path, "other/model") == Checkpoint("other/model", PROMPT_VERSION)
+    monkeypatch.setattr(reestimate_all, "PROMPT_VERSION", PROMPT_VERSION + 1)
+    assert Checkpoint.load(path, "test/model").last_task_id == 0
+
+    calls = _stub_estimator(monkeypatch)
+    checkpoint = await reestimate_all.reestimate_all(path, concurrency=2, chunk_size=10)
+    assert sorted(calls) == [1, 2, 3, 4, 5]
+    assert json.loads(path.read_text())["prompt_version"] == PROMPT_VERSION + 1
+    assert checkpoint.processed == 5
+
+
+@pytest.mark.asyncio
+async def test_default_and_local_scores_are_skipped(sessionmaker, tmp_path, monkeypatch) -> None:
+    async with sessionmaker() as session:
+        await upsert_task_difficulties(session, {2: TaskDifficultySchema(difficulty_score=33)})
+        await session.commit()
+
+    async def estimate(row) -> TaskDifficultySchema:
+        if row.id == 2:
+            return default_task_difficulty("OpenRouter API failed with status 503.")
+        if row.id in (3, 4):
+            # The local fallback answered during an outage
+            reasoning = f"{LOCAL_REASONING_PREFIX} (trained on 10 scored tasks)."
+            return TaskDifficultySchema(difficulty_score=45, reasoning=reasoning)
+        return TaskDifficultySchema(difficulty_score=10 * row.id, reasoning="Stub")
+
+    monkeypatch.setattr(reestimate_all, "run_estimate_task_difficulty", estimate)
+    checkpoint = await reestimate_all.reestimate_all(
+        tmp_path / "checkpoint.json", concurrency=2, chunk_size=2
+    )
+    assert (checkpoint.processed, checkpoint.skipped) == (5, 3)
+    # The real score of task 2 is kept, tasks 3 and 4 stay unscored
+    assert await _scores(sessionmaker) == {1: 10, 2: 33, 5: 50}
@@ -0,0 +1,260 @@
+import asyncio
+import contextlib
+import datetime
+import email
+import json
+
+import httpx
+import pytest
+from sqlalchemy import func, insert, select
+
+from api.utils.reminder_delivery import (
+    DeliveryPipeline,
+    enqueue_deliveries,
+    replay_dead_letters,
+)
+from api.utils.reminder_sinks import Delivery, EmailSink, InboxSink, ReminderSink, WebhookSink
+from api.utils.reminders import Reminder, ReminderScheduler
+from core.config import Delivery as DeliverySettings
+from core.config import get_settings
+from models import InboxMessage, ReminderDeadLetter, ReminderDelivery, Task
+from models.reminder_delivery import DELIVERY_PENDING, DELIVERY_SENT
+
+WEBHOOK_URL = "http://hooks.test/reminders"
+_SENT = select(ReminderDelivery).where(ReminderDelivery.status == DELIVERY_SENT)
+
+
+@pytest.fixture(name="sessionmaker")
+def fixture_sessionmaker(sessionmaker, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(get_settings().delivery, "sinks", ["inbox", "webhook"])
+    monkeypatch.setattr(get_settings().delivery, "webhook_url", WEBHOOK_URL)
+    return sessionmaker
+
+
+def _settings(**overrides) -> DeliverySettings:
+    return DeliverySettings(batch_window_ms=10, poll_interval_secs=0.05, **overrides)
+
+
+@contextlib.asynccontextmanager
+async def _running(pipeline: DeliveryPipeline):
+    task = asyncio.create_task(pipeline.run())
+    try:
+        yield pipeline
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+async def _count(sessionmaker, query) -> int:
+    async with sessionmaker() as session:
+        return await session.scalar(select(func.count()).select_from(query.subquery()))
+
+
+async def _until_count(sessionmaker, query, expected: int, timeout: float = 5) -> None:
+    async with asyncio.timeout(timeout):
+        while await _count(sessionmaker, query) != expected:
+            await asyncio.sleep(0.02)
+
+
+async def _fire(sessionmaker, count: int) -> list[int]:
+    """Tasks whose reminders fired, in the outbox as the tick would leave them."""
+    due = datetime.datetime(2026, 10, 18, 9, 0, tzinfo=datetime.UTC)
+    async with sessionmaker() as session:
+        ids = list(
+            await session.scalars(
+                insert(Task.__table__).returning(Task.__table__.c.id),
+                [{"name": f"Task {i}", "due_date": due} for i in range(count)],
+            )
+        )
+        await enqueue_deliveries(session, [Reminder(task_id, due) for task_id in ids])
+        await session.commit()
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_fired_reminders_reach_every_sink(sessionmaker) -> None:
+    posted = []
+
+    def webhook(request: httpx.Request) -> httpx.Response:
+        posted.append(json.loads(request.content)["reminders"])
+        return httpx.Response(204)
+
+    due = datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=0.3)
+    async with sessionmaker() as session:
+        session.add_all(Task(name=f"Call {i}", description="Soon", due_date=due) for i in range(3))
+        await session.commit()
+
+    scheduler = ReminderScheduler(0.05, 100)
+    scheduler.add_handler(enqueue_deliveries)
+    sinks = [InboxSink(100, 1), WebhookSink(WEBHOOK_URL, 5, 100, 2, httpx.MockTransport(webhook))]
+    scheduler_task = asyncio.create_task(scheduler.run())
+    try:
+        async with _running(DeliveryPipeline(sinks, _settings())) as pipeline:
+            await _until_count(sessionmaker, _SENT, 6)
+    finally:
+        scheduler_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await scheduler_task
+
+    # One batch per sink, each reminder with its key
+    assert [len(batch) for batch in posted] == [3]
+    assert {r["name"] for r in posted[0]} == {"Call 0", "Call 1", "Call 2"}
+    assert all(r["idempotency_key"].endswith(":webhook") for r in posted[0])
+    async with sessionmaker() as session:
+        inbox = (await session.scalars(select(InboxMessage))).all()
+    assert sorted(message.title for message in inbox) == ["Call 0", "Call 1", "Call 2"]
+    stats = pipeline.snapshot()
+    assert stats["webhook"]["sent"] == stats["inbox"]["sent"] == 3
+    assert stats["webhook"]["batches"] == 1
+    assert stats["webhook"]["delivery_lag"]["count"] == 3
+
+    # The same reminders again: neither the outbox nor the inbox doubles
+    async with sessionmaker() as session:
+        reminders = [Reminder(m.task_id, m.due_date.replace(tzinfo=datetime.UTC)) for m in inbox]
+        await enqueue_deliveries(session, reminders)
+        await session.commit()
+    assert await _count(sessionmaker, select(ReminderDelivery)) == 6
+    payload = {"name": "Call 0", "description": "Soon"}
+    message = inbox[0]
+    redelivered = Delivery(0, message.idempotency_key, message.task_id, message.due_date, payload, 2)
+    await InboxSink(100, 1).send([redelivered])
+    assert await _count(sessionmaker, select(InboxMessage)) == 3
+
+
+@pytest.mark.asyncio
+async def test_retries_then_dead_letters(sessionmaker, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings().delivery, "sinks", ["webhook"])
+    ids = await _fire(sessionmaker, 3)
+    answers = {ids[0]: [503, 200], ids[1]: [400], ids[2]: [503, 503]}
+    calls = []
+
+    def webhook(request: httpx.Request) -> httpx.Response:
+        (reminder,) = json.loads(request.content)["reminders"]
+        calls.append(int(reminder["id"]))
+        return httpx.Response(answers[int(reminder["id"])].pop(0))
+
+    sink = WebhookSink(WEBHOOK_URL, 5, 1, 1, httpx.MockTransport(webhook))
+    settings = _settings(max_attempts=2, retry_base_delay_secs=0.05)
+    async with _running(DeliveryPipeline([sink], settings)) as pipeline:
+        await _until_count(sessionmaker, select(ReminderDeadLetter), 2)
+        await _until_count(sessionmaker, _SENT, 1)
+
+    # Refused for good right away, unavailable until out of attempts
+    assert sorted(calls) == sorted([ids[0], ids[0], ids[1], ids[2], ids[2]])
+    async with sessionmaker() as session:
+        dead = {row.task_id: row for row in await session.scalars(select(ReminderDeadLetter))}
+    assert dead[ids[1]].attempts == 1
+    assert dead[ids[1]].last_error == "PermanentDeliveryError: Webhook answered 400"
+    assert dead[ids[2]].attempts == 2
+    assert pipeline.snapshot()["webhook"] | {"send_latency": None, "delivery_lag": None} == {
+        "claimed": 5,
+        "in_flight": 0,
+        "sent": 1,
+        "batches": 5,
+        "failed_batches": 4,
+        "retried": 2,
+        "dead": 2,
+        "lost": 0,
+        "queue_depth": 0,
+        "queue_size": 1000,
+        "send_latency": None,
+        "delivery_lag": None,
+    }
+
+    assert await replay_dead_letters("webhook") == 2
+    async with sessionmaker() as session:
+        replayed = (
+            await session.scalars(
+                select(ReminderDelivery).where(ReminderDelivery.status == DELIVERY_PENDING)
+            )
+        ).all()
+    assert sorted(row.task_id for row in replayed) == [ids[1], ids[2]]
+    assert {row.attempts for row in replayed} == {0}
+
+
+class _SlowSink(ReminderSink):
+    name = "inbox"
+
+    def __init__(self, pipeline_lanes: dict) -> None:
+        super().__init__(batch_size=5, concurrency=2)
+        self.lanes = pipeline_lanes
+        self.batches: list[int] = []
+        self.running = self.max_running = self.max_queued = 0
+
+    async def send(self, deliveries: list[Delivery]) -> None:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.max_queued = max(self.max_queued, self.lanes["inbox"].queue.qsize())
+        self.batches.append(len(deliveries))
+        await asyncio.sleep(0.05)
+        self.running -= 1
+
+
+@pytest.mark.asyncio
+async def test_bounded_queues_and_batches(sessionmaker, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings().delivery, "sinks", ["inbox"])
+    await _fire(sessionmaker, 60)
+    lanes: dict = {}
+    sink = _SlowSink(lanes)
+    pipeline = DeliveryPipeline([sink], _settings(queue_size=8))
+    lanes.update(pipeline.lanes)
+    async with _running(pipeline):
+        await _until_count(sessionmaker, _SENT, 60)
+
+    assert sum(sink.batches) == 60
+    assert max(sink.batches) == 5
+    assert sink.max_running == 2
+    # Claimed as the queue drained, never more than it holds
+    assert sink.max_queued <= 8
+    assert pipeline.snapshot()["inbox"]["claimed"] == 60
+
+
+async def _smtp_server(received: list[bytes]):
+    # Just enough SMTP for smtplib
+    async def session(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.write(b"220 localhost\r\n")
+        while line := await reader.readline():
+            command = line[:4].upper()
+            if command == b"DATA":
+                writer.write(b"354 go ahead\r\n")
+                received.append(await reader.readuntil(b"\r\n.\r\n"))
+                writer.write(b"250 queued\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 bye\r\n")
+                break
+            else:
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(session, "127.0.0.1", 0)
+
+
+@pytest.mark.asyncio
+async def test_email_sink_sends_one_message_per_reminder() -> None:
+    received: list[bytes] = []
+    async with await _smtp_server(received) as server:
+        port = server.sockets[0].getsockname()[1]
+        sink = EmailSink("127.0.0.1", port, 5, "reminders@example.com", "me@example.com", 10, 1)
+        due = datetime.datetime(2026, 10, 18, 9, 30)
+        await sink.send(
+            [
+                Delivery(1, "7:1000:email", 7, due, {"name": "Rent", "description": "Landlord"}, 1),
+                Delivery(2, "8:1000:email", 8, due, {"name": "Gym", "description": None}, 1),
+            ]
+        )
+
+    messages = [email.message_from_bytes(data[: -len(b".\r\n")]) for data in received]
+    assert [m["Subject"] for m in messages] == ["Reminder: Rent", "Reminder: Gym"]
+    assert messages[0]["Message-ID"] == "<7.1000.email@example.com>"
+    body = messages[0].get_payload().splitlines()
+    assert body[:3] == ["Landlord", "", "Due 2026-10-18 09:30 UTC"]
+
+
+def test_sinks_without_send_cannot_be_created() -> None:
+    class Unfinished(ReminderSink):
+        name = "unfinished"
+
+    with pytest.raises(TypeError, match="send"):
+        Unfinished(batch_size=1, concurrency=1)
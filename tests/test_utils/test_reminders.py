@@ -0,0 +1,160 @@
+import asyncio
+import contextlib
+import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from api.utils.reminders import Reminder, ReminderScheduler, get_fired_through
+from models import Task
+
+TICK = 0.05
+
+
+def _in(seconds: float) -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=seconds)
+
+
+@contextlib.asynccontextmanager
+async def _running(max_loaded: int = 100):
+    scheduler = ReminderScheduler(TICK, max_loaded)
+    fired: list[list[Reminder]] = []
+
+    async def handler(session, reminders: list[Reminder]) -> None:
+        fired.append(reminders)
+
+    scheduler.add_handler(handler)
+    task = asyncio.create_task(scheduler.run())
+    await asyncio.wait_for(scheduler._ready.wait(), 5)
+    try:
+        yield scheduler, fired
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+async def _until(condition, timeout: float = 5) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(TICK / 2)
+
+
+async def _add_tasks(sessionmaker, due_dates: list[datetime.datetime | None]) -> list[int]:
+    async with sessionmaker() as session:
+        ids = list(
+            await session.scalars(
+                insert(Task.__table__).returning(Task.__table__.c.id),
+                [{"name": f"Task {i}", "due_date": due} for i, due in enumerate(due_dates)],
+            )
+        )
+        await session.commit()
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_fires_once_across_restarts(sessionmaker) -> None:
+    async with _running() as (scheduler, fired):
+        # Nothing past due on a first start
+        await _add_tasks(sessionmaker, [_in(-60)])
+    first_start = scheduler.fired_through
+
+    same_tick = _in(0.3)
+    ids = await _add_tasks(sessionmaker, [same_tick, same_tick, _in(0.6), None, _in(30)])
+    async with _running() as (scheduler, fired):
+        await _until(lambda: fired)
+    # Coalesced in one batch
+    assert [[r.task_id for r in batch] for batch in fired] == [ids[:2]]
+    assert fired[0][0].due_date == same_tick
+
+    # Down while ids[2] fell due: fired on the next start, ids[:2] not again
+    await asyncio.sleep(0.4)
+    async with _running() as (scheduler, fired):
+        await _until(lambda: fired)
+        await asyncio.sleep(TICK * 2)
+    assert [[r.task_id for r in batch] for batch in fired] == [[ids[2]]]
+    async with sessionmaker() as session:
+        assert await get_fired_through(session) > first_start
+
+
+@pytest.mark.asyncio
+async def test_follows_task_writes(client) -> None:
+    async with _running() as (scheduler, fired):
+        soon = (_in(0.3)).replace(tzinfo=None).isoformat()
+        created = [
+            (await client.post("/tasks/", json={"name": f"T{i}", "due_date": soon})).json()["id"]
+            for i in range(4)
+        ]
+        later = (_in(0.6)).replace(tzinfo=None).isoformat()
+        await client.put(f"/tasks/{created[1]}", json={"due_date": later})
+        await client.put(f"/tasks/{created[2]}", json={"is_completed": True})
+        await client.delete(f"/tasks/{created[3]}")
+        await _until(lambda: len(fired) == 2)
+        await asyncio.sleep(TICK * 2)
+
+    assert [[str(r.task_id) for r in batch] for batch in fired] == [[created[0]], [created[1]]]
+
+
+@pytest.mark.asyncio
+async def test_window_bounds_memory(sessionmaker) -> None:
+    start = _in(0.3)
+    due_dates = [start + datetime.timedelta(milliseconds=5 * i) for i in range(40)]
+    ids = await _add_tasks(sessionmaker, due_dates)
+    async with _running(max_loaded=8) as (scheduler, fired):
+        assert scheduler.stats.loaded == 8
+        await _until(lambda: sum(map(len, fired)) == len(ids))
+        assert scheduler.stats.window_reads > 5
+
+    # Same order, once each, several per tick
+    assert [r.task_id for batch in fired for r in batch] == ids
+    assert len(fired) < len(ids)
+
+
+@pytest.mark.asyncio
+async def test_catch_up_fires_a_page_at_a_time(sessionmaker) -> None:
+    async with _running():
+        pass
+    # More tasks sharing a due date than a page holds, all past due on restart
+    same = _in(0.1)
+    ids = await _add_tasks(sessionmaker, [same] * 10 + [_in(0.15)] * 3)
+    await asyncio.sleep(0.3)
+    async with _running(max_loaded=4) as (scheduler, fired):
+        await _until(lambda: sum(map(len, fired)) >= len(ids))
+        await asyncio.sleep(TICK * 2)
+    assert [r.task_id for batch in fired for r in batch] == ids
+    assert max(map(len, fired)) == 4
+    assert scheduler.stats.fired == len(ids)
+
+
+@pytest.mark.asyncio
+async def test_failed_tick_fires_again(sessionmaker) -> None:
+    ids = await _add_tasks(sessionmaker, [_in(0.2)])
+    calls = []
+
+    async def flaky(session, reminders: list[Reminder]) -> None:
+        calls.append([r.task_id for r in reminders])
+        if len(calls) == 1:
+            raise RuntimeError("sink down")
+
+    async with _running() as (scheduler, fired):
+        scheduler.handlers.insert(0, flaky)
+        await _until(lambda: fired)
+    assert calls == [ids, ids]
+    assert [[r.task_id for r in batch] for batch in fired] == [ids]
+    assert scheduler.stats.failed_ticks == 1
+
+
+@pytest.mark.asyncio
+async def test_fires_tasks_other_processes_knew_of(sessionmaker) -> None:
+    known = await _add_tasks(sessionmaker, [_in(0.4)])
+    async with _running() as (first, first_fired), _running() as (second, second_fired):
+        # Written without an event, as when a datagram from another process
+        # was dropped: neither heap holds them, they fire with the next tick
+        unheard = await _add_tasks(sessionmaker, [_in(0.2), _in(0.3)])
+        assert unheard[0] not in first._due and unheard[0] not in second._due
+        await _until(lambda: sum(map(len, first_fired + second_fired)) == 3)
+        await asyncio.sleep(TICK * 2)
+
+    fired = [r.task_id for batch in first_fired + second_fired for r in batch]
+    assert sorted(fired) == sorted(known + unheard)
+    assert first.stats.skipped_ticks + second.stats.skipped_ticks > 0
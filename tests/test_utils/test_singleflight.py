@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from api.utils.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrent_callers_share_one_call() -> None:
+    calls = 0
+    release = asyncio.Event()
+
+    async def work() -> int:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return 42
+
+    flight: SingleFlight[int] = SingleFlight()
+    waiters = [asyncio.create_task(flight.do("key", work)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == [42] * 5
+    assert calls == 1
+    assert flight.stats.shared == 4
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cancelled_waiter_does_not_cancel_shared_call() -> None:
+    release = asyncio.Event()
+
+    async def work() -> str:
+        await release.wait()
+        return "done"
+
+    flight: SingleFlight[str] = SingleFlight()
+    first = asyncio.create_task(flight.do("key", work))
+    second = asyncio.create_task(flight.do("key", work))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await second == "done"
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_errors_reach_every_waiter_and_key_is_released() -> None:
+    async def fail() -> None:
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream down")
+
+    flight: SingleFlight[None] = SingleFlight()
+    results = await asyncio.gather(
+        flight.do("key", fail), flight.do("key", fail), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(flight) == 0
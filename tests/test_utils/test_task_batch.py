@@ -0,0 +1,154 @@
+import datetime
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+
+from api.endpoints import tasks as tasks_endpoint
+from api.utils.estimation_queue import save_task_difficulty
+from api.utils.openrouter import TaskDifficultySchema
+from core import database_session
+from models import EstimationJob, Task, TaskChange, TaskDifficulty
+
+
+async def _create(client: httpx.AsyncClient, count: int) -> list[str]:
+    return [
+        (await client.post("/tasks/", json={"name": f"Task {i}"})).json()["id"]
+        for i in range(count)
+    ]
+
+
+async def _snapshot(client: httpx.AsyncClient) -> dict:
+    """Everything a write should keep consistent."""
+    today = datetime.datetime.now(datetime.UTC).date()
+    async with client.sessionmaker() as session:
+        tasks = (
+            await session.execute(
+                select(
+                    Task.id,
+                    Task.name,
+                    Task.due_date,
+                    Task.due_epoch_us,
+                    Task.is_completed,
+                    # Stamped with the time of the write
+                    func.date(Task.completed_at),
+                    TaskDifficulty.score,
+                )
+                .outerjoin(TaskDifficulty, TaskDifficulty.task_id == Task.id)
+                .order_by(Task.id)
+            )
+        ).all()
+        changes = await session.scalar(select(func.count()).select_from(TaskChange))
+        jobs = await session.scalar(select(func.count()).select_from(EstimationJob))
+    day = {"from": str(today), "to": str(today + datetime.timedelta(days=1))}
+    timeseries = await client.get("/tasks/stats/timeseries", params=day)
+    return {
+        "tasks": [tuple(row) for row in tasks],
+        "changes": changes,
+        "jobs": jobs,
+        "stats": (await client.get("/tasks/stats")).json(),
+        "timeseries": timeseries.json(),
+    }
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_every_item(client) -> None:
+    first, second = await _create(client, 2)
+    response = await client.post(
+        "/tasks/batch",
+        json={
+            "create": [{"name": "New"}, {"name": "Bad date", "due_date": "tomorrow"}],
+            "update": [
+                {"task_id": 999, "name": "Ghost"},
+                {"task_id": int(first), "due_date": "not a date"},
+                {"task_id": int(second), "name": "Renamed"},
+            ],
+            "delete": [int(first), 999],
+        },
+    )
+    assert response.status_code == 200
+    results = {
+        kind: [(item["index"], item["status"]) for item in items]
+        for kind, items in response.json().items()
+    }
+    assert results == {
+        "created": [(0, "created"), (1, "invalid")],
+        "updated": [(0, "not_found"), (1, "invalid"), (2, "updated")],
+        "deleted": [(0, "deleted"), (1, "not_found")],
+    }
+    assert response.json()["updated"][2]["task"]["name"] == "Renamed"
+    names = [task["name"] for task in (await client.get("/tasks/")).json()]
+    assert names == ["Renamed", "New"]
+
+
+@pytest.mark.asyncio
+async def test_batch_is_one_transaction(client, monkeypatch) -> None:
+    task_ids = await _create(client, 3)
+    before = await _snapshot(client)
+
+    async def fail(session, task_ids):
+        raise RuntimeError("Deletes failed")
+
+    # Creates and updates are already flushed when the deletes fail
+    monkeypatch.setattr(tasks_endpoint, "_batch_delete", fail)
+    with pytest.raises(RuntimeError):
+        await client.post(
+            "/tasks/batch",
+            json={
+                "create": [{"name": "New", "due_date": "2026-11-01"}],
+                "update": [{"task_id": int(task_ids[0]), "is_completed": True}],
+                "delete": [int(task_ids[1])],
+            },
+        )
+    assert await _snapshot(client) == before
+
+
+async def _write(client: httpx.AsyncClient, batch: bool) -> None:
+    """The same updates, through the batch endpoint or one PUT each."""
+    task_ids = await _create(client, 4)
+    async with client.sessionmaker() as session:
+        for task_id, score in zip(task_ids, (20, 80, 50, 65), strict=True):
+            difficulty = TaskDifficultySchema(difficulty_score=score)
+            await save_task_difficulty(session, int(task_id), difficulty)
+        await session.commit()
+    rounds = [
+        [
+            (task_ids[0], {"due_date": "2026-11-02T01:30:00+02:00", "is_completed": True}),
+            (task_ids[1], {"is_completed": True}),
+            (task_ids[2], {"due_date": "2026-11-01T23:30:00"}),
+            (task_ids[3], {"name": "Reestimated", "difficulty_reestimate": True}),
+        ],
+        # Reopened, and completed twice
+        [
+            (task_ids[1], {"is_completed": False}),
+            (task_ids[0], {"is_completed": True}),
+        ],
+    ]
+    for updates in rounds:
+        if batch:
+            response = await client.post(
+                "/tasks/batch",
+                json={"update": [{"task_id": int(i), **values} for i, values in updates]},
+            )
+            assert response.status_code == 200
+        else:
+            for task_id, values in updates:
+                assert (await client.put(f"/tasks/{task_id}", json=values)).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_batch_updates_match_the_single_task_path(client, temp_database) -> None:
+    await _write(client, batch=False)
+    single = await _snapshot(client)
+    async with temp_database("batched.db"):
+        client.sessionmaker = database_session._ASYNC_SESSIONMAKER
+        await _write(client, batch=True)
+        batched = await _snapshot(client)
+    assert batched == single
+    assert [row[3] for row in batched["tasks"]] == [
+        1793575800000000,
+        None,
+        1793575800000000,
+        None,
+    ]
+    assert batched["stats"]["completed"] == 1
@@ -0,0 +1,76 @@
+import datetime
+
+import httpx
+import pytest
+from sqlalchemy import func, select, update
+
+from api.utils import task_changes
+from core import database_session
+from models import TaskChange
+
+
+async def sync(client: httpx.AsyncClient, since: str, limit: int = 100) -> dict:
+    response = await client.get("/tasks/changes", params={"since": since, "limit": limit})
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_changes_since_cursor(client: httpx.AsyncClient) -> None:
+    first = (await client.post("/tasks/", json={"name": "First"})).json()["id"]
+    cursor = (await client.get("/tasks/changes")).json()["cursor"]
+    assert (await sync(client, cursor))["upserts"] == []
+
+    second = (await client.post("/tasks/", json={"name": "Second"})).json()["id"]
+    await client.put(f"/tasks/{second}", json={"name": "Second, renamed"})
+    await client.delete(f"/tasks/{first}")
+
+    changes = await sync(client, cursor)
+    # Two journal entries for the second task, one upsert with its latest state
+    assert [task["name"] for task in changes["upserts"]] == ["Second, renamed"]
+    assert changes["deletes"] == [first]
+    assert not changes["has_more"]
+    assert (await sync(client, changes["cursor"]))["upserts"] == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_changes_are_paged(client: httpx.AsyncClient) -> None:
+    await client.post("/tasks/batch", json={"create": [{"name": f"Task {i}"} for i in range(5)]})
+    changes = await sync(client, "0", limit=3)
+    assert len(changes["upserts"]) == 3 and changes["has_more"]
+    changes = await sync(client, changes["cursor"], limit=3)
+    assert len(changes["upserts"]) == 2 and not changes["has_more"]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_compaction_expires_old_cursors(client: httpx.AsyncClient) -> None:
+    task_id = (await client.post("/tasks/", json={"name": "Short-lived"})).json()["id"]
+    for name in ("Renamed", "Renamed again"):
+        await client.put(f"/tasks/{task_id}", json={"name": name})
+    kept = (await client.post("/tasks/", json={"name": "Kept"})).json()["id"]
+
+    assert await task_changes.compact_journal(force=True) == 2
+    changes = await sync(client, "0")
+    assert [task["name"] for task in changes["upserts"]] == ["Renamed again", "Kept"]
+
+    await client.delete(f"/tasks/{task_id}")
+    old_cursor = changes["cursor"]
+    async with database_session.get_async_session() as session:
+        await session.execute(
+            update(TaskChange).values(
+                create_time=datetime.datetime.now(datetime.UTC) - datetime.timedelta(days=90)
+            )
+        )
+        await session.commit()
+    await task_changes.compact_journal(force=True)
+
+    response = await client.get("/tasks/changes", params={"since": "0"})
+    assert response.status_code == 410
+    response = await client.get("/tasks/changes", params={"since": old_cursor})
+    assert response.status_code == 410
+    async with database_session.get_async_session() as session:
+        remaining = await session.scalars(select(TaskChange.task_id))
+        assert remaining.all() == [int(kept)]
+        horizon = await task_changes.get_journal_horizon(session)
+        assert horizon == await session.scalar(select(func.max(TaskChange.id))) + 1
+    assert (await sync(client, str(horizon)))["upserts"] == []
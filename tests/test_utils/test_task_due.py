@@ -0,0 +1,97 @@
+import datetime
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from models import Task
+from models.task import due_epoch_us
+
+
+async def _pages(client: httpx.AsyncClient, path: str, **params) -> list[list[str]]:
+    pages = []
+    while True:
+        response = await client.get(path, params=params)
+        assert response.status_code == 200
+        pages.append([task["name"] for task in response.json()])
+        if "X-Next-Cursor" not in response.headers:
+            return pages
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+
+@pytest.mark.asyncio
+async def test_due_range_across_write_paths(client) -> None:
+    created = {}
+    # Same instant written with and without an offset
+    for name, due_date in [
+        ("Offset", "2026-11-02T01:30:00+02:00"),
+        ("Start", "2026-11-01T23:30:00"),
+        ("Microseconds", "2026-11-02T00:00:00.000001"),
+        ("End", "2026-11-03T00:00:00"),
+        ("Later", "2026-11-01T00:00:00"),
+    ]:
+        response = await client.post("/tasks/", json={"name": name, "due_date": due_date})
+        created[name] = response.json()["id"]
+    await client.put(f"/tasks/{created['Later']}", json={"due_date": "2026-11-02T12:00:00Z"})
+    response = await client.post(
+        "/tasks/batch",
+        json={
+            "create": [{"name": "Batch", "due_date": "2026-11-02T06:00:00-01:00"}],
+            "update": [{"task_id": created["End"], "due_date": "2026-11-02T18:00:00"}],
+        },
+    )
+    assert response.status_code == 200
+    response = await client.post(
+        "/tasks/import",
+        content=b'{"name": "Imported", "due_date": "2026-11-02T10:00:00+05:00"}\n'
+        b'{"name": "No date"}',
+    )
+    assert response.json()["imported"] == 2
+
+    # Stored in UTC with the epoch in step, whichever path wrote them
+    async with client.sessionmaker() as session:
+        rows = (await session.execute(select(Task.name, Task.due_date, Task.due_epoch_us))).all()
+    stored = {row.name: row.due_date for row in rows}
+    assert stored["Offset"] == stored["Start"] == datetime.datetime(2026, 11, 1, 23, 30)
+    assert all(row.due_epoch_us == due_epoch_us(row.due_date) for row in rows)
+
+    # From included, to excluded, offsets taken into account
+    window = {"from": "2026-11-02T01:30:00+02:00", "to": "2026-11-02T18:00:00"}
+    pages = await _pages(client, "/tasks/due", **window, limit=2)
+    assert pages == [
+        ["Offset", "Start"],
+        ["Microseconds", "Imported"],
+        ["Batch", "Later"],
+    ]
+
+    await client.put(f"/tasks/{created['Start']}", json={"is_completed": True})
+    pages = await _pages(
+        client, "/tasks/due", **{"from": "2026-11-02", "to": "2026-11-03"}, exclude_completed=True
+    )
+    assert pages == [["Microseconds", "Imported", "Batch", "Later", "End"]]
+
+
+@pytest.mark.asyncio
+async def test_overdue(client) -> None:
+    now = datetime.datetime.now(datetime.UTC)
+    for name, delta in [("Week", -7 * 24), ("Hour", -1), ("Done", -2), ("Tomorrow", 24)]:
+        due_date = (now + datetime.timedelta(hours=delta)).isoformat()
+        response = await client.post("/tasks/", json={"name": name, "due_date": due_date})
+        if name == "Done":
+            await client.put(f"/tasks/{response.json()['id']}", json={"is_completed": True})
+    await client.post("/tasks/", json={"name": "Undated"})
+
+    assert await _pages(client, "/tasks/overdue", limit=1) == [["Week"], ["Hour"]]
+
+
+@pytest.mark.asyncio
+async def test_due_rejects_bad_requests(client) -> None:
+    for params in [
+        {"from": "2026-11-02", "to": "2026-11-02"},
+        {"from": "2026-11-02", "to": "yesterday"},
+        {"from": "2026-11-01", "to": "2026-11-02", "cursor": "not-a-cursor"},
+    ]:
+        response = await client.get("/tasks/due", params=params)
+        assert response.status_code == 400
+    response = await client.get("/tasks/due", params={"from": "2026-11-01"})
+    assert response.status_code == 422
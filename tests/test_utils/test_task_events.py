@@ -0,0 +1,107 @@
+import asyncio
+
+import httpx
+import pytest
+
+from api.utils import task_events
+from api.utils.task_events import (
+    SubscriberOverflow,
+    Subscription,
+    TaskEvent,
+    TaskEventHub,
+    UnixSocketBackend,
+)
+
+
+@pytest.mark.asyncio
+async def test_subscription_coalesces_events_per_task() -> None:
+    subscription = Subscription(max_pending=10)
+    subscription.push(TaskEvent("created", 1))
+    subscription.push(TaskEvent("updated", 2))
+    subscription.push(TaskEvent("updated", 1))
+    subscription.push(TaskEvent("difficulty_ready", 2))
+    assert await subscription.get() == [TaskEvent("created", 1), TaskEvent("difficulty_ready", 2)]
+
+    subscription.push(TaskEvent("created", 3))
+    subscription.push(TaskEvent("deleted", 3))
+    assert await subscription.get() == [TaskEvent("deleted", 3)]
+    assert await subscription.get(timeout=0.01) == []
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped() -> None:
+    hub = TaskEventHub(max_pending=3)
+    with hub.subscribe() as slow, hub.subscribe() as fast:
+        for task_id in range(3):
+            hub.publish([TaskEvent("updated", task_id)])
+            assert len(await fast.get()) == 1
+        hub.publish([TaskEvent("updated", 3)])
+        with pytest.raises(SubscriberOverflow):
+            await slow.get()
+        assert await fast.get() == [TaskEvent("updated", 3)]
+    assert hub.snapshot()["dropped_subscribers"] == 1
+    assert hub.snapshot()["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unix_socket_backend_reaches_every_process(tmp_path) -> None:
+    hubs = [TaskEventHub(100, UnixSocketBackend(tmp_path)) for _ in range(2)]
+    for hub in hubs:
+        await hub.start()
+    # Left behind by a dead process
+    (tmp_path / "1-dead.sock").touch()
+    try:
+        with hubs[0].subscribe() as first, hubs[1].subscribe() as second:
+            hubs[0].publish([TaskEvent("created", 7)])
+            for subscription in (first, second):
+                assert await asyncio.wait_for(subscription.get(), 1) == [TaskEvent("created", 7)]
+    finally:
+        for hub in hubs:
+            await hub.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_lost_datagrams_resync_the_receiving_process(tmp_path) -> None:
+    sender, receiver = (TaskEventHub(100, UnixSocketBackend(tmp_path)) for _ in range(2))
+    for hub in (sender, receiver):
+        await hub.start()
+    try:
+        with receiver.subscribe() as subscription:
+            sender.publish([TaskEvent("created", 1)])
+            assert await asyncio.wait_for(subscription.get(), 1) == [TaskEvent("created", 1)]
+            # As if the next datagram hit a full socket buffer
+            sender.backend._sent += 1
+            sender.publish([TaskEvent("updated", 1)])
+            with pytest.raises(SubscriberOverflow):
+                await asyncio.wait_for(subscription.get(), 1)
+        assert receiver.snapshot()["resyncs"] == 1
+        assert receiver.snapshot()["dropped_subscribers"] == 1
+    finally:
+        for hub in (sender, receiver):
+            await hub.close()
+
+
+@pytest.fixture(name="client")
+def fixture_client(client, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(task_events, "_EVENT_HUB", TaskEventHub(max_pending=100))
+    return client
+
+
+@pytest.mark.asyncio
+async def test_task_writes_are_pushed_after_commit(client: httpx.AsyncClient) -> None:
+    messages = task_events.task_event_messages()
+    assert await anext(messages) is None
+
+    task_id = (await client.post("/tasks/", json={"name": "Pushed"})).json()["id"]
+    assert await anext(messages) == {"type": "created", "task_id": task_id}
+    await client.put(f"/tasks/{task_id}", json={"due_date": "not a date"})
+    await client.put(f"/tasks/{task_id}", json={"is_completed": True})
+    # The rejected update published nothing
+    assert await anext(messages) == {"type": "updated", "task_id": task_id}
+    await client.post("/tasks/batch", json={"delete": [int(task_id), 12345]})
+    assert await anext(messages) == {"type": "deleted", "task_id": task_id}
+    await messages.aclose()
+    assert task_events.get_event_hub().snapshot()["subscribers"] == 0
+    metrics = (await client.get("/metrics/events")).json()
+    assert (metrics["subscribers"], metrics["resyncs"]) == (0, 0)
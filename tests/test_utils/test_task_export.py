@@ -0,0 +1,51 @@
+import csv
+import io
+
+import httpx
+import orjson
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert
+
+from api.utils.task_export import stream_task_rows
+from api.utils.task_json import TASK_FIELDS
+from main import app
+from models import Task, TaskDifficulty
+
+
+@pytest_asyncio.fixture(name="engine")
+async def fixture_engine(engine):
+    async with engine.begin() as conn:
+        await conn.execute(
+            insert(Task),
+            [{"name": f"Task {i}", "is_completed": i % 2 == 0} for i in range(1, 26)],
+        )
+        await conn.execute(insert(TaskDifficulty), [{"task_id": 3, "score": 70}])
+    return engine
+
+
+@pytest.mark.asyncio
+async def test_export_formats(engine) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+        response = await client.get("/tasks/export")
+        assert response.headers["content-type"] == "application/x-ndjson"
+        tasks = [orjson.loads(line) for line in response.content.splitlines()]
+        assert [task["id"] for task in tasks] == [str(i) for i in range(1, 26)]
+        assert tasks[2]["difficulty_score"] == 70
+
+        response = await client.get("/tasks/export", params={"format": "csv", "exclude_completed": True})
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert tuple(rows[0]) == TASK_FIELDS
+        assert [row["id"] for row in rows] == [str(i) for i in range(1, 26, 2)]
+        assert rows[1]["difficulty_score"] == "70" and rows[0]["difficulty_score"] == ""
+
+
+@pytest.mark.asyncio
+async def test_stopped_export_releases_its_connection(engine) -> None:
+    chunks = stream_task_rows(chunk_rows=10)
+    assert len(await anext(chunks)) == 10
+    assert engine.pool.checkedout() == 1
+    # What the response does when the client disconnects
+    await chunks.aclose()
+    assert engine.pool.checkedout() == 0
@@ -0,0 +1,95 @@
+import datetime
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from api.utils.datetime import add_timezone_to_datetime
+from api.utils.task_changes import read_task_changes
+from api.utils.task_import import import_tasks
+from core.config import Estimator, get_settings
+from models import EstimationJob, Task
+
+
+async def _pieces(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_import_reports_invalid_rows(client, sessionmaker) -> None:
+    body = b"\n".join(
+        [
+            b'{"name": "First", "due_date": "2026-11-02T09:30:00"}',
+            b'{"name": "", "description": "no name"}',
+            b"not json",
+            b'{"name": "Bad date", "due_date": "tomorrow"}',
+            b'{"name": "Done", "is_completed": true, "id": "ignored"}',
+        ]
+    )
+    response = await client.post("/tasks/import", content=body)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["rows"], report["imported"], report["failed"]) == (5, 2, 3)
+    assert [error["row"] for error in report["errors"]] == [2, 3, 4]
+    assert report["errors"][2]["detail"].startswith("Invalid date format: tomorrow")
+
+    async with sessionmaker() as session:
+        tasks = (await session.scalars(select(Task).order_by(Task.id))).all()
+        assert [(task.name, task.is_completed) for task in tasks] == [
+            ("First", False),
+            ("Done", True),
+        ]
+        assert add_timezone_to_datetime(tasks[0].due_date) == datetime.datetime(
+            2026, 11, 2, 9, 30, tzinfo=datetime.UTC
+        )
+        ops, _, _ = await read_task_changes(session, 0, 10)
+        assert ops == {task.id: "upsert" for task in tasks}
+        jobs = (await session.scalars(select(EstimationJob).order_by(EstimationJob.id))).all()
+        assert sorted(job.task_id for job in jobs) == [task.id for task in tasks]
+
+
+@pytest.mark.asyncio
+async def test_csv_import_across_chunks(sessionmaker) -> None:
+    body = (
+        b"\xef\xbb\xbfname,description,is_completed,due_date\r\n"
+        b'Plain,,false,\r\n'
+        b'Quoted,"spans\r\ntwo lines, with ""quotes""",yes,2026-12-01\r\n'
+        b"Too,many,columns,here,!\r\n"
+        b"Last,,1,2026-12-01T10:00:00+02:00\r\n"
+    )
+    # Records split across reads and across insert chunks
+    report = await import_tasks(_pieces(body, 7), "csv", estimate=False, chunk_rows=2)
+    assert (report.rows, report.imported, report.failed) == (4, 3, 1)
+    assert report.errors[0].row == 3
+
+    async with sessionmaker() as session:
+        tasks = (await session.scalars(select(Task).order_by(Task.name))).all()
+        assert [(task.name, task.description, task.is_completed) for task in tasks] == [
+            ("Last", "", True),
+            ("Plain", "", False),
+            ("Quoted", 'spans\r\ntwo lines, with "quotes"', True),
+        ]
+        assert tasks[0].due_date.date() == tasks[2].due_date.date() == datetime.date(2026, 12, 1)
+        assert await session.scalar(select(EstimationJob.id)) is None
+
+
+@pytest.mark.asyncio
+async def test_import_spreads_out_estimates(sessionmaker, monkeypatch) -> None:
+    monkeypatch.setattr(get_settings().estimator, "import_estimates_per_sec", 2.0)
+    body = b"\n".join(b'{"name": "Task %d"}' % i for i in range(5))
+    await import_tasks(_pieces(body, 1024), "ndjson")
+    await import_tasks(_pieces(body, 1024), "ndjson")
+
+    async with sessionmaker() as session:
+        due = (
+            await session.scalars(select(EstimationJob.run_after).order_by(EstimationJob.id))
+        ).all()
+    seconds = [(run_after - due[0]).total_seconds() for run_after in due]
+    # Two per second, the second import after the first one
+    assert [round(s) for s in sorted(seconds)] == [0, 0, 1, 1, 2, 3, 3, 4, 4, 5]
+
+
+def test_estimate_rate_must_be_positive() -> None:
+    with pytest.raises(ValidationError):
+        Estimator(import_estimates_per_sec=0)
@@ -0,0 +1,40 @@
+import datetime
+
+import orjson
+import pytest
+from sqlalchemy import select
+
+from api.endpoints.tasks import create_task_response
+from api.utils.task_json import TASK_ROW_COLUMNS, encode_task_rows
+from models import Task, TaskDifficulty
+
+
+@pytest.mark.asyncio
+async def test_rows_encode_like_task_responses(sessionmaker) -> None:
+    now = datetime.datetime(2026, 10, 18, 9, 30, 15, 123456, tzinfo=datetime.UTC)
+    async with sessionmaker() as session:
+        scored = Task(name="Scored", description="Ünïcode", due_date=now, create_time=now, update_time=now)
+        pending = Task(name="Pending", description=None, create_time=now, update_time=now)
+        session.add_all([scored, pending])
+        await session.flush()
+        session.add(TaskDifficulty(task_id=scored.id, score=42, reasoning="Why", create_time=now))
+        await session.commit()
+        # Compare with what the database returns, not the values set above
+        session.expire_all()
+
+        rows = (
+            await session.execute(
+                select(*TASK_ROW_COLUMNS)
+                .select_from(Task)
+                .outerjoin(Task.difficulty_record)
+                .order_by(Task.id)
+            )
+        ).all()
+        tasks = (await session.scalars(select(Task).order_by(Task.id))).all()
+        expected = []
+        for task in tasks:
+            await session.refresh(task, ["difficulty_record"])
+            expected.append(create_task_response(task, task.difficulty_record).model_dump())
+
+    assert orjson.loads(encode_task_rows(rows)) == expected
+    assert expected[1]["difficulty_status"] == "pending"
@@ -0,0 +1,151 @@
+import datetime
+
+import httpx
+import pytest
+from sqlalchemy import insert, select
+
+from api.utils.estimation_queue import save_task_difficulty
+from api.utils.openrouter import TaskDifficultySchema
+from api.utils.task_rollups import backfill_rollups, reconcile_recent_rollups
+from models import Task, TaskDailyStat, TaskDifficulty
+
+
+async def _buckets(client: httpx.AsyncClient, **params) -> list[dict]:
+    response = await client.get("/tasks/stats/timeseries", params=params)
+    assert response.status_code == 200
+    return response.json()["buckets"]
+
+
+async def _score(client: httpx.AsyncClient, task_id: str, score: int) -> None:
+    async with client.sessionmaker() as session:
+        difficulty = TaskDifficultySchema(difficulty_score=score)
+        await save_task_difficulty(session, int(task_id), difficulty)
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_write_paths_keep_rollups_exact(client) -> None:
+    ids = [
+        (await client.post("/tasks/", json={"name": f"Task {i}"})).json()["id"] for i in range(5)
+    ]
+    for task_id, score in zip(ids, [10, 20, 30, 90, 50]):
+        await _score(client, task_id, score)
+    for task_id in ids[:4]:
+        await client.put(f"/tasks/{task_id}", json={"is_completed": True})
+    # Reopened, deleted, re-estimated
+    await client.put(f"/tasks/{ids[0]}", json={"is_completed": False})
+    await client.delete(f"/tasks/{ids[1]}")
+    await client.put(f"/tasks/{ids[2]}", json={"difficulty_reestimate": True})
+    await _score(client, ids[2], 35)
+    response = await client.post(
+        "/tasks/batch",
+        json={
+            "create": [{"name": "Batch"}] * 2,
+            "update": [
+                {"task_id": ids[4], "is_completed": True},
+                {"task_id": ids[3], "is_completed": True},
+            ],
+        },
+    )
+    assert response.status_code == 200
+    response = await client.post(
+        "/tasks/import",
+        content=b'{"name": "Open"}\n{"name": "Done", "is_completed": true}',
+        params={"estimate": False},
+    )
+    assert response.json()["imported"] == 2
+
+    today = datetime.datetime.now(datetime.UTC).date()
+    [bucket] = await _buckets(client, **{"from": today.isoformat()})
+    assert bucket == {
+        "start": today.isoformat(),
+        "created": 8,
+        "completed": 4,
+        "scored": 3,
+        "difficulty_sum": 175,
+        "difficulty_p50": 50,
+        "difficulty_p90": 90,
+        "difficulty_p99": 90,
+    }
+    assert await reconcile_recent_rollups() == {}
+
+
+@pytest.mark.asyncio
+async def test_backfill_and_weeks(client) -> None:
+    def at(day: int, hour: int = 12) -> datetime.datetime:
+        return datetime.datetime(2026, 9, day, hour, tzinfo=datetime.UTC)
+
+    # Monday 2026-09-21 to Wednesday 2026-09-30
+    tasks = [
+        {"name": "Open", "create_time": at(21)},
+        {"name": "Done", "create_time": at(21), "is_completed": True, "completed_at": at(22)},
+        {"name": "Late", "create_time": at(27, 23), "is_completed": True, "completed_at": at(29)},
+        {"name": "Unscored", "create_time": at(29), "is_completed": True, "completed_at": at(30)},
+    ]
+    scores = {"Done": 10, "Late": 70, "Open": 99}
+    async with client.sessionmaker() as session:
+        ids = await session.scalars(
+            insert(Task).returning(Task.id, sort_by_parameter_order=True), tasks
+        )
+        await session.execute(
+            insert(TaskDifficulty),
+            [
+                {"task_id": task_id, "score": scores[task["name"]]}
+                for task_id, task in zip(ids, tasks)
+                if task["name"] in scores
+            ],
+        )
+        await session.commit()
+    buckets = await _buckets(client, **{"from": "2026-09-01"})
+    assert sum(bucket["created"] for bucket in buckets) == 0
+
+    assert await backfill_rollups(chunk_days=3) > 0
+    # Resumes where it stopped, nothing left to do
+    assert await backfill_rollups(chunk_days=3) == 0
+    async with client.sessionmaker() as session:
+        days = set(await session.scalars(select(TaskDailyStat.day)))
+    assert min(days) == datetime.date(2026, 9, 21)
+
+    days = await _buckets(client, **{"from": "2026-09-21", "to": "2026-09-23"})
+    assert [(day["created"], day["completed"], day["difficulty_p50"]) for day in days] == [
+        (2, 0, None),
+        (0, 1, 10),
+    ]
+    # Whole weeks, from the Monday on or before `from`
+    weeks = await _buckets(client, granularity="week", **{"from": "2026-09-24", "to": "2026-09-29"})
+    assert weeks == [
+        {
+            "start": "2026-09-21",
+            "created": 3,
+            "completed": 1,
+            "scored": 1,
+            "difficulty_sum": 10,
+            "difficulty_p50": 10,
+            "difficulty_p90": 10,
+            "difficulty_p99": 10,
+        },
+        {
+            "start": "2026-09-28",
+            "created": 1,
+            "completed": 2,
+            "scored": 1,
+            "difficulty_sum": 70,
+            "difficulty_p50": 70,
+            "difficulty_p90": 70,
+            "difficulty_p99": 70,
+        },
+    ]
+
+
+@pytest.mark.asyncio
+async def test_timeseries_rejects_bad_requests(client) -> None:
+    for params in [
+        {"from": "2026-11-02", "to": "2026-11-02"},
+        {"from": "yesterday"},
+        {"from": "2020-01-01", "to": "2026-01-01"},
+    ]:
+        response = await client.get("/tasks/stats/timeseries", params=params)
+        assert response.status_code == 400
+    response = await client.get("/tasks/stats/timeseries", params={"granularity": "month"})
+    assert response.status_code == 422
+    assert len(await _buckets(client, granularity="week")) in (12, 13)
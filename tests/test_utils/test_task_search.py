@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from sqlalchemy import String, create_engine
+
+from models import Base, Task
+from models.task_search import SEARCH_COLUMNS, TASKS_FTS
+
+
+async def _search(client: httpx.AsyncClient, **params) -> list[dict]:
+    hits = []
+    while True:
+        response = await client.get("/tasks/search", params=params)
+        assert response.status_code == 200
+        hits.extend(response.json())
+        if "X-Next-Cursor" not in response.headers:
+            return hits
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_and_pages(client) -> None:
+    tasks = [
+        ("Water the plants", "Every plant in the living room"),
+        ("Buy groceries", "Milk, bread and plant food"),
+        ("Plant tomatoes", None),
+        ("Call the bank", "About the loan"),
+    ]
+    ids = []
+    for name, description in tasks:
+        response = await client.post("/tasks/", json={"name": name, "description": description})
+        ids.append(response.json()["id"])
+
+    hits = await _search(client, q="PLANT", limit=1)
+    # Name matches first, stemmed ("plants"), then the description only match
+    assert [hit["id"] for hit in hits] == [ids[2], ids[0], ids[1]]
+    assert hits[0]["rank"] >= hits[1]["rank"] > hits[2]["rank"]
+    assert hits[2]["snippet"] == "Milk, bread and <mark>plant</mark> food"
+    assert hits[2]["difficulty_status"] == "pending"
+
+    # Prefix on the last word, every word must match
+    assert [hit["id"] for hit in await _search(client, q="water pla")] == [ids[0]]
+    assert await _search(client, q="water bank") == []
+
+    # The index follows updates and deletes
+    await client.put(f"/tasks/{ids[3]}", json={"name": "Repot the plant", "is_completed": True})
+    await client.delete(f"/tasks/{ids[2]}")
+    hits = await _search(client, q="plant", exclude_completed=True)
+    assert [hit["id"] for hit in hits] == [ids[0], ids[1]]
+    assert [hit["id"] for hit in await _search(client, q="bank")] == []
+
+
+@pytest.mark.asyncio
+async def test_search_rejects_bad_input(client) -> None:
+    response = await client.get("/tasks/search", params={"q": " ?! "})
+    assert response.status_code == 400
+    # No FTS5 syntax gets through
+    response = await client.get("/tasks/search", params={"q": 'NEAR("x" OR'})
+    assert response.status_code == 200
+
+    await client.post("/tasks/", json={"name": "One task"})
+    await client.post("/tasks/", json={"name": "Two tasks"})
+    response = await client.get("/tasks/search", params={"q": "task", "limit": 1})
+    cursor = response.headers["X-Next-Cursor"]
+    response = await client.get("/tasks/search", params={"q": "other", "cursor": cursor})
+    assert response.status_code == 400
+    response = await client.get("/tasks/search", params={"q": "task", "cursor": "nonsense"})
+    assert response.status_code == 400
+
+
+def test_search_columns_are_the_text_columns() -> None:
+    text_columns = [c.name for c in Task.__table__.columns if isinstance(c.type, String)]
+    assert tuple(text_columns) == SEARCH_COLUMNS
+
+
+def _search_schema(path) -> dict[str, str]:
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE name LIKE ? AND sql IS NOT NULL",
+            (f"{TASKS_FTS}%",),
+        ).fetchall()
+    return {name: " ".join(sql.split()) for name, sql in rows}
+
+
+def test_migrations_build_the_same_search_index(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'models.db'}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    migrated = tmp_path / "migrated.db"
+    # In its own process, env.py sets up logging
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        env={**os.environ, "DATABASE_URL": f"sqlite+aiosqlite:///{migrated}"},
+        cwd=Path(__file__).parents[2],
+        check=True,
+        capture_output=True,
+    )
+
+    expected = _search_schema(tmp_path / "models.db")
+    assert {f"{TASKS_FTS}_insert", f"{TASKS_FTS}_update", f"{TASKS_FTS}_delete"} < set(expected)
+    assert _search_schema(migrated) == expected
+
+    # Tasks written after the migration are indexed, the index matches them
+    with sqlite3.connect(migrated) as conn:
+        conn.execute("INSERT INTO tasks (name, description, is_completed) VALUES ('A', 'b', 0)")
+        conn.execute("UPDATE tasks SET description = 'c'")
+        conn.execute(f"INSERT INTO {TASKS_FTS}({TASKS_FTS}, rank) VALUES ('integrity-check', 1)")
+        assert conn.execute(f"SELECT rowid FROM {TASKS_FTS} WHERE {TASKS_FTS} MATCH 'c'").fetchall()
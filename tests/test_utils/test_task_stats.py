@@ -0,0 +1,132 @@
+import asyncio
+import contextlib
+import datetime
+
+import httpx
+import pytest
+from sqlalchemy import func, insert, select
+
+from api.utils.estimation_queue import save_task_difficulty
+from api.utils.openrouter import TaskDifficultySchema
+from api.utils.reminders import ReminderScheduler
+from api.utils.task_stats import count_overdue, reconcile_task_stats
+from core.config import get_settings
+from models import Task, TaskCounter
+
+
+@pytest.fixture(name="client")
+def fixture_client(client, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(get_settings().task_stats, "counter_shards", 4)
+    return client
+
+
+async def _stats(client: httpx.AsyncClient) -> dict:
+    response = await client.get("/tasks/stats")
+    assert response.status_code == 200
+    return response.json()
+
+
+async def _score(client: httpx.AsyncClient, task_id: str, score: int) -> None:
+    async with client.sessionmaker() as session:
+        difficulty = TaskDifficultySchema(difficulty_score=score)
+        await save_task_difficulty(session, int(task_id), difficulty)
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_write_paths_keep_counters_exact(client) -> None:
+    ids = [
+        (await client.post("/tasks/", json={"name": f"Task {i}"})).json()["id"] for i in range(4)
+    ]
+    await _score(client, ids[0], 20)
+    await _score(client, ids[1], 100)
+    await _score(client, ids[1], 95)
+    await client.put(f"/tasks/{ids[0]}", json={"is_completed": True})
+    await client.put(f"/tasks/{ids[1]}", json={"difficulty_reestimate": True})
+    await _score(client, ids[1], 40)
+    await _score(client, ids[2], 45)
+    await client.delete(f"/tasks/{ids[3]}")
+    response = await client.post(
+        "/tasks/batch",
+        json={
+            "create": [{"name": "Batch"}] * 3,
+            "update": [{"task_id": ids[1], "is_completed": True}, {"task_id": 999}],
+            "delete": [ids[2], 998],
+        },
+    )
+    assert response.status_code == 200
+    response = await client.post(
+        "/tasks/import",
+        content=b'{"name": "Open"}\n{"name": "Done", "is_completed": true}',
+        params={"estimate": False},
+    )
+    assert response.json()["imported"] == 2
+
+    stats = await _stats(client)
+    assert stats | {"difficulty_histogram": None} == {
+        "open": 4,
+        "completed": 3,
+        "overdue": 0,
+        "overdue_as_of": None,
+        "scored": 2,
+        "mean_difficulty": 30.0,
+        "difficulty_histogram": None,
+    }
+    histogram = {bucket["min_score"]: bucket["count"] for bucket in stats["difficulty_histogram"]}
+    assert histogram == {0: 0, 10: 0, 20: 1, 30: 0, 40: 1, 50: 0, 60: 0, 70: 0, 80: 0, 90: 0}
+    assert stats["difficulty_histogram"][-1] == {"min_score": 90, "max_score": 100, "count": 0}
+
+    # Spread over the shards, nothing for the recount to fix
+    async with client.sessionmaker() as session:
+        shards = await session.scalar(select(func.count(func.distinct(TaskCounter.shard))))
+    assert 1 < shards <= 4
+    assert await reconcile_task_stats(force=True) == {}
+
+
+@pytest.mark.asyncio
+async def test_overdue_follows_reminder_ticks(client) -> None:
+    scheduler = ReminderScheduler(0.05, 100)
+    scheduler.add_handler(count_overdue)
+    task = asyncio.create_task(scheduler.run())
+    try:
+        await asyncio.wait_for(scheduler._ready.wait(), 5)
+        now = datetime.datetime.now(datetime.UTC)
+        for name, seconds in [("Past", -60), ("Soon", 0.2), ("Done", 0.2), ("Later", 60)]:
+            due_date = (now + datetime.timedelta(seconds=seconds)).isoformat()
+            response = await client.post("/tasks/", json={"name": name, "due_date": due_date})
+            if name == "Done":
+                await client.put(f"/tasks/{response.json()['id']}", json={"is_completed": True})
+        # Past due when written
+        assert (await _stats(client))["overdue"] == 1
+        async with asyncio.timeout(5):
+            while (await _stats(client))["overdue"] != 2:
+                await asyncio.sleep(0.05)
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    stats = await _stats(client)
+    assert datetime.datetime.fromisoformat(stats["overdue_as_of"]) > now
+    assert await reconcile_task_stats(force=True) == {}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_fixes_drift(client) -> None:
+    await client.post("/tasks/", json={"name": "Counted"})
+    async with client.sessionmaker() as session:
+        await session.execute(
+            insert(Task.__table__), [{"name": "Behind the counters", "is_completed": True}] * 3
+        )
+        await session.commit()
+    assert (await _stats(client))["completed"] == 0
+
+    assert await reconcile_task_stats() == {"completed": 3}
+    assert (await _stats(client))["completed"] == 3
+    # Reconciled moments ago, skipped until the interval has passed
+    async with client.sessionmaker() as session:
+        await session.execute(insert(Task.__table__), [{"name": "Late", "is_completed": False}])
+        await session.commit()
+    assert await reconcile_task_stats() == {}
+    assert await reconcile_task_stats(force=True) == {"open": 1}
+    assert (await _stats(client))["open"] == 2
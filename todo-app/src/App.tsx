@@ -1,8 +1,8 @@
 import React, { useState } from 'react';
 import './App.css';
 import Reminder from './Reminder';
-import { CreateTaskRequest, Task } from './api/types';
-import { getTasks, createTask, updateTask, deleteTask } from './api/tasks';
+import { CreateTaskRequest, Task, TaskChangesResponse } from './api/types';
+import { getTasks, getTaskChanges, createTask, updateTask, deleteTask, subscribeTaskEvents } from './api/tasks';
 
 
 type TaskNormalized = {
@@ -20,36 +20,94 @@ function App() {
   const [tasks, setTasks] = useState<TaskNormalized[]>([]);
   const [completedScores, setCompletedScores] = useState(0);
 
+  // Journal position the list is up to date with, see GET /tasks/changes
+  const changesCursor = React.useRef<string | null>(null);
+  // A sync is running, and whether events arrived meanwhile
+  const syncing = React.useRef(false);
+  const syncAgain = React.useRef(false);
+
+  const normalizeTask = (task: Task): TaskNormalized => ({
+    id: task.id,
+    name: task.name,
+    description: task.description || "",
+    due_date: task.due_date,
+    is_completed: task.is_completed,
+    difficulty_score: task.difficulty_score || 50,
+  });
+
   const fetchTasks = async () => {
     try {
+      // Cursor first: changes made while the list loads are applied again
+      changesCursor.current = (await getTaskChanges()).cursor;
       const tasks = await getTasks();
-      let normalizedTasks: TaskNormalized[] = [];
-      for (let task of tasks) {
-        console.log(task);
-        normalizedTasks.push({
-          id: task.id,
-          name: task.name,
-          description: task.description || "",
-          due_date: task.due_date,
-          is_completed: task.is_completed,
-          difficulty_score: task.difficulty_score || 50,
-        });
-      }
-      setTasks(normalizedTasks);
+      setTasks(tasks.map(normalizeTask));
     } catch (error) {
       console.error('Failed to fetch tasks:', error);
     }
   };
 
+  const applyChanges = async () => {
+    if (changesCursor.current === null) {
+      return fetchTasks();
+    }
+    let changes: TaskChangesResponse;
+    do {
+      try {
+        changes = await getTaskChanges(changesCursor.current);
+      } catch (error) {
+        // Cursor expired (410) or the request failed, start over
+        return fetchTasks();
+      }
+      const { upserts, deletes } = changes;
+      // Like getTasks(), the list only shows open tasks
+      const completed = upserts.filter(task => task.is_completed).map(task => task.id);
+      const removed = new Set([...deletes, ...completed]);
+      const upserted = new Map(
+        upserts.filter(task => !task.is_completed).map(task => [task.id, normalizeTask(task)])
+      );
+      setTasks(previous => {
+        const next = previous
+          .filter(task => !removed.has(task.id))
+          .map(task => upserted.get(task.id) || task);
+        const known = new Set(next.map(task => task.id));
+        return next.concat(Array.from(upserted.values()).filter(task => !known.has(task.id)));
+      });
+      changesCursor.current = changes.cursor;
+    } while (changes.has_more);
+  };
+
+  // Events only say that something changed: bursts (a batch, an import)
+  // collapse into one sync, run again once if more arrived meanwhile
+  const syncTasks = async (reload: boolean) => {
+    if (reload) {
+      changesCursor.current = null;
+    }
+    if (syncing.current) {
+      syncAgain.current = true;
+      return;
+    }
+    syncing.current = true;
+    try {
+      do {
+        syncAgain.current = false;
+        await applyChanges();
+      } while (syncAgain.current);
+    } finally {
+      syncing.current = false;
+    }
+  };
+
   React.useEffect(() => {
-    fetchTasks();
+    syncTasks(true);
+    // Apply what any client changed, or reload after a "resync"
+    return subscribeTaskEvents((event) => syncTasks(event.type === 'resync'));
   }, []);
 
   const handleCompleteReminder = (index: number) => {
     const taskScore = tasks[index].difficulty_score;
     updateTask(tasks[index].id, { is_completed: true, difficulty_reestimate: false }).then(() => {
       setCompletedScores(prev => prev + taskScore);
-      fetchTasks();
+      syncTasks(false);
     }).catch(error => {
       console.error('Failed to delete task:', error);
     });
@@ -148,7 +206,7 @@ function App() {
                             };
                             createTask(newTask).then(() => {
                                 (e.target as HTMLInputElement).value = "";
-                                fetchTasks();
+                                syncTasks(false);
                             }).catch(error => {
                                 console.error('Failed to create task:', error);
                             });
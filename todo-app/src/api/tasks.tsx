@@ -1,4 +1,4 @@
-import { Task, CreateTaskRequest, UpdateTaskRequest } from './types';
+import { Task, CreateTaskRequest, UpdateTaskRequest, BatchTasksRequest, BatchTasksResponse, TaskChangesResponse, TaskEvent, TaskPage, TaskSearchPage, TaskStats, TaskTimeseries } from './types';
 
 const API_BASE_URL = 'http://localhost:8000'; // TODO!
 
@@ -59,3 +59,138 @@ export async function deleteTask(taskId: string): Promise<void> {
         throw new Error(`Failed to delete task: ${response.statusText}`);
     }
 }
+
+/**
+ * Creates, updates and deletes many tasks in one request and transaction.
+ */
+export async function batchTasks(data: BatchTasksRequest): Promise<BatchTasksResponse> {
+    const response = await fetch(`${API_BASE_URL}/tasks/batch`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(data),
+    });
+    if (!response.ok) {
+        throw new Error(`Failed to apply task batch: ${response.statusText}`);
+    }
+    const result: BatchTasksResponse = await response.json();
+    return result;
+}
+
+export async function searchTasks(query: string, cursor?: string): Promise<TaskSearchPage> {
+    let url = `${API_BASE_URL}/tasks/search?q=${encodeURIComponent(query)}`;
+    if (cursor !== undefined) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`Failed to search tasks: ${response.statusText}`);
+    }
+    return {
+        results: await response.json(),
+        nextCursor: response.headers.get('X-Next-Cursor'),
+    };
+}
+
+async function fetchTaskPage(url: string, cursor?: string): Promise<TaskPage> {
+    if (cursor !== undefined) {
+        url += `${url.includes('?') ? '&' : '?'}cursor=${encodeURIComponent(cursor)}`;
+    }
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`Failed to fetch tasks: ${response.statusText}`);
+    }
+    return {
+        tasks: await response.json(),
+        nextCursor: response.headers.get('X-Next-Cursor'),
+    };
+}
+
+// Tasks due from `from` (included) to `to` (excluded), by due date.
+export async function getDueTasks(from: Date, to: Date, cursor?: string): Promise<TaskPage> {
+    const url = `${API_BASE_URL}/tasks/due?from=${encodeURIComponent(from.toISOString())}`
+        + `&to=${encodeURIComponent(to.toISOString())}`;
+    return fetchTaskPage(url, cursor);
+}
+
+// Open tasks past their due date, most overdue first.
+export async function getOverdueTasks(cursor?: string): Promise<TaskPage> {
+    return fetchTaskPage(`${API_BASE_URL}/tasks/overdue`, cursor);
+}
+
+export async function getTaskStats(): Promise<TaskStats> {
+    const response = await fetch(`${API_BASE_URL}/tasks/stats`);
+    if (!response.ok) {
+        throw new Error(`Failed to fetch task stats: ${response.statusText}`);
+    }
+    const data: TaskStats = await response.json();
+    return data;
+}
+
+// Days are UTC, weeks start on Monday; `from` and `to` are dates (YYYY-MM-DD),
+// by default the last 30 days or 12 weeks.
+export async function getTaskTimeseries(
+    granularity: 'day' | 'week' = 'day', from?: string, to?: string,
+): Promise<TaskTimeseries> {
+    const params = new URLSearchParams({ granularity });
+    if (from !== undefined) params.set('from', from);
+    if (to !== undefined) params.set('to', to);
+    const response = await fetch(`${API_BASE_URL}/tasks/stats/timeseries?${params}`);
+    if (!response.ok) {
+        throw new Error(`Failed to fetch task timeseries: ${response.statusText}`);
+    }
+    const data: TaskTimeseries = await response.json();
+    return data;
+}
+
+// Without `since` only the current cursor comes back. Throws on 410 too,
+// the caller then reloads the list and starts over without `since`.
+export async function getTaskChanges(since?: string): Promise<TaskChangesResponse> {
+    const url = since === undefined
+        ? `${API_BASE_URL}/tasks/changes`
+        : `${API_BASE_URL}/tasks/changes?since=${encodeURIComponent(since)}`;
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`Failed to fetch task changes: ${response.statusText}`);
+    }
+    const data: TaskChangesResponse = await response.json();
+    return data;
+}
+
+// Pushes task changes to `onEvent`, over a WebSocket or Server-Sent Events
+// where WebSocket is unavailable. Reconnects after a "resync" or a dropped
+// connection. Returns a function closing the channel.
+export function subscribeTaskEvents(onEvent: (event: TaskEvent) => void): () => void {
+    let closed = false;
+    let close = () => {};
+
+    const connect = () => {
+        if (closed) {
+            return;
+        }
+        if (typeof WebSocket === 'undefined') {
+            const source = new EventSource(`${API_BASE_URL}/tasks/events`);
+            for (const type of ['created', 'updated', 'deleted', 'difficulty_ready', 'resync']) {
+                source.addEventListener(type, (message) => {
+                    onEvent(JSON.parse((message as MessageEvent).data));
+                });
+            }
+            close = () => source.close();
+            return;
+        }
+        const socket = new WebSocket(`${API_BASE_URL.replace(/^http/, 'ws')}/tasks/events`);
+        socket.onmessage = (message) => onEvent(JSON.parse(message.data));
+        socket.onclose = () => setTimeout(connect, 1000);
+        close = () => {
+            socket.onclose = null;
+            socket.close();
+        };
+    };
+
+    connect();
+    return () => {
+        closed = true;
+        close();
+    };
+}
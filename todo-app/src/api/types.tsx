@@ -9,6 +9,7 @@ export type Task = {
     difficulty_score: number | null;
     reasoning: string | null;
     difficulty_estimation_time: string | null;
+    difficulty_status: 'pending' | 'ready';
 
     create_time: string;
     update_time: string;
@@ -27,3 +28,77 @@ export type UpdateTaskRequest = {
     is_completed?: boolean;
     difficulty_reestimate?: boolean;
 };
+
+export type BatchTasksRequest = {
+    create?: CreateTaskRequest[];
+    update?: (UpdateTaskRequest & { task_id: number })[];
+    delete?: number[];
+};
+
+export type BatchItemResult = {
+    index: number;
+    status: 'created' | 'updated' | 'deleted' | 'not_found' | 'invalid';
+    task_id: string | null;
+    task: Task | null;
+    detail: string | null;
+};
+
+export type BatchTasksResponse = {
+    created: BatchItemResult[];
+    updated: BatchItemResult[];
+    deleted: BatchItemResult[];
+};
+
+export type TaskChangesResponse = {
+    upserts: Task[];
+    deletes: string[];
+    cursor: string;
+    has_more: boolean;
+};
+
+export type TaskSearchResult = Task & {
+    rank: number;
+    // Matched words within <mark></mark>, the rest is not HTML-escaped
+    snippet: string;
+};
+
+export type TaskPage = {
+    tasks: Task[];
+    nextCursor: string | null;
+};
+
+export type TaskStats = {
+    open: number;
+    completed: number;
+    overdue: number;
+    overdue_as_of: string | null;
+    scored: number;
+    mean_difficulty: number | null;
+    difficulty_histogram: { min_score: number; max_score: number; count: number }[];
+};
+
+export type TaskTimeseriesBucket = {
+    start: string;
+    created: number;
+    completed: number;
+    scored: number;
+    difficulty_sum: number;
+    difficulty_p50: number | null;
+    difficulty_p90: number | null;
+    difficulty_p99: number | null;
+};
+
+export type TaskTimeseries = {
+    granularity: 'day' | 'week';
+    buckets: TaskTimeseriesBucket[];
+};
+
+export type TaskSearchPage = {
+    results: TaskSearchResult[];
+    nextCursor: string | null;
+};
+
+export type TaskEvent = {
+    type: 'created' | 'updated' | 'deleted' | 'difficulty_ready' | 'resync';
+    task_id?: string;
+};